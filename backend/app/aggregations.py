@@ -1,16 +1,12 @@
 from __future__ import annotations
 
 import datetime as dt
+import math
 from collections import defaultdict
-from statistics import mean, pstdev
 from typing import Optional, Tuple
 
-from sqlalchemy import func
-from sqlalchemy.orm import Session
-
-def _doc_date():
-    """Document date for grouping: use file date (modified_at) when set, else received_at."""
-    return func.date(func.coalesce(Document.modified_at, Document.received_at))
+from sqlalchemy import case, func
+from sqlalchemy.orm import Session, load_only
 
 from app.db import SessionLocal, engine, init_db
 from app.models import (
@@ -45,76 +41,75 @@ def _theme_and_descendant_ids(db: Session, theme_id: int) -> list[int]:
     return out
 
 
-def _get_or_create_theme_daily(db: Session, theme_id: int, date: dt.date) -> ThemeMentionsDaily:
-    row = (
-        db.query(ThemeMentionsDaily)
-        .filter(ThemeMentionsDaily.theme_id == theme_id, ThemeMentionsDaily.date == date)
-        .one_or_none()
-    )
-    if row is None:
-        row = ThemeMentionsDaily(theme_id=theme_id, date=date, doc_count=0, mention_count=0)
-        db.add(row)
-    return row
-
+_UPSERT_BATCH_SIZE = 1000
 
-def _get_or_create_theme_relation_daily(db: Session, theme_id: int, date: dt.date) -> ThemeRelationDaily:
-    row = (
-        db.query(ThemeRelationDaily)
-        .filter(ThemeRelationDaily.theme_id == theme_id, ThemeRelationDaily.date == date)
-        .one_or_none()
-    )
-    if row is None:
-        row = ThemeRelationDaily(
-            theme_id=theme_id,
-            date=date,
-            consensus_count=0,
-            contrarian_count=0,
-            refinement_count=0,
-            new_angle_count=0,
-        )
-        db.add(row)
-    return row
+# Narrative.relation_to_prevailing -> ThemeRelationDaily counter; anything else counts as consensus.
+_REL_ATTR = {
+    "consensus": "consensus_count",
+    "contrarian": "contrarian_count",
+    "refinement": "refinement_count",
+    "new_angle": "new_angle_count",
+}
 
 
-def _get_or_create_theme_sub_theme_daily(
-    db: Session, theme_id: int, sub_theme: str, date: dt.date
-) -> ThemeSubThemeMentionsDaily:
-    row = (
-        db.query(ThemeSubThemeMentionsDaily)
-        .filter(
-            ThemeSubThemeMentionsDaily.theme_id == theme_id,
-            ThemeSubThemeMentionsDaily.sub_theme == sub_theme,
-            ThemeSubThemeMentionsDaily.date == date,
-        )
-        .one_or_none()
-    )
-    if row is None:
-        row = ThemeSubThemeMentionsDaily(
-            theme_id=theme_id,
-            sub_theme=sub_theme,
-            date=date,
-            doc_count=0,
-            mention_count=0,
+def _upsert_rows(
+    db: Session,
+    model,
+    values: list[dict],
+    index_elements: list[str],
+    update_columns: list[str],
+) -> None:
+    """
+    Insert rows or update update_columns on primary-key conflict, one statement per batch
+    (INSERT ... ON CONFLICT DO UPDATE on both PostgreSQL and SQLite).
+    """
+    if not values:
+        return
+    if db.bind.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    for i in range(0, len(values), _UPSERT_BATCH_SIZE):
+        stmt = insert(model).values(values[i : i + _UPSERT_BATCH_SIZE])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=index_elements,
+            set_={col: stmt.excluded[col] for col in update_columns},
         )
-        db.add(row)
-    return row
+        db.execute(stmt)
 
 
-def _get_or_create_narrative_daily(db: Session, narrative_id: int, date: dt.date) -> NarrativeMentionsDaily:
-    row = (
-        db.query(NarrativeMentionsDaily)
-        .filter(NarrativeMentionsDaily.narrative_id == narrative_id, NarrativeMentionsDaily.date == date)
-        .one_or_none()
-    )
-    if row is None:
-        row = NarrativeMentionsDaily(
-            narrative_id=narrative_id,
-            date=date,
-            doc_count=0,
-            mention_count=0,
-        )
-        db.add(row)
-    return row
+def _replace_daily_rows(
+    db: Session,
+    model,
+    target_date: dt.date,
+    values: list[dict],
+    index_elements: list[str],
+    update_columns: list[str],
+) -> None:
+    """
+    Replace a daily table's rows for target_date: delete the day, then write the fresh aggregates,
+    so keys that no longer have evidence do not survive a re-run.
+    ThemeSubThemeMentionsDaily is streamed with COPY when the driver is psycopg 3.
+    """
+    db.query(model).filter(model.date == target_date).delete(synchronize_session=False)
+    if model is ThemeSubThemeMentionsDaily and db.bind.dialect.driver == "psycopg":
+        _copy_sub_theme_daily(db, values)
+    else:
+        _upsert_rows(db, model, values, index_elements, update_columns)
+
+
+def _copy_sub_theme_daily(db: Session, values: list[dict]) -> None:
+    """PostgreSQL (psycopg 3) fast path: COPY the day's sub-theme aggregates in one stream."""
+    if not values:
+        return
+    # Same transaction as the session: Cursor.copy on the session's DBAPI connection (psycopg 3 only).
+    raw = db.connection().connection
+    with raw.cursor() as cur:
+        with cur.copy(
+            "COPY theme_sub_theme_mentions_daily (theme_id, sub_theme, date, doc_count, mention_count) FROM STDIN"
+        ) as copy:
+            for v in values:
+                copy.write_row((v["theme_id"], v["sub_theme"], v["date"], v["doc_count"], v["mention_count"]))
 
 
 def _compute_burst_and_accel(
@@ -124,43 +119,68 @@ def _compute_burst_and_accel(
     """
     Compute simple burst (z-score vs trailing 30d) and acceleration (3d MA - 7d MA)
     for a narrative on a given date.
+    Single pass over the (<= 31 row) history with integer sums; no statistics-module passes.
     """
     if not history:
         return None, None
 
-    history = sorted(history, key=lambda x: x[0])
-    today_mentions = next((v for d, v in history if d == target_date), 0)
+    today_mentions: Optional[int] = None
+    prev: list[int] = []
+    upto: list[int] = []
+    for d, v in sorted(history, key=lambda x: x[0]):
+        if d < target_date:
+            prev.append(v)
+        elif d == target_date and today_mentions is None:
+            today_mentions = v
+        if d <= target_date:
+            upto.append(v)
 
-    prev_values = [v for d, v in history if d < target_date][-30:]
     burst: Optional[float] = None
-    if prev_values:
-        mu = mean(prev_values)
-        sigma = pstdev(prev_values) or 0.0
-        if sigma > 0:
-            burst = (today_mentions - mu) / sigma
-
-    def _moving_avg(days: int) -> Optional[float]:
-        window = [v for d, v in history if d <= target_date][-days:]
-        if not window:
-            return None
-        return float(sum(window)) / len(window)
+    prev = prev[-30:]
+    if prev:
+        n = len(prev)
+        s = sum(prev)
+        s2 = sum(v * v for v in prev)
+        # Population variance with exact integer numerator: (n*sum(x^2) - sum(x)^2) / n^2
+        var_num = n * s2 - s * s
+        if var_num > 0:
+            sigma = math.sqrt(var_num) / n
+            burst = ((today_mentions or 0) - s / n) / sigma
 
-    ma3 = _moving_avg(3)
-    ma7 = _moving_avg(7)
     accel: Optional[float] = None
-    if ma3 is not None and ma7 is not None:
+    if upto:
+        ma3 = sum(upto[-3:]) / len(upto[-3:])
+        ma7 = sum(upto[-7:]) / len(upto[-7:])
         accel = ma3 - ma7
 
     return burst, accel
 
 
-def _compute_novelty(first_seen: dt.datetime, target_date: dt.date) -> float:
-    days = (target_date - first_seen.date()).days
-    if days <= 1:
-        return 1.0
-    if days <= 7:
-        return 0.5
-    return 0.0
+def _compute_novelty_batch(first_seen_by_id: dict[int, dt.datetime], target_date: dt.date) -> dict[int, float]:
+    """
+    Novelty per narrative: 1.0 if first seen within 1 day of target_date, 0.5 within 7 days, else 0.0.
+    Compares first_seen dates against two precomputed cutoffs instead of a timedelta per narrative.
+    """
+    new_cutoff = target_date - dt.timedelta(days=1)
+    recent_cutoff = target_date - dt.timedelta(days=7)
+    out: dict[int, float] = {}
+    for nid, first_seen in first_seen_by_id.items():
+        d = first_seen.date()
+        out[nid] = 1.0 if d >= new_cutoff else (0.5 if d >= recent_cutoff else 0.0)
+    return out
+
+
+# Set once this process has run init_db/create_all; later runs skip the schema reflection.
+_SCHEMA_READY = False
+
+
+def _ensure_schema() -> None:
+    global _SCHEMA_READY
+    if _SCHEMA_READY:
+        return
+    init_db()
+    Base.metadata.create_all(bind=engine)
+    _SCHEMA_READY = True
 
 
 def run_daily_aggregations(target_date: Optional[dt.date] = None) -> None:
@@ -173,8 +193,7 @@ def run_daily_aggregations(target_date: Optional[dt.date] = None) -> None:
     if target_date is None:
         target_date = dt.date.today()
 
-    init_db()
-    Base.metadata.create_all(bind=engine)
+    _ensure_schema()
 
     db = SessionLocal()
     try:
@@ -184,48 +203,49 @@ def run_daily_aggregations(target_date: Optional[dt.date] = None) -> None:
                 Narrative.id.label("narrative_id"),
                 Narrative.relation_to_prevailing.label("relation_to_prevailing"),
                 Theme.id.label("theme_id"),
+                Narrative.first_seen.label("first_seen"),
                 func.count(Evidence.id).label("mention_count"),
                 func.count(func.distinct(Document.id)).label("doc_count"),
             )
             .join(Evidence, Evidence.narrative_id == Narrative.id)
             .join(Document, Document.id == Evidence.document_id)
             .join(Theme, Theme.id == Narrative.theme_id)
-            .filter(_doc_date() == target_date)
-            .group_by(Narrative.id, Narrative.relation_to_prevailing, Theme.id)
+            .filter(Document.doc_date == target_date)
+            .group_by(Narrative.id, Narrative.relation_to_prevailing, Theme.id, Narrative.first_seen)
             .all()
         )
 
-        theme_totals: dict[int, int] = defaultdict(int)
+        narrative_values: list[dict] = []
+        # Per-theme sums kept as plain ints; the row dicts are built once per theme in step 2.
+        theme_doc_totals: dict[int, int] = defaultdict(int)
+        theme_mention_totals: dict[int, int] = defaultdict(int)
+        relation_totals: dict[int, dict] = {}
 
         for r in rows:
             n_id = int(r.narrative_id)
             t_id = int(r.theme_id)
             doc_count = int(r.doc_count or 0)
             mention_count = int(r.mention_count or 0)
-            rel = (r.relation_to_prevailing or "consensus").lower()
-            if rel not in ("consensus", "contrarian", "refinement", "new_angle"):
-                rel = "consensus"
-
-            n_daily = _get_or_create_narrative_daily(db, n_id, target_date)
-            n_daily.doc_count = doc_count
-            n_daily.mention_count = mention_count
 
-            t_daily = _get_or_create_theme_daily(db, t_id, target_date)
-            t_daily.doc_count += doc_count
-            t_daily.mention_count += mention_count
+            narrative_values.append(
+                {"narrative_id": n_id, "date": target_date, "doc_count": doc_count, "mention_count": mention_count}
+            )
 
-            theme_totals[t_id] += mention_count
+            theme_doc_totals[t_id] += doc_count
+            theme_mention_totals[t_id] += mention_count
 
             # Theme relation daily breakdown
-            rel_daily = _get_or_create_theme_relation_daily(db, t_id, target_date)
-            if rel == "consensus":
-                rel_daily.consensus_count += mention_count
-            elif rel == "contrarian":
-                rel_daily.contrarian_count += mention_count
-            elif rel == "refinement":
-                rel_daily.refinement_count += mention_count
-            else:
-                rel_daily.new_angle_count += mention_count
+            rel_daily = relation_totals.get(t_id)
+            if rel_daily is None:
+                rel_daily = relation_totals[t_id] = {
+                    "theme_id": t_id,
+                    "date": target_date,
+                    "consensus_count": 0,
+                    "contrarian_count": 0,
+                    "refinement_count": 0,
+                    "new_angle_count": 0,
+                }
+            rel_daily[_REL_ATTR.get((r.relation_to_prevailing or "").lower(), "consensus_count")] += mention_count
 
         # 1b) Aggregate by (theme_id, sub_theme) for ThemeSubThemeMentionsDaily (narratives with sub_theme set)
         sub_theme_rows = (
@@ -238,62 +258,122 @@ def run_daily_aggregations(target_date: Optional[dt.date] = None) -> None:
             .join(Evidence, Evidence.narrative_id == Narrative.id)
             .join(Document, Document.id == Evidence.document_id)
             .filter(
-                _doc_date() == target_date,
+                Document.doc_date == target_date,
                 Narrative.sub_theme.isnot(None),
                 Narrative.sub_theme != "",
             )
             .group_by(Narrative.theme_id, Narrative.sub_theme)
-            .all()
+            # Streamed in batches: rows are folded into sub_theme_values as they arrive.
+            .execution_options(stream_results=True)
+            .yield_per(1000)
         )
+        sub_theme_values: dict[tuple[int, str], dict] = {}
         for r in sub_theme_rows:
             st = (r.sub_theme or "").strip()[:128]
             if not st:
                 continue
-            row = _get_or_create_theme_sub_theme_daily(db, int(r.theme_id), st, target_date)
-            row.doc_count = int(r.doc_count or 0)
-            row.mention_count = int(r.mention_count or 0)
+            # Keyed so sub_themes that collide after strip/truncate keep a single row (last wins).
+            sub_theme_values[(int(r.theme_id), st)] = {
+                "theme_id": int(r.theme_id),
+                "sub_theme": st,
+                "date": target_date,
+                "doc_count": int(r.doc_count or 0),
+                "mention_count": int(r.mention_count or 0),
+            }
 
         # 2) Compute share_of_voice per theme: doc_count / total_docs (share of that day's documents that mention this theme)
         # Denominator = all documents received that day (e.g. 5 docs, theme in 2 → 2/5 = 40%).
         total_docs = (
             db.query(func.count(Document.id))
-            .filter(_doc_date() == target_date)
+            .filter(Document.doc_date == target_date)
             .scalar()
             or 0
         )
-        if total_docs > 0:
-            for theme_id in theme_totals:
-                row = _get_or_create_theme_daily(db, theme_id, target_date)
-                row.share_of_voice = float(row.doc_count) / total_docs
+        theme_values = [
+            {
+                "theme_id": t_id,
+                "date": target_date,
+                "doc_count": t_docs,
+                "mention_count": theme_mention_totals[t_id],
+                "share_of_voice": float(t_docs) / total_docs if total_docs > 0 else None,
+            }
+            for t_id, t_docs in theme_doc_totals.items()
+        ]
 
+        # Replace each table's rows for the day (re-runs drop keys that no longer have evidence).
+        _replace_daily_rows(
+            db, NarrativeMentionsDaily, target_date, narrative_values,
+            ["narrative_id", "date"], ["doc_count", "mention_count"],
+        )
+        _replace_daily_rows(
+            db, ThemeMentionsDaily, target_date, theme_values,
+            ["theme_id", "date"], ["doc_count", "mention_count", "share_of_voice"],
+        )
+        _replace_daily_rows(
+            db, ThemeRelationDaily, target_date, list(relation_totals.values()),
+            ["theme_id", "date"], ["consensus_count", "contrarian_count", "refinement_count", "new_angle_count"],
+        )
+        _replace_daily_rows(
+            db, ThemeSubThemeMentionsDaily, target_date, list(sub_theme_values.values()),
+            ["theme_id", "sub_theme", "date"], ["doc_count", "mention_count"],
+        )
         db.commit()
+        from app.analytics import bump_analytics_epoch
+        bump_analytics_epoch()
 
         # 3) Compute burst / accel / novelty per narrative
-        for r in rows:
-            n_id = int(r.narrative_id)
-            narrative = db.query(Narrative).filter(Narrative.id == n_id).one()
-
+        # One windowed history query for all narratives (not one per narrative); first_seen comes from step 1.
+        nids = sorted({int(r.narrative_id) for r in rows})
+        first_seen_by_nid: dict[int, dt.datetime] = {int(r.narrative_id): r.first_seen for r in rows}
+        history_by_nid: dict[int, list[tuple[dt.date, int]]] = defaultdict(list)
+        if nids:
             history_rows = (
-                db.query(NarrativeMentionsDaily)
+                db.query(
+                    NarrativeMentionsDaily.narrative_id,
+                    NarrativeMentionsDaily.date,
+                    NarrativeMentionsDaily.mention_count,
+                )
                 .filter(
-                    NarrativeMentionsDaily.narrative_id == n_id,
-                    NarrativeMentionsDaily.date <= target_date,
-                    NarrativeMentionsDaily.date >= target_date - dt.timedelta(days=30),
+                    NarrativeMentionsDaily.narrative_id.in_(nids),
+                    NarrativeMentionsDaily.date.between(target_date - dt.timedelta(days=30), target_date),
                 )
                 .all()
             )
-            history = [(h.date, int(h.mention_count or 0)) for h in history_rows]
-
-            burst, accel = _compute_burst_and_accel(history, target_date)
-            novelty = _compute_novelty(narrative.first_seen, target_date)
-
-            today_row = _get_or_create_narrative_daily(db, n_id, target_date)
-            today_row.burst_score = burst
-            today_row.accel_score = accel
-            today_row.novelty_score = novelty
-
+            for nid, d, m in history_rows:
+                history_by_nid[int(nid)].append((d, int(m or 0)))
+
+        novelty_by_nid = _compute_novelty_batch(first_seen_by_nid, target_date)
+        score_values: list[dict] = []
+        for n_id in nids:
+            burst, accel = _compute_burst_and_accel(history_by_nid.get(n_id, []), target_date)
+            novelty = novelty_by_nid[n_id]
+            score_values.append(
+                {
+                    "narrative_id": n_id,
+                    "date": target_date,
+                    "burst_score": burst,
+                    "accel_score": accel,
+                    "novelty_score": novelty,
+                }
+            )
+        _upsert_rows(
+            db, NarrativeMentionsDaily, score_values,
+            ["narrative_id", "date"], ["burst_score", "accel_score", "novelty_score"],
+        )
         db.commit()
 
+        # 3b) Refresh the per-theme daily SoV rollup the analytics Evidence fallback reads (PostgreSQL only)
+        if db.bind.dialect.name == "postgresql":
+            try:
+                from app.analytics import refresh_theme_doc_daily
+                refresh_theme_doc_daily(db)
+            except Exception as e:
+                db.rollback()
+                import logging
+                logging.getLogger("investing_agent.aggregations").warning(
+                    "mv_theme_doc_daily refresh failed: %s", e
+                )
+
         # 4) Generate LLM narrative summaries for all themes (cached, not on page load)
         try:
             summary_count = generate_theme_narrative_summaries(db)
@@ -386,76 +466,174 @@ def compute_theme_sub_theme_metrics(db: Session, theme_id: Optional[int] = None)
     )
     if theme_id is not None:
         q = q.filter(Narrative.theme_id == theme_id)
-    pairs = [(int(r.theme_id), (r.sub_theme or "").strip()[:128]) for r in q.all() if (r.sub_theme or "").strip()]
+    # dict.fromkeys: sub_themes that collide after strip/truncate map to one metrics row.
+    pairs = list(dict.fromkeys(
+        (int(r.theme_id), (r.sub_theme or "").strip()[:128]) for r in q.all() if (r.sub_theme or "").strip()
+    ))
+
+    # Mention history stats for every (theme_id, sub_theme) in one query: rn numbers each pair's
+    # daily rows newest-first, so "recent" = last 7 days with data and "older" = the rest of the 90d window.
+    today = dt.date.today()
+    rn = (
+        func.row_number()
+        .over(
+            partition_by=(ThemeSubThemeMentionsDaily.theme_id, ThemeSubThemeMentionsDaily.sub_theme),
+            order_by=ThemeSubThemeMentionsDaily.date.desc(),
+        )
+        .label("rn")
+    )
+    hist_q = db.query(
+        ThemeSubThemeMentionsDaily.theme_id,
+        ThemeSubThemeMentionsDaily.sub_theme,
+        ThemeSubThemeMentionsDaily.date,
+        ThemeSubThemeMentionsDaily.mention_count,
+        rn,
+    ).filter(ThemeSubThemeMentionsDaily.date >= today - dt.timedelta(days=90))
+    if theme_id is not None:
+        hist_q = hist_q.filter(ThemeSubThemeMentionsDaily.theme_id == theme_id)
+    hist = hist_q.subquery()
+    mention_count = func.coalesce(hist.c.mention_count, 0)
+    stats_rows = (
+        db.query(
+            hist.c.theme_id,
+            hist.c.sub_theme,
+            func.min(hist.c.date).label("first_date"),
+            func.count().label("n_days"),
+            func.sum(case((hist.c.rn <= 7, mention_count), else_=0)).label("recent_sum"),
+            func.sum(case((hist.c.rn > 7, mention_count), else_=0)).label("older_sum"),
+        )
+        .group_by(hist.c.theme_id, hist.c.sub_theme)
+        .all()
+    )
+    stats = {(int(r.theme_id), r.sub_theme): r for r in stats_rows}
 
     now = dt.datetime.now(dt.timezone.utc)
+    metrics_values: list[dict] = []
     for tid, sub_theme in pairs:
-        if not sub_theme:
-            continue
-        # Heuristics: use mention history from ThemeSubThemeMentionsDaily if available
-        daily_rows = (
-            db.query(ThemeSubThemeMentionsDaily)
-            .filter(
-                ThemeSubThemeMentionsDaily.theme_id == tid,
-                ThemeSubThemeMentionsDaily.sub_theme == sub_theme,
-                ThemeSubThemeMentionsDaily.date >= dt.date.today() - dt.timedelta(days=90),
-            )
-            .order_by(ThemeSubThemeMentionsDaily.date.asc())
-            .all()
-        )
-        mention_history = [(r.date, int(r.mention_count or 0)) for r in daily_rows]
+        st = stats.get((tid, sub_theme))
+        n_days = int(st.n_days) if st else 0
 
         # narrative_stage: early (growing), mainstream (stable), late (declining), contested (mixed stances)
         narrative_stage: Optional[str] = "mainstream"
-        if len(mention_history) >= 7:
-            recent = [v for _, v in mention_history[-7:]]
-            older = [v for _, v in mention_history[: max(0, len(mention_history) - 7)]]
-            if older:
-                recent_avg = sum(recent) / len(recent)
-                older_avg = sum(older) / len(older)
+        if n_days >= 7:
+            if n_days > 7:
+                recent_avg = float(st.recent_sum or 0) / 7
+                older_avg = float(st.older_sum or 0) / (n_days - 7)
                 if older_avg == 0 and recent_avg > 0:
                     narrative_stage = "early"
                 elif older_avg > 0 and recent_avg > older_avg * 1.2:
                     narrative_stage = "early"
                 elif older_avg > 0 and recent_avg < older_avg * 0.6:
                     narrative_stage = "late"
-        elif mention_history:
+        elif n_days:
             narrative_stage = "early"
 
         # novelty_type: new (first activity recent), evolving (growth), reversal (stance mix changed - skip for now)
         novelty_type: Optional[str] = "evolving"
-        if mention_history:
-            first_date = mention_history[0][0]
-            if (dt.date.today() - first_date).days <= 14:
+        if n_days:
+            first_date = st.first_date
+            if isinstance(first_date, str):
+                first_date = dt.date.fromisoformat(first_date[:10])
+            if (today - first_date).days <= 14:
                 novelty_type = "new"
             elif narrative_stage == "early":
                 novelty_type = "evolving"
 
-        existing = (
-            db.query(ThemeSubThemeMetrics)
-            .filter(
-                ThemeSubThemeMetrics.theme_id == tid,
-                ThemeSubThemeMetrics.sub_theme == sub_theme,
-            )
-            .one_or_none()
+        metrics_values.append(
+            {
+                "theme_id": tid,
+                "sub_theme": sub_theme,
+                "novelty_type": novelty_type,
+                "narrative_stage": narrative_stage,
+                "computed_at": now,
+            }
         )
-        if existing:
-            existing.novelty_type = novelty_type
-            existing.narrative_stage = narrative_stage
-            existing.computed_at = now
-        else:
-            db.add(
-                ThemeSubThemeMetrics(
-                    theme_id=tid,
-                    sub_theme=sub_theme,
-                    novelty_type=novelty_type,
-                    narrative_stage=narrative_stage,
-                    computed_at=now,
-                )
-            )
+
+    _upsert_rows(
+        db, ThemeSubThemeMetrics, metrics_values,
+        ["theme_id", "sub_theme"], ["novelty_type", "narrative_stage", "computed_at"],
+    )
     db.commit()
 
 
+# Recent narratives per theme included in the summary prompt (the first N by last_seen, oldest first).
+_SUMMARY_MAX_RECENT_NARRATIVES = 40
+
+def _parse_theme_summary_response(
+    raw: str, valid_recent_ids: set[int]
+) -> Optional[Tuple[str, dict, Optional[str]]]:
+    """
+    Parse the LLM memo JSON into (summary_text, meta_payload, inflection_alert).
+    Returns None when the response carries no usable text.
+    """
+    import json
+
+    from app.llm.provider import strip_code_fence
+
+    data = json.loads(strip_code_fence(raw))
+
+    # Be robust to the model returning either:
+    # - {"summary": "plain string", ...}
+    # - {"summary": { "Consensus view": [...], "What changed": [...] }, ...}
+    summary_val = data.get("summary", "")
+    if isinstance(summary_val, dict):
+        # Flatten structured summary sections into a single markdown string.
+        parts: list[str] = []
+        for section, content in summary_val.items():
+            if isinstance(content, list):
+                text = "; ".join(str(item).strip() for item in content if str(item).strip())
+            else:
+                text = str(content).strip()
+            if text:
+                parts.append(f"**{section}**: {text}")
+        summary_text = "\n".join(parts).strip()
+    else:
+        summary_text = str(summary_val).strip()
+
+    investment_relevance = str(data.get("investment_relevance") or "").strip() or None
+    what_changed = str(data.get("what_changed") or "").strip() or None
+
+    change_ids_raw = data.get("change_narrative_ids") or []
+    change_narrative_ids: list[int] = []
+    if isinstance(change_ids_raw, list):
+        for x in change_ids_raw:
+            try:
+                xid = int(x)
+            except (TypeError, ValueError):
+                continue
+            if xid in valid_recent_ids and xid not in change_narrative_ids:
+                change_narrative_ids.append(xid)
+
+    trending = data.get("trending_sub_themes", [])
+    # Normalise trending_sub_themes to a simple list of strings.
+    if isinstance(trending, dict):
+        trending = [str(v).strip() for v in trending.values() if str(v).strip()]
+    elif isinstance(trending, list):
+        trending = [str(v).strip() for v in trending if str(v).strip()]
+    else:
+        trending = [str(trending).strip()] if str(trending).strip() else []
+
+    inflection = data.get("inflection_alert")
+    if isinstance(inflection, dict):
+        # Store a concise string representation if the model returns a structured alert.
+        inflection = str(inflection)
+
+    if not summary_text and not investment_relevance and not what_changed:
+        return None
+
+    # Encode structured extras in trending_sub_themes JSON (no schema migration).
+    meta_payload = {
+        "trending": trending,
+        "change_narrative_ids": change_narrative_ids,
+        "investment_relevance": investment_relevance,
+        "what_changed": what_changed,
+    }
+    # Keep a readable summary even if detail bullets are empty.
+    if not summary_text:
+        summary_text = what_changed or investment_relevance or ""
+    return summary_text, meta_payload, inflection
+
+
 def generate_theme_narrative_summaries(
     db: Session,
     theme_id: Optional[int] = None,
@@ -468,9 +646,12 @@ def generate_theme_narrative_summaries(
 
     Pass theme_id for one theme, theme_ids for a set, or neither for all themes.
     """
+    import hashlib
     import json
     import logging
-    from app.models import ThemeNarrativeSummaryCache
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+
     from app.settings import settings
 
     logger = logging.getLogger("investing_agent.aggregations")
@@ -493,21 +674,66 @@ def generate_theme_narrative_summaries(
         return 0
 
     since = dt.date.today() - dt.timedelta(days=30)
-    doc_date = func.date(func.coalesce(Document.modified_at, Document.received_at))
-    count = 0
+    as_of_line = f"As of: {dt.date.today().isoformat()}\n\n"
+    system = (
+        "You are a senior investment analyst writing a daily memo to management. "
+        "Synthesize and reason — never enumerate stance counts. Return valid JSON only."
+    )
+    # (theme_id, label, user_prompt, valid recent narrative ids, input_hash) — plain values built
+    # on this thread so the LLM worker threads below never touch the session or ORM objects.
+    jobs: list[tuple[int, str, str, set[int], str]] = []
 
-    for theme in themes:
-        # Gather narratives with recent evidence
-        
-        recent_narratives = (
-            db.query(Narrative)
-            .join(Evidence, Evidence.narrative_id == Narrative.id)
-            .join(Document, Document.id == Evidence.document_id)
-            .filter(Narrative.theme_id == theme.id, doc_date >= since)
-            .distinct()
-            .all()
+    # Hash of the prompt each cached memo was generated from; unchanged input -> skip the LLM call.
+    cached_hashes = dict(
+        db.query(ThemeNarrativeSummaryCache.theme_id, ThemeNarrativeSummaryCache.input_hash)
+        .filter(
+            ThemeNarrativeSummaryCache.theme_id.in_([t.id for t in themes]),
+            ThemeNarrativeSummaryCache.period == "30d",
+        )
+        .all()
+    )
+
+    # Narratives with recent evidence, ranked oldest-first within each theme (the order the prompt
+    # lists them in) so the cap is applied in SQL (one query for all themes, bucketed by theme below).
+    recent_ids = (
+        db.query(Evidence.narrative_id)
+        .join(Document, Document.id == Evidence.document_id)
+        .filter(Document.doc_date >= since)
+    )
+    ranked_q = db.query(
+        Narrative.id.label("narrative_id"),
+        func.row_number()
+        .over(
+            partition_by=Narrative.theme_id,
+            order_by=(func.coalesce(Narrative.last_seen, Narrative.first_seen).asc().nulls_first(), Narrative.id),
+        )
+        .label("rn"),
+    ).filter(Narrative.id.in_(recent_ids))
+    if theme_ids is not None or theme_id is not None:
+        ranked_q = ranked_q.filter(Narrative.theme_id.in_([t.id for t in themes]))
+    ranked = ranked_q.subquery()
+    recent_q = (
+        db.query(Narrative)
+        .options(
+            load_only(
+                Narrative.theme_id,
+                Narrative.statement,
+                Narrative.narrative_stance,
+                Narrative.confidence_level,
+                Narrative.sub_theme,
+                Narrative.first_seen,
+                Narrative.last_seen,
+            )
         )
-        
+        .join(ranked, ranked.c.narrative_id == Narrative.id)
+        .filter(ranked.c.rn <= _SUMMARY_MAX_RECENT_NARRATIVES)
+    )
+    recent_by_theme: dict[int, list[Narrative]] = defaultdict(list)
+    for n in recent_q.all():
+        recent_by_theme[n.theme_id].append(n)
+
+    for theme in themes:
+        recent_narratives = recent_by_theme.get(theme.id)
         if not recent_narratives:
             continue
 
@@ -517,7 +743,7 @@ def generate_theme_narrative_summaries(
             key=lambda n: (n.last_seen or n.first_seen or dt.datetime.min.replace(tzinfo=dt.timezone.utc), n.id),
         )
         recent_lines = []
-        for n in recent_sorted[:40]:
+        for n in recent_sorted:
             stance = n.narrative_stance or "unknown"
             conf = n.confidence_level or "unknown"
             sub = n.sub_theme or "general"
@@ -530,12 +756,13 @@ def generate_theme_narrative_summaries(
         older_since = since - dt.timedelta(days=60)
         older_narratives = (
             db.query(Narrative)
+            .options(load_only(Narrative.statement, Narrative.narrative_stance, Narrative.sub_theme))
             .join(Evidence, Evidence.narrative_id == Narrative.id)
             .join(Document, Document.id == Evidence.document_id)
             .filter(
                 Narrative.theme_id == theme.id,
-                doc_date >= older_since,
-                doc_date < since,
+                Document.doc_date >= older_since,
+                Document.doc_date < since,
             )
             .distinct()
             .limit(25)
@@ -556,8 +783,8 @@ def generate_theme_narrative_summaries(
         user_prompt = (
             f"Theme: {theme.canonical_label}\n"
             f"Description: {theme.description or 'N/A'}\n"
-            f"As of: {dt.date.today().isoformat()}\n\n"
-            f"Recent narratives (past 30 days, chronological):\n"
+            + as_of_line
+            + "Recent narratives (past 30 days, chronological):\n"
             + "\n".join(recent_lines)
             + "\n"
             + prior_block
@@ -584,123 +811,78 @@ def generate_theme_narrative_summaries(
             "}\n"
         )
 
-        system = (
-            "You are a senior investment analyst writing a daily memo to management. "
-            "Synthesize and reason — never enumerate stance counts. Return valid JSON only."
-        )
+        # Everything the memo depends on except the as-of date.
+        input_hash = hashlib.sha256(
+            (system + user_prompt.replace(as_of_line, "", 1)).encode("utf-8")
+        ).hexdigest()
+        if cached_hashes.get(theme.id) == input_hash:
+            logger.info("Narrative summary for theme %s unchanged; skipping LLM call", theme.id)
+            continue
 
-        try:
-            from app.llm.provider import chat_completion
+        jobs.append(
+            (
+                theme.id,
+                theme.canonical_label,
+                user_prompt,
+                {int(n.id) for n in recent_narratives},
+                input_hash,
+            )
+        )
 
-            raw = chat_completion(system=system, user=user_prompt, max_tokens=2048)
-            
-
-            if raw.startswith("```"):
-                raw = raw.split("\n", 1)[-1] if "\n" in raw else raw[3:]
-            if raw.endswith("```"):
-                raw = raw.rsplit("```", 1)[0].rstrip()
-
-            data = json.loads(raw.strip())
-
-            # Be robust to the model returning either:
-            # - {"summary": "plain string", ...}
-            # - {"summary": { "Consensus view": [...], "What changed": [...] }, ...}
-            summary_val = data.get("summary", "")
-            if isinstance(summary_val, dict):
-                # Flatten structured summary sections into a single markdown string.
-                parts: list[str] = []
-                for section, content in summary_val.items():
-                    if isinstance(content, list):
-                        text = "; ".join(str(item).strip() for item in content if str(item).strip())
-                    else:
-                        text = str(content).strip()
-                    if text:
-                        parts.append(f"**{section}**: {text}")
-                summary_text = "\n".join(parts).strip()
-            else:
-                summary_text = str(summary_val).strip()
-
-            investment_relevance = str(data.get("investment_relevance") or "").strip() or None
-            what_changed = str(data.get("what_changed") or "").strip() or None
-
-            valid_recent_ids = {int(n.id) for n in recent_narratives}
-            change_ids_raw = data.get("change_narrative_ids") or []
-            change_narrative_ids: list[int] = []
-            if isinstance(change_ids_raw, list):
-                for x in change_ids_raw:
-                    try:
-                        xid = int(x)
-                    except (TypeError, ValueError):
-                        continue
-                    if xid in valid_recent_ids and xid not in change_narrative_ids:
-                        change_narrative_ids.append(xid)
-
-            trending = data.get("trending_sub_themes", [])
-            # Normalise trending_sub_themes to a simple list of strings.
-            if isinstance(trending, dict):
-                trending = [str(v).strip() for v in trending.values() if str(v).strip()]
-            elif isinstance(trending, list):
-                trending = [str(v).strip() for v in trending if str(v).strip()]
-            else:
-                trending = [str(trending).strip()] if str(trending).strip() else []
+    # End the read transaction before the LLM round-trips so the connection goes back
+    # to the pool (and SQLite readers don't pin the WAL) for the duration of the calls.
+    db.commit()
 
-            inflection = data.get("inflection_alert")
-            if isinstance(inflection, dict):
-                # Store a concise string representation if the model returns a structured alert.
-                inflection = str(inflection)
+    if not jobs:
+        return 0
 
-            if not summary_text and not investment_relevance and not what_changed:
-                continue
+    from app.llm.provider import chat_completion
 
-            # Encode structured extras in trending_sub_themes JSON (no schema migration).
-            meta_payload = {
-                "trending": trending,
-                "change_narrative_ids": change_narrative_ids,
-                "investment_relevance": investment_relevance,
-                "what_changed": what_changed,
-            }
-            # Keep a readable summary even if detail bullets are empty.
-            if not summary_text:
-                summary_text = what_changed or investment_relevance or ""
+    def _summarize(job: tuple[int, str, str, set[int], str]):
+        t_id, _, user_prompt, valid_recent_ids, _ = job
+        try:
+            raw = chat_completion(system=system, user=user_prompt, max_tokens=2048)
+            return _parse_theme_summary_response(raw, valid_recent_ids)
         except Exception as e:
-            logger.warning("Failed to generate summary for theme %s: %s", theme.id, e)
-            continue
+            logger.warning("Failed to generate summary for theme %s: %s", t_id, e)
+            return None
+        finally:
+            # Respect rate limit (per worker, so at most k requests are in flight)
+            if settings.llm_delay_after_request_seconds > 0:
+                time.sleep(settings.llm_delay_after_request_seconds)
+
+    # LLM calls are network-bound: run up to llm_max_concurrent_requests at once.
+    max_workers = min(len(jobs), max(1, settings.llm_max_concurrent_requests))
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="theme-summary") as executor:
+        results = list(executor.map(_summarize, jobs))
 
-        # Upsert cache
-        existing = (
-            db.query(ThemeNarrativeSummaryCache)
-            .filter(ThemeNarrativeSummaryCache.theme_id == theme.id, ThemeNarrativeSummaryCache.period == "30d")
-            .one_or_none()
+    now = dt.datetime.now(dt.timezone.utc)
+    cache_values: list[dict] = []
+    for (t_id, label, _, _, input_hash), result in zip(jobs, results):
+        if result is None:
+            continue
+        summary_text, meta_payload, inflection = result
+        cache_values.append(
+            {
+                "theme_id": t_id,
+                "period": "30d",
+                "summary": summary_text,
+                "trending_sub_themes": json.dumps(meta_payload),
+                "inflection_alert": inflection,
+                "generated_at": now,
+                "input_hash": input_hash,
+            }
         )
-        now = dt.datetime.now(dt.timezone.utc)
-        
-        
-        if existing:
-            existing.summary = summary_text
-            existing.trending_sub_themes = json.dumps(meta_payload)
-            existing.inflection_alert = inflection
-            existing.generated_at = now
-        else:
-            db.add(ThemeNarrativeSummaryCache(
-                theme_id=theme.id,
-                period="30d",
-                summary=summary_text,
-                trending_sub_themes=json.dumps(meta_payload),
-                inflection_alert=inflection,
-                generated_at=now,
-            ))
-        db.flush()
-        count += 1
-        logger.info("Generated narrative summary for theme %s (%s)", theme.id, theme.canonical_label)
-
-        # Respect rate limit
-        import time
-        if settings.llm_delay_after_request_seconds > 0:
-            time.sleep(settings.llm_delay_after_request_seconds)
+        logger.info("Generated narrative summary for theme %s (%s)", t_id, label)
 
+    # All LLM calls are done: write every memo in one batched upsert and one commit.
+    _upsert_rows(
+        db, ThemeNarrativeSummaryCache, cache_values,
+        ["theme_id", "period"],
+        ["summary", "trending_sub_themes", "inflection_alert", "generated_at", "input_hash"],
+    )
     db.commit()
-    return count
-
+    return len(cache_values)
 
 if __name__ == "__main__":
     run_daily_aggregations()
@@ -6,17 +6,39 @@ Simple heuristics (two-window comparisons, counts/ratios) for sparse theme-level
 from __future__ import annotations
 
 import datetime as dt
+import heapq
+import threading
+import time
+from itertools import groupby
 from typing import Optional
 
-from sqlalchemy import func
+from sqlalchemy import Float, case, cast, column, event, func, inspect, table, text
 from sqlalchemy.orm import Session
 
-from app.insights import compute_debate
+from app.insights import clear_theme_insights_cache, compute_debate_bulk
 from app.models import Document, Evidence, Narrative, Theme, ThemeMentionsDaily
+from app.settings import settings
 
+# (epoch, start, end) -> (cached_at, {theme_id: sov_sum}). Daily rows only change when aggregations run,
+# which bump the epoch in-process; other processes (worker, scheduler) are bounded by the TTL.
+_SOV_CACHE: dict[tuple[int, dt.date, dt.date], tuple[float, dict[int, float]]] = {}
+_SOV_CACHE_MAX_ENTRIES = 128
+_sov_cache_lock = threading.Lock()
+_analytics_epoch = 0
 
-def _doc_timestamp():
-    return func.coalesce(Document.modified_at, Document.received_at)
+
+def bump_analytics_epoch() -> None:
+    """Invalidate cached analytics window aggregates and theme insights (call after ThemeMentionsDaily changes)."""
+    global _analytics_epoch
+    with _sov_cache_lock:
+        _analytics_epoch += 1
+        _SOV_CACHE.clear()
+    clear_theme_insights_cache()
+
+
+def _stance_count(stance: str):
+    """SUM of rows whose narrative_stance (case-insensitive) equals stance."""
+    return func.sum(case((func.lower(Narrative.narrative_stance) == stance, 1), else_=0))
 
 
 def _theme_out(t: Theme, last_updated: Optional[dt.datetime], is_new: bool = False):
@@ -30,40 +52,147 @@ def _theme_out(t: Theme, last_updated: Optional[dt.datetime], is_new: bool = Fal
     )
 
 
+# Session.info key for (Theme, last_updated) rows already loaded in this session (one request / job).
+_THEME_ROWS_KEY = "analytics_theme_rows"
+
+
+@event.listens_for(Session, "after_commit")
+@event.listens_for(Session, "after_rollback")
+def _drop_theme_rows(session: Session) -> None:
+    session.info.pop(_THEME_ROWS_KEY, None)
+
+
 def _themes_with_last_updated(db: Session, theme_ids: Optional[list[int]] = None):
-    """Return (Theme, last_updated) for all themes or given ids."""
+    """Return (Theme, last_updated) for all themes or given ids.
+
+    Rows are memoized on the session until it commits or rolls back, so analytics functions
+    called together (dashboard, universe insights) only load each theme once."""
     q = (
         db.query(Theme, func.max(Narrative.last_seen).label("last_updated"))
         .outerjoin(Narrative, Narrative.theme_id == Theme.id)
         .group_by(Theme.id)
     )
-    if theme_ids is not None:
-        q = q.filter(Theme.id.in_(theme_ids))
-    return q.all()
-
-
-def _sov_from_evidence(
-    db: Session,
-    start: dt.date,
-    end: dt.date,
-) -> dict[int, float]:
-    """Compute sum of daily share-of-voice per theme from Evidence (doc_count/total_docs per day). Use when ThemeMentionsDaily is empty."""
-    doc_date = func.date(_doc_timestamp())
-    theme_doc_rows = (
+    memo: dict[int, tuple] = db.info.setdefault(_THEME_ROWS_KEY, {})
+    if theme_ids is None:
+        rows = [tuple(r) for r in q.all()]
+        memo.update((t.id, (t, last_updated)) for t, last_updated in rows)
+        return rows
+    missing = [tid for tid in set(theme_ids) if tid not in memo]
+    if missing:
+        memo.update((t.id, (t, last_updated)) for t, last_updated in q.filter(Theme.id.in_(missing)).all())
+    return [memo[tid] for tid in dict.fromkeys(theme_ids) if tid in memo]
+
+
+# PostgreSQL materialized view (migration 0027): per (theme_id, doc_date) doc_count, total_docs,
+# share_of_voice computed from Evidence. Refreshed by run_daily_aggregations.
+_mv_theme_doc_daily = table(
+    "mv_theme_doc_daily",
+    column("theme_id"),
+    column("date"),
+    column("total_docs"),
+    column("share_of_voice"),
+)
+# Found views are remembered for the process; a missing one is looked up again after this many seconds
+# (e.g. the API started before `alembic upgrade` created it).
+_MV_RECHECK_SECONDS = 300
+_mv_available = False
+_mv_checked_at: Optional[float] = None
+
+
+def _has_theme_doc_daily_mv(db: Session) -> bool:
+    global _mv_available, _mv_checked_at
+    if _mv_available:
+        return True
+    bind = db.get_bind()
+    if bind.dialect.name != "postgresql":
+        return False
+    now = time.monotonic()
+    if _mv_checked_at is None or now - _mv_checked_at >= _MV_RECHECK_SECONDS:
+        _mv_available = "mv_theme_doc_daily" in inspect(bind).get_materialized_view_names()
+        _mv_checked_at = now
+    return _mv_available
+
+
+def refresh_theme_doc_daily(db: Session) -> None:
+    """REFRESH MATERIALIZED VIEW CONCURRENTLY mv_theme_doc_daily (no-op when the view does not exist)."""
+    if not _has_theme_doc_daily_mv(db):
+        return
+    db.execute(text("REFRESH MATERIALIZED VIEW CONCURRENTLY mv_theme_doc_daily"))
+    db.commit()
+
+
+def _theme_doc_counts(db: Session, *doc_filters):
+    """Subquery of (theme_id, date, doc_count): distinct (theme, document) pairs first, then a plain count."""
+    doc_date = Document.doc_date
+    pairs = (
         db.query(
-            Narrative.theme_id,
+            Narrative.theme_id.label("theme_id"),
+            Document.id.label("document_id"),
             doc_date.label("date"),
-            func.count(func.distinct(Document.id)).label("doc_count"),
         )
         .select_from(Evidence)
         .join(Narrative, Narrative.id == Evidence.narrative_id)
         .join(Document, Document.id == Evidence.document_id)
-        .filter(doc_date >= start, doc_date < end)
-        .group_by(Narrative.theme_id, doc_date)
+        .filter(*doc_filters)
+        .distinct()
+        .subquery()
+    )
+    return (
+        db.query(pairs.c.theme_id, pairs.c.date, func.count().label("doc_count"))
+        .group_by(pairs.c.theme_id, pairs.c.date)
+        .subquery()
+    )
+
+
+def _sov_from_mv(
+    db: Session,
+    start: dt.date,
+    end: dt.date,
+    total_by_date: dict[dt.date, int],
+) -> Optional[dict[int, float]]:
+    """
+    Per-theme share-of-voice sums for the window from mv_theme_doc_daily, or None when the view is
+    stale for it: a day's document total differs from the live total (documents arrived since the
+    last refresh), or a document with evidence is newer than the view's newest day in the window.
+    """
+    mv = _mv_theme_doc_daily
+    mv_totals = dict(
+        db.query(mv.c.date, func.max(mv.c.total_docs))
+        .filter(mv.c.date >= start, mv.c.date < end)
+        .group_by(mv.c.date)
         .all()
     )
-    if not theme_doc_rows:
-        return {}
+    if not mv_totals:
+        return None
+    if any(total_by_date.get(d, 0) != int(total or 0) for d, total in mv_totals.items()):
+        return None
+    newest_with_evidence = (
+        db.query(func.max(Document.doc_date))
+        .filter(
+            Document.doc_date >= start,
+            Document.doc_date < end,
+            db.query(Evidence.id).filter(Evidence.document_id == Document.id).exists(),
+        )
+        .scalar()
+    )
+    if newest_with_evidence is not None and newest_with_evidence > max(mv_totals):
+        return None
+    rows = (
+        db.query(mv.c.theme_id, func.sum(mv.c.share_of_voice).label("total"))
+        .filter(mv.c.date >= start, mv.c.date < end)
+        .group_by(mv.c.theme_id)
+        .all()
+    )
+    return {r.theme_id: float(r.total or 0) for r in rows}
+
+
+def _sov_from_evidence(
+    db: Session,
+    start: dt.date,
+    end: dt.date,
+) -> dict[int, float]:
+    """Compute sum of daily share-of-voice per theme from Evidence (doc_count/total_docs per day). Use when ThemeMentionsDaily is empty."""
+    doc_date = Document.doc_date
     total_rows = (
         db.query(doc_date.label("date"), func.count(Document.id).label("total"))
         .select_from(Document)
@@ -71,27 +200,61 @@ def _sov_from_evidence(
         .group_by(doc_date)
         .all()
     )
-    def _date_key(val):
-        if val is None:
-            return None
-        if hasattr(val, "isoformat"):
-            return val.isoformat()[:10]
-        return str(val)[:10]
-    total_by_date = {}
-    for row in total_rows:
-        k = _date_key(getattr(row.date, "date", None) or row.date)
-        if k:
-            total_by_date[k] = int(row.total or 0)
+    if not total_rows:
+        return {}
+    # doc_date is a DATE column, so both queries yield datetime.date keys on every backend
+    total_by_date: dict[dt.date, int] = {row.date: int(row.total or 0) for row in total_rows}
+    if _has_theme_doc_daily_mv(db):
+        from_mv = _sov_from_mv(db, start, end, total_by_date)
+        if from_mv is not None:
+            return from_mv
+    theme_docs = _theme_doc_counts(db, doc_date >= start, doc_date < end)
+    # Ordered by theme so the per-theme sum below is a single streaming pass
+    theme_doc_rows = (
+        db.query(theme_docs.c.theme_id, theme_docs.c.date, theme_docs.c.doc_count)
+        .order_by(theme_docs.c.theme_id, theme_docs.c.date)
+        .all()
+    )
     by_theme: dict[int, float] = {}
-    for r in theme_doc_rows:
-        tid = r.theme_id
-        k = _date_key(getattr(r.date, "date", None) or r.date)
-        total = total_by_date.get(k, 0) if k else 0
-        sov = float(r.doc_count or 0) / total if total > 0 else 0.0
-        by_theme[tid] = by_theme.get(tid, 0.0) + sov
+    for tid, group in groupby(theme_doc_rows, key=lambda r: r.theme_id):
+        sov_sum = 0.0
+        for r in group:
+            total = total_by_date.get(r.date, 0)
+            sov_sum += float(r.doc_count or 0) / total if total > 0 else 0.0
+        by_theme[tid] = sov_sum
     return by_theme
 
 
+def _sov_window(db: Session, start: dt.date, end: dt.date) -> dict[int, float]:
+    """Sum of ThemeMentionsDaily.share_of_voice per theme for start <= date < end (TTL-cached)."""
+    ttl = settings.analytics_cache_ttl_seconds
+    key = (_analytics_epoch, start, end)
+    if ttl > 0:
+        now = time.monotonic()
+        with _sov_cache_lock:
+            if key in _SOV_CACHE:
+                cached_at, cached = _SOV_CACHE[key]
+                if now - cached_at < ttl:
+                    return cached
+                del _SOV_CACHE[key]
+    rows = (
+        db.query(
+            ThemeMentionsDaily.theme_id,
+            func.coalesce(func.sum(ThemeMentionsDaily.share_of_voice), 0).label("total"),
+        )
+        .filter(ThemeMentionsDaily.date >= start, ThemeMentionsDaily.date < end)
+        .group_by(ThemeMentionsDaily.theme_id)
+        .all()
+    )
+    out = {r.theme_id: float(r.total or 0) for r in rows}
+    if ttl > 0:
+        with _sov_cache_lock:
+            if len(_SOV_CACHE) >= _SOV_CACHE_MAX_ENTRIES:
+                _SOV_CACHE.clear()
+            _SOV_CACHE[key] = (time.monotonic(), out)
+    return out
+
+
 def get_trending_themes(
     db: Session,
     recent_days: int = 7,
@@ -103,41 +266,18 @@ def get_trending_themes(
     recent_start = today - dt.timedelta(days=recent_days)
     prior_start = today - dt.timedelta(days=recent_days + prior_days)
     # Sum share_of_voice per theme in each window (daily SoV = theme's share that day)
-    recent_rows = (
-        db.query(
-            ThemeMentionsDaily.theme_id,
-            func.coalesce(func.sum(ThemeMentionsDaily.share_of_voice), 0).label("total"),
-        )
-        .filter(
-            ThemeMentionsDaily.date >= recent_start,
-            ThemeMentionsDaily.date < today,
-        )
-        .group_by(ThemeMentionsDaily.theme_id)
-        .all()
-    )
-    prior_rows = (
-        db.query(
-            ThemeMentionsDaily.theme_id,
-            func.coalesce(func.sum(ThemeMentionsDaily.share_of_voice), 0).label("total"),
-        )
-        .filter(
-            ThemeMentionsDaily.date >= prior_start,
-            ThemeMentionsDaily.date < recent_start,
-        )
-        .group_by(ThemeMentionsDaily.theme_id)
-        .all()
-    )
-    recent_by_id = {r.theme_id: float(r.total or 0) for r in recent_rows}
-    prior_by_id = {r.theme_id: float(r.total or 0) for r in prior_rows}
+    recent_by_id = _sov_window(db, recent_start, today)
+    prior_by_id = _sov_window(db, prior_start, recent_start)
     # Fallback: if ThemeMentionsDaily is empty (e.g. daily aggregations not run), compute SoV from Evidence
     if not recent_by_id and not prior_by_id:
         recent_by_id = _sov_from_evidence(db, recent_start, today)
         prior_by_id = _sov_from_evidence(db, prior_start, recent_start)
-    theme_ids = sorted(
-        set(recent_by_id.keys()) | set(prior_by_id.keys()),
-        key=lambda tid: (recent_by_id.get(tid, 0.0) - prior_by_id.get(tid, 0.0)),
-        reverse=True,
-    )[:limit]
+    # SoV change per theme computed once; top-K by heap instead of sorting every theme
+    delta = {
+        tid: recent_by_id.get(tid, 0.0) - prior_by_id.get(tid, 0.0)
+        for tid in set(recent_by_id.keys()) | set(prior_by_id.keys())
+    }
+    theme_ids = heapq.nlargest(limit, delta, key=delta.__getitem__)
     if not theme_ids:
         return []
     cutoff_new = today - dt.timedelta(days=7)
@@ -160,90 +300,50 @@ def get_sentiment_rankings(
 ) -> dict:
     """Most positive and most negative themes by SoV-weighted sentiment (relative: no absolute counts). Score = sum_d(SoV_d * sentiment_d) / sum_d(SoV_d)."""
     since = dt.date.today() - dt.timedelta(days=days)
-    doc_date = func.date(_doc_timestamp())
-    # Per (theme_id, date): stance counts
-    stance_rows = (
+    doc_date = Document.doc_date
+    # Per (theme_id, date): bullish/bearish/all mention counts in one pass over Evidence
+    daily = (
         db.query(
-            Narrative.theme_id,
+            Narrative.theme_id.label("theme_id"),
             doc_date.label("date"),
-            Narrative.narrative_stance,
-            func.count(Evidence.id).label("cnt"),
-        )
-        .select_from(Evidence)
-        .join(Narrative, Narrative.id == Evidence.narrative_id)
-        .join(Document, Document.id == Evidence.document_id)
-        .filter(doc_date >= since)
-        .group_by(Narrative.theme_id, doc_date, Narrative.narrative_stance)
-        .all()
-    )
-    theme_doc_rows = (
-        db.query(
-            Narrative.theme_id,
-            doc_date.label("date"),
-            func.count(func.distinct(Document.id)).label("doc_count"),
+            _stance_count("bullish").label("bull"),
+            _stance_count("bearish").label("bear"),
+            func.count(Evidence.id).label("mentions"),
         )
         .select_from(Evidence)
         .join(Narrative, Narrative.id == Evidence.narrative_id)
         .join(Document, Document.id == Evidence.document_id)
         .filter(doc_date >= since)
         .group_by(Narrative.theme_id, doc_date)
-        .all()
+        .subquery()
     )
-    total_doc_rows = (
+    theme_docs = _theme_doc_counts(db, doc_date >= since)
+    totals = (
         db.query(doc_date.label("date"), func.count(Document.id).label("total"))
         .select_from(Document)
         .filter(doc_date >= since)
         .group_by(doc_date)
-        .all()
+        .subquery()
     )
-
-    def _dk(v):
-        if v is None:
-            return None
-        return (getattr(v, "isoformat", None) and v.isoformat() or str(v))[:10]
-
-    total_by_date = {}
-    for row in total_doc_rows:
-        k = _dk(getattr(row.date, "date", None) or row.date)
-        if k:
-            total_by_date[k] = int(row.total or 0)
-    theme_docs: dict[tuple[int, str], int] = {}
-    for r in theme_doc_rows:
-        k = _dk(getattr(r.date, "date", None) or r.date)
-        if k:
-            theme_docs[(r.theme_id, k)] = int(r.doc_count or 0)
-    by_theme_date: dict[int, dict[str, dict[str, int]]] = {}
-    for r in stance_rows:
-        tid = r.theme_id
-        k = _dk(getattr(r.date, "date", None) or r.date)
-        if not k:
-            continue
-        st = (r.narrative_stance or "neutral").lower()
-        if st not in ("bullish", "bearish", "mixed", "neutral"):
-            st = "neutral"
-        if tid not in by_theme_date:
-            by_theme_date[tid] = {}
-        if k not in by_theme_date[tid]:
-            by_theme_date[tid][k] = {"bullish": 0, "bearish": 0, "mixed": 0, "neutral": 0}
-        by_theme_date[tid][k][st] = by_theme_date[tid][k].get(st, 0) + int(r.cnt or 0)
-
-    scores = []
-    for tid, dates in by_theme_date.items():
-        weighted_sum = 0.0
-        sov_sum = 0.0
-        for k, counts in dates.items():
-            total_mentions = sum(counts.values())
-            sentiment_d = (counts.get("bullish", 0) - counts.get("bearish", 0)) / total_mentions if total_mentions else 0.0
-            theme_docs_d = theme_docs.get((tid, k), 0)
-            total_d = total_by_date.get(k, 0)
-            sov_d = theme_docs_d / total_d if total_d > 0 else 0.0
-            weighted_sum += sov_d * sentiment_d
-            sov_sum += sov_d
-        if sov_sum > 0:
-            scores.append((tid, weighted_sum / sov_sum))
-    scores.sort(key=lambda x: -x[1])
-    most_positive_ids = [tid for tid, _ in scores[:limit]]
-    most_negative_ids = [tid for tid, _ in reversed(scores[-limit:])]
+    # SoV_d = theme_docs / total docs that day; sentiment_d = (bullish - bearish) / mentions
+    sov_d = cast(theme_docs.c.doc_count, Float) / totals.c.total
+    sentiment_d = cast(daily.c.bull - daily.c.bear, Float) / daily.c.mentions
+    # Score = sum_d(SoV_d * sentiment_d) / sum_d(SoV_d), ranked by the database (ties by theme id)
+    sov_sum = func.sum(sov_d)
+    score = func.sum(sov_d * sentiment_d) / sov_sum
+    ranked_ids = [
+        r.theme_id
+        for r in db.query(daily.c.theme_id)
+        .join(theme_docs, (theme_docs.c.theme_id == daily.c.theme_id) & (theme_docs.c.date == daily.c.date))
+        .join(totals, totals.c.date == daily.c.date)
+        .filter(totals.c.total > 0)
+        .group_by(daily.c.theme_id)
+        .having(sov_sum > 0)
+        .order_by(score.desc(), daily.c.theme_id)
+        .all()
+    ]
+    most_positive_ids = ranked_ids[:limit]
+    most_negative_ids = ranked_ids[::-1][:limit]
     cutoff_new = dt.date.today() - dt.timedelta(days=7)
     def build_list(ids):
         if not ids:
@@ -265,6 +365,39 @@ def get_sentiment_rankings(
     }
 
 
+def _window_stance_counts(
+    db: Session, windows: list[tuple[str, dt.date, dt.date]]
+) -> dict[str, dict[int, tuple[int, int, int]]]:
+    """Per window label: theme_id -> (bullish, bearish, total) mention counts for start <= doc date < end.
+
+    All windows are bucketed with a CASE over doc_date, so Evidence is scanned once."""
+    doc_date = Document.doc_date
+    bucket = case(
+        *[((doc_date >= start) & (doc_date < end), label) for label, start, end in windows]
+    ).label("bucket")
+    rows = (
+        db.query(
+            bucket,
+            Narrative.theme_id,
+            _stance_count("bullish").label("bull"),
+            _stance_count("bearish").label("bear"),
+            func.count(Evidence.id).label("mention_count"),
+        )
+        .select_from(Evidence)
+        .join(Narrative, Narrative.id == Evidence.narrative_id)
+        .join(Document, Document.id == Evidence.document_id)
+        .filter(doc_date >= min(w[1] for w in windows), doc_date < max(w[2] for w in windows))
+        .group_by(bucket, Narrative.theme_id)
+        .all()
+    )
+    out: dict[str, dict[int, tuple[int, int, int]]] = {label: {} for label, _, _ in windows}
+    for r in rows:
+        if r.bucket is None:
+            continue
+        out[r.bucket][r.theme_id] = (int(r.bull or 0), int(r.bear or 0), int(r.mention_count or 0))
+    return out
+
+
 def get_inflections(
     db: Session,
     recent_days: int = 14,
@@ -275,82 +408,36 @@ def get_inflections(
     today = dt.date.today()
     recent_start = today - dt.timedelta(days=recent_days)
     prior_start = today - dt.timedelta(days=recent_days + prior_days)
-    doc_date = func.date(_doc_timestamp())
-
-    # Stance aggregates per theme per window
-    def stance_aggregates(start: dt.date, end: dt.date):
-        rows = (
-            db.query(
-                Narrative.theme_id,
-                Narrative.narrative_stance,
-                func.count(Evidence.id).label("mention_count"),
-            )
-            .select_from(Evidence)
-            .join(Narrative, Narrative.id == Evidence.narrative_id)
-            .join(Document, Document.id == Evidence.document_id)
-            .filter(doc_date >= start, doc_date < end)
-            .group_by(Narrative.theme_id, Narrative.narrative_stance)
-            .all()
-            )
-        by_theme: dict[int, dict[str, int]] = {}
-        for r in rows:
-            tid = r.theme_id
-            st = (r.narrative_stance or "neutral").lower()
-            if st not in ("bullish", "bearish", "mixed", "neutral"):
-                st = "neutral"
-            if tid not in by_theme:
-                by_theme[tid] = {"bullish": 0, "bearish": 0, "mixed": 0, "neutral": 0}
-            by_theme[tid][st] = by_theme[tid].get(st, 0) + int(r.mention_count or 0)
-        return by_theme
-
-    recent_stance = stance_aggregates(recent_start, today)
-    prior_stance = stance_aggregates(prior_start, recent_start)
+    # Stance aggregates per theme per window: (bullish, bearish, total) mention counts, both windows in one scan
+    stance_by_window = _window_stance_counts(
+        db, [("recent", recent_start, today), ("prior", prior_start, recent_start)]
+    )
+    recent_stance = stance_by_window["recent"]
+    prior_stance = stance_by_window["prior"]
 
     # SoV sums per theme per window (share_of_voice so adding data sources does not distort relative attention)
-    recent_sov = (
-        db.query(
-            ThemeMentionsDaily.theme_id,
-            func.coalesce(func.sum(ThemeMentionsDaily.share_of_voice), 0).label("total"),
-        )
-        .filter(ThemeMentionsDaily.date >= recent_start, ThemeMentionsDaily.date < today)
-        .group_by(ThemeMentionsDaily.theme_id)
-        .all()
-    )
-    prior_sov = (
-        db.query(
-            ThemeMentionsDaily.theme_id,
-            func.coalesce(func.sum(ThemeMentionsDaily.share_of_voice), 0).label("total"),
-        )
-        .filter(ThemeMentionsDaily.date >= prior_start, ThemeMentionsDaily.date < recent_start)
-        .group_by(ThemeMentionsDaily.theme_id)
-        .all()
-    )
-    recent_sov_by_id = {r.theme_id: float(r.total or 0) for r in recent_sov}
-    prior_sov_by_id = {r.theme_id: float(r.total or 0) for r in prior_sov}
+    recent_sov_by_id = _sov_window(db, recent_start, today)
+    prior_sov_by_id = _sov_window(db, prior_start, recent_start)
     # Fallback: when ThemeMentionsDaily is empty, compute SoV from Evidence (relative: doc share per day)
     if not recent_sov_by_id and not prior_sov_by_id:
         recent_sov_by_id = _sov_from_evidence(db, recent_start, today)
         prior_sov_by_id = _sov_from_evidence(db, prior_start, recent_start)
 
-    def dominant_stance(counts: dict) -> str:
-        if not counts:
-            return "neutral"
-        total = sum(counts.values())
+    def dominant_stance(counts: tuple[int, int, int]) -> str:
+        bull, bear, total = counts
         if total == 0:
             return "neutral"
-        bull = counts.get("bullish", 0)
-        bear = counts.get("bearish", 0)
         if bull >= total * 0.5:
             return "bullish"
         if bear >= total * 0.5:
             return "bearish"
         return "mixed"
 
-    def recent_bull_share(counts: dict) -> float:
-        total = sum(counts.values())
+    def recent_bull_share(counts: tuple[int, int, int]) -> float:
+        bull, _, total = counts
         if total == 0:
             return 0.0
-        return counts.get("bullish", 0) / total
+        return bull / total
 
     bullish_turning = []   # prior dominant bullish, recent not bullish
     bearish_turning = []  # prior dominant bearish, recent not bearish
@@ -361,8 +448,8 @@ def get_inflections(
     cutoff_new = today - dt.timedelta(days=7)
 
     for tid in all_theme_ids:
-        pr_st = prior_stance.get(tid, {})
-        re_st = recent_stance.get(tid, {})
+        pr_st = prior_stance.get(tid, (0, 0, 0))
+        re_st = recent_stance.get(tid, (0, 0, 0))
         prior_dom = dominant_stance(pr_st)
         recent_dom = dominant_stance(re_st)
         re_sov = recent_sov_by_id.get(tid, 0)
@@ -378,10 +465,11 @@ def get_inflections(
         if re_sov > 0 and re_bull >= 0.5:
             most_crowded.append((tid, re_bull, re_sov))
 
-    bullish_turning.sort(key=lambda x: -x[1])
-    bearish_turning.sort(key=lambda x: -x[1])
-    attention_peaking.sort(key=lambda x: -x[1])
-    most_crowded.sort(key=lambda x: (-x[2], -x[1]))
+    # Only the top `limit` of each list is returned; heap selection keeps sort order and tie order
+    bullish_turning = heapq.nlargest(limit, bullish_turning, key=lambda x: x[1])
+    bearish_turning = heapq.nlargest(limit, bearish_turning, key=lambda x: x[1])
+    attention_peaking = heapq.nlargest(limit, attention_peaking, key=lambda x: x[1])
+    most_crowded = heapq.nlargest(limit, most_crowded, key=lambda x: (x[2], x[1]))
 
     def to_theme_list(pairs, key_fn=lambda x: x[0], take=limit):
         ids = [key_fn(p) for p in pairs[:take]]
@@ -414,21 +502,11 @@ def get_debated_themes(
     min_score: float = 0.3,
 ) -> list:
     """Themes with debate score (1 - top_share) above threshold."""
-    since = dt.date.today() - dt.timedelta(days=days)
-    theme_ids = [
-        r.theme_id
-        for r in db.query(Narrative.theme_id)
-        .join(Evidence, Evidence.narrative_id == Narrative.id)
-        .join(Document, Evidence.document_id == Document.id)
-        .filter(func.date(_doc_timestamp()) >= since)
-        .distinct()
-        .all()
+    scored = [
+        (tid, d.score)
+        for tid, d in compute_debate_bulk(db, lookback_days=days).items()
+        if d.score >= min_score
     ]
-    scored = []
-    for tid in theme_ids:
-        d = compute_debate(db, tid, lookback_days=days)
-        if d and d.score >= min_score:
-            scored.append((tid, d.score))
     scored.sort(key=lambda x: -x[1])
     ids = [tid for tid, _ in scored[:limit]]
     if not ids:
@@ -447,37 +525,46 @@ def get_debated_themes(
     ]
 
 
-def get_active_theme_ids(db: Session, active_days: int) -> set[int]:
-    """Theme IDs that have evidence in the last active_days (by document date). Shared definition for active vs archived/inactive."""
+def _active_theme_ids_query(db: Session, active_days: int):
+    """Distinct Narrative.theme_id with evidence in the last active_days (by document date)."""
     since_date = dt.date.today() - dt.timedelta(days=active_days)
-    doc_date = func.date(_doc_timestamp())
-    return set(
-        r.theme_id
-        for r in db.query(Narrative.theme_id)
+    doc_date = Document.doc_date
+    return (
+        db.query(Narrative.theme_id)
         .join(Evidence, Evidence.narrative_id == Narrative.id)
         .join(Document, Evidence.document_id == Document.id)
         .filter(doc_date >= since_date)
         .distinct()
-        .all()
     )
 
 
+def get_active_theme_ids(db: Session, active_days: int) -> set[int]:
+    """Theme IDs that have evidence in the last active_days (by document date). Shared definition for active vs archived/inactive."""
+    return set(r.theme_id for r in _active_theme_ids_query(db, active_days).all())
+
+
 def get_archived_themes(
     db: Session,
     inactive_days: int = 60,
 ) -> list:
     """Themes with no evidence in the last N days (inactive = not in get_active_theme_ids)."""
-    active_ids = get_active_theme_ids(db, inactive_days)
-    all_themes = db.query(Theme).all()
-    archived = [t for t in all_themes if t.id not in active_ids]
+    # One query: anti-join against the active-theme subquery, with last_updated aggregated alongside.
+    active = _active_theme_ids_query(db, inactive_days).subquery()
+    rows = (
+        db.query(Theme, func.max(Narrative.last_seen).label("last_updated"))
+        .outerjoin(Narrative, Narrative.theme_id == Theme.id)
+        .outerjoin(active, active.c.theme_id == Theme.id)
+        .filter(active.c.theme_id.is_(None))
+        .group_by(Theme.id)
+        .order_by(Theme.id)
+        .all()
+    )
     cutoff_new = dt.date.today() - dt.timedelta(days=7)
-    rows = _themes_with_last_updated(db, [t.id for t in archived])
-    id_to_last = {tid: last_updated for _t, last_updated in rows for tid in [_t.id]}
     return [
         _theme_out(
             t,
-            id_to_last.get(t.id),
+            last_updated,
             t.created_at and t.created_at.date() >= cutoff_new,
         )
-        for t in archived
+        for t, last_updated in rows
     ]
@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, event, text
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import NullPool
 
@@ -19,6 +19,17 @@ if settings.database_url.startswith("sqlite"):
         connect_args=_connect_args,
         poolclass=NullPool,
     )
+
+    @event.listens_for(engine, "connect")
+    def _sqlite_pragmas(dbapi_conn, _record) -> None:
+        # Per-connection settings (NullPool opens one per session). synchronous=NORMAL is safe with WAL;
+        # a 1 GB mmap lets large Evidence scans read from the OS page cache, which outlives the connection
+        # (a bigger cache_size would not: the private page cache is dropped with each NullPool connection).
+        cur = dbapi_conn.cursor()
+        cur.execute("PRAGMA synchronous=NORMAL")
+        cur.execute("PRAGMA mmap_size=1073741824")
+        cur.execute("PRAGMA temp_store=MEMORY")
+        cur.close()
 else:
     engine = create_engine(
         settings.database_url,
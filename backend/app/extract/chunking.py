@@ -25,16 +25,22 @@ def chunk_pages(
     Keeps approximate page ranges by tracking boundaries.
     """
     chunks: list[ChunkOut] = []
-    buf = ""
+    # Working buffer as parts joined by "\n\n" on flush (no repeated str concatenation);
+    # buf_len is the length of that joined text.
+    buf_parts: list[str] = []
+    buf_len = 0
     buf_page_start: Optional[int] = None
     buf_page_end: Optional[int] = None
     idx = 0
 
     def flush():
-        nonlocal buf, buf_page_start, buf_page_end, idx
-        text = buf.strip()
+        nonlocal buf_parts, buf_len, buf_page_start, buf_page_end, idx
+        # Parts are stripped on the way in (the overlap part left-stripped), so the join
+        # needs no second full-buffer strip.
+        text = "\n\n".join(buf_parts)
         if not text:
-            buf = ""
+            buf_parts = []
+            buf_len = 0
             buf_page_start = None
             buf_page_end = None
             return
@@ -48,7 +54,13 @@ def chunk_pages(
         )
         idx += 1
         # overlap
-        buf = text[-overlap_chars:] if overlap_chars and len(text) > overlap_chars else ""
+        if overlap_chars and len(text) > overlap_chars:
+            # text ends in non-whitespace; buf_len still counts the stripped leading whitespace
+            buf_parts = [text[-overlap_chars:].lstrip()]
+            buf_len = overlap_chars
+        else:
+            buf_parts = []
+            buf_len = 0
         buf_page_start = buf_page_end
 
     for p in pages:
@@ -60,12 +72,12 @@ def chunk_pages(
         if not add:
             continue
 
-        if len(buf) + len(add) + 2 > max_chars:
+        if buf_len + len(add) + 2 > max_chars:
             flush()
-        if buf:
-            buf += "\n\n"
-        buf += add
+        if buf_parts:
+            buf_len += 2
+        buf_parts.append(add)
+        buf_len += len(add)
 
     flush()
     return chunks
-
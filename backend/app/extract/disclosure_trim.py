@@ -37,10 +37,32 @@ _DISCLOSURE_HEADINGS = [
     r"\bcertification\s+(?:of\s+)?(?:disclosure|independence)\b",
     r"\bregulatory\s+certification\b",
 ]
-_PATTERN = re.compile(
-    "|".join(f"(?:{p})" for p in _DISCLOSURE_HEADINGS),
-    re.IGNORECASE | re.MULTILINE,
-)
+
+
+def _build_pattern(headings: list[str]) -> re.Pattern[str]:
+    """
+    Compile the headings into one regex with the same matches as a flat alternation, but with
+    the word-start headings grouped under a shared \\b and their first letter. re tries
+    alternatives one by one at every position, so this rejects most positions after one or two
+    checks instead of ~25.
+    """
+    by_first: dict[str, list[str]] = {}
+    other: list[str] = []
+    for p in headings:
+        if p.startswith(r"\b") and p[2:3].isalpha():
+            by_first.setdefault(p[2].lower(), []).append(p[3:])
+        else:
+            other.append(p)
+    word_start = r"\b(?:" + "|".join(
+        f"{c}(?:" + "|".join(f"(?:{rest})" for rest in tails) + ")" for c, tails in by_first.items()
+    ) + ")"
+    return re.compile(
+        "|".join([*(f"(?:{p})" for p in other), word_start]),
+        re.IGNORECASE | re.MULTILINE,
+    )
+
+
+_PATTERN = _build_pattern(_DISCLOSURE_HEADINGS)
 
 # Max fraction of document to keep if we trim from the end (when no heading found)
 _MAX_END_FRACTION = 0.85
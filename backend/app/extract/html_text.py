@@ -4,12 +4,41 @@ from __future__ import annotations
 
 from bs4 import BeautifulSoup
 
+try:
+    import lxml.html
+    from lxml import etree
+except ImportError:  # fall back to BeautifulSoup's pure-Python parser
+    lxml = None
 
-def html_to_plain_text(html_bytes: bytes) -> str:
+
+def _lxml_plain_text(html_bytes: bytes | memoryview) -> str:
+    """Same output as BeautifulSoup get_text(separator="\n", strip=True), via libxml2."""
+    # libxml2 decodes the bytes itself (UTF-8 forced, invalid bytes -> U+FFFD like errors="replace"),
+    # so no intermediate Python str is built. Parsers are not thread-safe; make one per call.
+    parser = lxml.html.HTMLParser(encoding="utf-8")
+    root = lxml.html.document_fromstring(bytes(html_bytes), parser=parser)
+    # get_text skips script/style/template contents (itertext already skips comments and PIs).
+    # Empty them in place rather than removing them so their tail text stays a separate string.
+    for el in root.iter("script", "style", "template"):
+        el.text = None
+        del el[:]
+    return "\n".join(s for s in (t.strip() for t in root.itertext()) if s)
+
+
+def html_to_plain_text(html_bytes: bytes | bytearray | memoryview) -> str:
     """
-    Decode HTML bytes as UTF-8 and extract plain text using BeautifulSoup.
-    Suitable for email/Substack HTML bodies.
+    Decode HTML bytes as UTF-8 and extract plain text.
+    Suitable for email/Substack HTML bodies. Uses lxml when installed (C parser, no
+    BeautifulSoup tree), else BeautifulSoup with the stdlib html.parser.
     """
-    text = html_bytes.decode("utf-8", errors="replace")
+    if lxml is not None:
+        try:
+            return _lxml_plain_text(html_bytes)
+        except (ValueError, etree.ParserError):
+            # e.g. whitespace-only input ("Document is empty"); the str path below handles it.
+            pass
+    text = bytes(html_bytes).decode("utf-8", errors="replace")
+    if not text.strip():
+        return ""
     soup = BeautifulSoup(text, "html.parser")
     return soup.get_text(separator="\n", strip=True)
@@ -1,12 +1,28 @@
 from __future__ import annotations
 
 import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from dataclasses import dataclass
 
 import fitz  # PyMuPDF
 
 logger = logging.getLogger("investing_agent.extract.pdf_text")
 
+# PDFs with at least this many pages are split into page ranges and extracted in worker processes
+# (PyMuPDF objects are not thread-safe, so each process opens its own copy of the document).
+# Below this, sequential extraction beats pickling the document to each worker.
+_PARALLEL_MIN_PAGES = 400
+_MAX_PAGE_WORKERS = 4
+
+# One long-lived spawn pool per process, created on the first large PDF (spawning interpreters per call
+# costs more than extracting a few hundred pages).
+_page_pool: ProcessPoolExecutor | None = None
+_page_pool_lock = threading.Lock()
+
 
 class PDFStructureError(Exception):
     """Raised when the PDF has invalid structure (e.g. corrupted or malformed page tree)."""
@@ -18,38 +34,87 @@ class PageText:
     text: str
 
 
-def extract_text_from_pdf(pdf_bytes: bytes) -> tuple[list[PageText], int]:
+def _is_structure_error(msg: str) -> bool:
+    low = msg.lower()
+    return "page tree" in low or "format error" in low or "non-page" in low
+
+
+def _page_text(doc: "fitz.Document", i: int) -> str:
+    try:
+        return doc.load_page(i).get_text("text") or ""
+    except Exception as e:
+        msg = str(e).strip()
+        logger.error("PyMuPDF failed on page %s: %s", i + 1, msg, exc_info=True)
+        if _is_structure_error(msg):
+            raise PDFStructureError(
+                f"PDF structure error on page {i + 1}: {msg}. The file may be corrupted or malformed."
+            ) from e
+        raise
+
+
+def _extract_page_range(pdf_bytes: bytes, start: int, stop: int) -> list[str]:
+    """Worker-process entry point: text of pages [start, stop) from a fresh copy of the document."""
+    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+    try:
+        return [_page_text(doc, i) for i in range(start, stop)]
+    finally:
+        doc.close()
+
+
+def _get_page_pool(workers: int) -> ProcessPoolExecutor:
+    global _page_pool
+    with _page_pool_lock:
+        if _page_pool is None:
+            # spawn, not fork: the ingest worker runs jobs on threads.
+            _page_pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        return _page_pool
+
+
+def _discard_page_pool(pool: ProcessPoolExecutor) -> None:
+    """Drop a broken pool (e.g. a worker was killed) so the next large PDF starts a fresh one."""
+    global _page_pool
+    with _page_pool_lock:
+        if _page_pool is pool:
+            _page_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def extract_text_from_pdf(pdf_bytes: bytes | bytearray | memoryview) -> tuple[list[PageText], int]:
     """
     Extract text from each page. Raises PDFStructureError on malformed PDFs
     (e.g. "non-page object in page tree") so the ingest job fails with a clear message.
+    Buffers (bytearray/memoryview of an upload) are handed to PyMuPDF without a bytes copy.
     """
     try:
         doc = fitz.open(stream=pdf_bytes, filetype="pdf")
     except Exception as e:
         msg = str(e).strip()
         logger.error("PyMuPDF failed to open PDF: %s", msg, exc_info=True)
-        if "page tree" in msg.lower() or "format error" in msg.lower() or "non-page" in msg.lower():
+        if _is_structure_error(msg):
             raise PDFStructureError(
                 f"PDF structure error: {msg}. The file may be corrupted or malformed (e.g. from a buggy export)."
             ) from e
         raise
 
-    pages: list[PageText] = []
     try:
-        for i in range(doc.page_count):
+        page_count = doc.page_count
+        texts: list[str] = [""] * page_count
+        workers = min(_MAX_PAGE_WORKERS, os.cpu_count() or 1)
+        if page_count < _PARALLEL_MIN_PAGES or workers < 2:
+            for i in range(page_count):
+                texts[i] = _page_text(doc, i)
+        else:
+            bounds = [(k * page_count // workers, (k + 1) * page_count // workers) for k in range(workers)]
+            # Worker arguments are pickled, which memoryview does not support.
+            payload = pdf_bytes if isinstance(pdf_bytes, (bytes, bytearray)) else bytes(pdf_bytes)
+            pool = _get_page_pool(workers)
             try:
-                page = doc.load_page(i)
-                text = page.get_text("text") or ""
-                pages.append(PageText(page=i + 1, text=text))
-            except Exception as e:
-                msg = str(e).strip()
-                logger.error("PyMuPDF failed on page %s: %s", i + 1, msg, exc_info=True)
-                if "page tree" in msg.lower() or "format error" in msg.lower() or "non-page" in msg.lower():
-                    raise PDFStructureError(
-                        f"PDF structure error on page {i + 1}: {msg}. The file may be corrupted or malformed."
-                    ) from e
+                futures = [pool.submit(_extract_page_range, payload, start, stop) for start, stop in bounds]
+                for (start, stop), fut in zip(bounds, futures):
+                    texts[start:stop] = fut.result()
+            except BrokenProcessPool:
+                _discard_page_pool(pool)
                 raise
-        return pages, doc.page_count
+        return [PageText(page=i + 1, text=t) for i, t in enumerate(texts)], page_count
     finally:
         doc.close()
-
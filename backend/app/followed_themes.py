@@ -5,6 +5,9 @@ Single global store (no per-user in MVP).
 from __future__ import annotations
 
 import json
+import os
+import tempfile
+import threading
 from datetime import datetime, timezone
 from pathlib import Path
 
@@ -18,11 +21,12 @@ def _state_dir() -> Path:
 _FOLLOWED_FILE = _state_dir() / "followed_themes.json"
 _MAX_ENTRIES = 500
 
+# Parsed file contents keyed by (st_mtime_ns, st_size); re-read only when the file changes on disk.
+_cache: tuple[tuple[int, int], dict[str, str]] | None = None
+_lock = threading.Lock()
 
-def _load_raw() -> dict[str, str]:
-    """Return { theme_id: added_at_iso }."""
-    if not _FOLLOWED_FILE.exists():
-        return {}
+
+def _read_file() -> dict[str, str]:
     try:
         data = json.loads(_FOLLOWED_FILE.read_text(encoding="utf-8"))
         if isinstance(data, dict):
@@ -32,14 +36,51 @@ def _load_raw() -> dict[str, str]:
     return {}
 
 
+def _load_cached() -> dict[str, str]:
+    """Return { theme_id: added_at_iso } shared with the cache — callers must not mutate it."""
+    global _cache
+    try:
+        st = _FOLLOWED_FILE.stat()
+    except OSError:
+        return {}
+    stamp = (st.st_mtime_ns, st.st_size)
+    with _lock:
+        if _cache is not None and _cache[0] == stamp:
+            return _cache[1]
+        data = _read_file()
+        _cache = (stamp, data)
+        return data
+
+
+def _load_raw() -> dict[str, str]:
+    """Return { theme_id: added_at_iso } (a copy the caller may modify)."""
+    return dict(_load_cached())
+
+
 def _save_raw(data: dict[str, str]) -> None:
+    global _cache
     _FOLLOWED_FILE.parent.mkdir(parents=True, exist_ok=True)
-    _FOLLOWED_FILE.write_text(json.dumps(data, indent=2), encoding="utf-8")
+    # Write to a temp file in the same directory and rename over the target, so readers never see
+    # a half-written file and a crash mid-write leaves the previous contents intact.
+    fd, tmp = tempfile.mkstemp(dir=_FOLLOWED_FILE.parent, prefix=".followed_themes.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(json.dumps(data, indent=2))
+        os.replace(tmp, _FOLLOWED_FILE)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+    st = _FOLLOWED_FILE.stat()
+    with _lock:
+        _cache = ((st.st_mtime_ns, st.st_size), dict(data))
 
 
 def get_followed_theme_ids() -> list[int]:
     """Return ordered list of followed theme IDs (newest first by added_at)."""
-    raw = _load_raw()
+    raw = _load_cached()
     items = [(int(k), v) for k, v in raw.items() if k.isdigit()]
     items.sort(key=lambda x: x[1], reverse=True)
     return [tid for tid, _ in items]
@@ -74,6 +115,11 @@ def unfollow_theme(theme_id: int) -> bool:
     return True
 
 
+def get_followed_set() -> frozenset[int]:
+    """Followed theme IDs as a set, for membership checks over many themes (one file check, not one per theme)."""
+    return frozenset(int(k) for k in _load_cached() if k.isdigit())
+
+
 def is_followed(theme_id: int) -> bool:
     """Return whether the theme is in the followed list."""
-    return theme_id > 0 and str(theme_id) in _load_raw()
+    return theme_id > 0 and str(theme_id) in _load_cached()
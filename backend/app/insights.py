@@ -11,13 +11,18 @@ Designed to answer:
 from __future__ import annotations
 
 import datetime as dt
-from collections import defaultdict
-from typing import TYPE_CHECKING, Optional
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Callable, Optional
 
-from sqlalchemy import func
+from sqlalchemy import Date, Float, case, cast, func
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.orm import Session
+from sqlalchemy.sql.expression import FunctionElement
 
 from app.models import Document, Evidence, Narrative, Theme
+from app.settings import settings
 
 if TYPE_CHECKING:
     from app.schemas import (
@@ -29,12 +34,43 @@ if TYPE_CHECKING:
     )
 
 
-def _doc_date():
-    return func.date(func.coalesce(Document.modified_at, Document.received_at))
+# In-process TTL cache for get_theme_insights: (theme_id, months, day) -> (monotonic time, evidence
+# watermark, payload). An entry is only served while max(evidence.id) is unchanged, so evidence committed
+# by any process (e.g. the ingest worker) invalidates it on the next request; the TTL bounds staleness from
+# edits that do not insert evidence (theme merges, deletes). Also cleared by bump_analytics_epoch().
+_INSIGHTS_CACHE: dict[tuple[int, int, dt.date], tuple[float, Optional[int], "ThemeInsightsOut"]] = {}
+_INSIGHTS_CACHE_MAX_ENTRIES = 512
+_insights_cache_lock = threading.Lock()
 
 
-def _doc_timestamp():
-    return func.coalesce(Document.modified_at, Document.received_at)
+def clear_theme_insights_cache() -> None:
+    with _insights_cache_lock:
+        _INSIGHTS_CACHE.clear()
+
+
+class _week_start(FunctionElement):
+    """Monday of the week containing a DATE (ISO weeks, matching date.weekday())."""
+
+    type = Date()
+    inherit_cache = True
+
+
+@compiles(_week_start)
+def _week_start_sqlite(element, compiler, **kw):
+    # 'weekday 0' moves forward to Sunday (no-op on Sunday); six days back is that week's Monday.
+    return "date(%s, 'weekday 0', '-6 days')" % compiler.process(element.clauses, **kw)
+
+
+@compiles(_week_start, "postgresql")
+def _week_start_pg(element, compiler, **kw):
+    return "(date_trunc('week', %s)::date)" % compiler.process(element.clauses, **kw)
+
+
+_TRAJECTORY_NOTES = {
+    "improving": "Rising attention and share of voice",
+    "worsening": "Declining attention or share",
+    "mixed": "Mixed or volatile signals",
+}
 
 
 def compute_trajectory(
@@ -49,95 +85,78 @@ def compute_trajectory(
     """
     from app.schemas import TrajectoryPointOut
 
-    # Get daily metrics (from Evidence if no ThemeMentionsDaily)
-    doc_date = _doc_date()
-    daily = (
+    doc_date = Document.doc_date
+    # Per day with mentions: theme mention count and share of that day's documents, in one pass
+    # over the day's documents with the theme's evidence outer-joined on
+    theme_evidence = (
+        db.query(Evidence.id, Evidence.document_id)
+        .join(Narrative, Evidence.narrative_id == Narrative.id)
+        .filter(Narrative.theme_id == theme_id)
+        .subquery()
+    )
+    mentions = func.count(theme_evidence.c.id)
+    per_day = (
         db.query(
             doc_date.label("date"),
-            func.count(Evidence.id).label("mention_count"),
-            func.count(func.distinct(Document.id)).label("doc_count"),
+            mentions.label("mentions"),
+            (cast(mentions, Float) / func.count(func.distinct(Document.id))).label("share"),
         )
-        .select_from(Evidence)
-        .join(Narrative, Evidence.narrative_id == Narrative.id)
-        .join(Document, Evidence.document_id == Document.id)
-        .filter(Narrative.theme_id == theme_id, doc_date >= since)
-        .group_by(doc_date)
-        .order_by(doc_date.asc())
-        .all()
-    )
-    if not daily:
-        return []
-
-    # Total docs per day for share
-    all_dates = {getattr(r.date, "isoformat", lambda: str(r.date)[:10])() for r in daily}
-    total_docs_q = (
-        db.query(doc_date.label("date"), func.count(Document.id).label("total"))
         .select_from(Document)
+        .outerjoin(theme_evidence, theme_evidence.c.document_id == Document.id)
         .filter(doc_date >= since)
         .group_by(doc_date)
+        .having(mentions > 0)
+        .subquery()
+    )
+    # Each point compares a day with the day window_days - 1 rows earlier (the start of its window)
+    by_date = per_day.c.date.asc()
+    lag = max(window_days - 1, 0)
+    lagged = db.query(
+        per_day.c.date,
+        per_day.c.mentions,
+        per_day.c.share,
+        func.lag(per_day.c.mentions, lag).over(order_by=by_date).label("prev_mentions"),
+        func.lag(per_day.c.share, lag).over(order_by=by_date).label("prev_share"),
+        func.row_number().over(order_by=by_date).label("rn"),
+        func.count().over().label("n_days"),
+    ).subquery()
+    # Trends and direction for every point are computed set-wise in the same query
+    delta = lagged.c.mentions - lagged.c.prev_mentions
+    mention_trend = case(
+        (lagged.c.prev_mentions != 0, cast(delta, Float) / lagged.c.prev_mentions), else_=cast(delta, Float)
+    )
+    share_trend = lagged.c.share - lagged.c.prev_share
+    direction = case(
+        ((mention_trend > 0.15) & (share_trend > 0), "improving"),
+        ((mention_trend < -0.15) | (share_trend < -0.01), "worsening"),
+        ((func.abs(mention_trend) <= 0.15) & (func.abs(share_trend) <= 0.01), "unchanged"),
+        else_="mixed",
+    )
+    rows = (
+        db.query(
+            lagged.c.date,
+            mention_trend.label("mention_trend"),
+            share_trend.label("share_trend"),
+            direction.label("direction"),
+            lagged.c.n_days,
+        )
+        .filter(lagged.c.rn >= window_days)
+        .order_by(lagged.c.date.desc())
+        .limit(24)  # last ~24 weeks if weekly; for daily window keep last 24 points
         .all()
     )
-    total_by_date = {}
-    for row in total_docs_q:
-        d = row.date
-        if hasattr(d, "isoformat"):
-            total_by_date[d.isoformat()[:10]] = int(row.total or 0)
-        else:
-            total_by_date[str(d)[:10]] = int(row.total or 0)
-
-    # Build date -> (mention_count, share)
-    by_date: dict[str, tuple[int, float]] = {}
-    for r in daily:
-        d = r.date
-        date_str = d.isoformat()[:10] if hasattr(d, "isoformat") else str(d)[:10]
-        mentions = int(r.mention_count or 0)
-        total = total_by_date.get(date_str, 0)
-        share = mentions / total if total > 0 else 0.0
-        by_date[date_str] = (mentions, share)
-
-    sorted_dates = sorted(by_date.keys())
-    if len(sorted_dates) < 2:
+    if not rows or rows[0].n_days < 2:
         return []
-
-    out: list[TrajectoryPointOut] = []
-    for i in range(window_days, len(sorted_dates) + 1):
-        window = sorted_dates[i - window_days : i]
-        current_date = window[-1]
-        prev_date = window[0]
-        m_now, s_now = by_date[current_date]
-        m_prev, s_prev = by_date.get(prev_date, (0, 0.0))
-
-        mention_trend = (m_now - m_prev) / m_prev if m_prev else (m_now - m_prev)
-        share_trend = (s_now - s_prev) if s_prev else (s_now - s_prev)
-
-        # Classify direction
-        if mention_trend > 0.15 and share_trend > 0:
-            direction = "improving"
-        elif mention_trend < -0.15 or share_trend < -0.01:
-            direction = "worsening"
-        elif abs(mention_trend) <= 0.15 and abs(share_trend) <= 0.01:
-            direction = "unchanged"
-        else:
-            direction = "mixed"
-
-        note = None
-        if direction == "improving":
-            note = "Rising attention and share of voice"
-        elif direction == "worsening":
-            note = "Declining attention or share"
-        elif direction == "mixed":
-            note = "Mixed or volatile signals"
-
-        out.append(
-            TrajectoryPointOut(
-                date=current_date,
-                direction=direction,
-                note=note,
-                mention_trend=round(mention_trend, 3),
-                share_trend=round(share_trend, 4),
-            )
+    return [
+        TrajectoryPointOut(
+            date=r.date.isoformat(),
+            direction=r.direction,
+            note=_TRAJECTORY_NOTES.get(r.direction),
+            mention_trend=round(float(r.mention_trend), 3),
+            share_trend=round(float(r.share_trend), 4),
         )
-    return out[-24:]  # last ~24 weeks if weekly; for daily window keep last 24 points
+        for r in reversed(rows)
+    ]
 
 
 def compute_consensus_evolution(
@@ -152,73 +171,72 @@ def compute_consensus_evolution(
     """
     from app.schemas import ConsensusPeriodOut
 
-    doc_date = _doc_date()
-    # Evidence count per (date, narrative_id) for this theme
-    rows = (
+    week_start = _week_start(Document.doc_date)
+    # Evidence count per (week, narrative_id) for this theme
+    weekly = (
         db.query(
-            doc_date.label("date"),
+            week_start.label("week_start"),
             Narrative.id.label("narrative_id"),
-            Narrative.statement,
             func.count(Evidence.id).label("mention_count"),
+            func.min(Document.doc_date).label("first_day"),
         )
         .select_from(Evidence)
         .join(Narrative, Evidence.narrative_id == Narrative.id)
         .join(Document, Evidence.document_id == Document.id)
-        .filter(Narrative.theme_id == theme_id, doc_date >= since)
-        .group_by(doc_date, Narrative.id, Narrative.statement)
+        .filter(Narrative.theme_id == theme_id, Document.doc_date >= since)
+        .group_by(week_start, Narrative.id)
+        .subquery()
+    )
+    # Top narrative per week (ties -> first mentioned that week, then lowest id) alongside the week's total
+    ranked = db.query(
+        weekly,
+        func.row_number()
+        .over(
+            partition_by=weekly.c.week_start,
+            order_by=(weekly.c.mention_count.desc(), weekly.c.first_day, weekly.c.narrative_id),
+        )
+        .label("rn"),
+        func.sum(weekly.c.mention_count).over(partition_by=weekly.c.week_start).label("period_total"),
+    ).subquery()
+    # Statements are joined only onto the winning rows, not carried through the grouping
+    rows = (
+        db.query(ranked, Narrative.statement)
+        .join(Narrative, Narrative.id == ranked.c.narrative_id)
+        .filter(ranked.c.rn == 1)
+        .order_by(ranked.c.week_start)
         .all()
     )
     if not rows:
         return []
 
-    # Group by period (e.g. week)
-    period_counts: dict[str, dict[int, tuple[str, int]]] = defaultdict(lambda: defaultdict(lambda: ("", 0)))
-    for r in rows:
-        d = r.date
-        date_str = d.isoformat()[:10] if hasattr(d, "isoformat") else str(d)[:10]
-        try:
-            from datetime import datetime
-            dt_val = datetime.strptime(date_str, "%Y-%m-%d").date()
-            # Week key: start of week
-            days_since_monday = dt_val.weekday()
-            week_start = dt_val - dt.timedelta(days=days_since_monday)
-            period_key = week_start.isoformat()
-        except Exception:
-            period_key = date_str[:7]  # fallback: year-month
-        existing_stmt, existing_count = period_counts[period_key][r.narrative_id]
-        new_count = int(r.mention_count or 0) + (existing_count or 0)
-        period_counts[period_key][r.narrative_id] = (r.statement or existing_stmt, new_count)
-
-    # Per period: total mentions and top narrative
+    # One truncated statement per narrative, shared by every period it wins
+    statements: dict[int, str] = {}
     evolution: list[ConsensusPeriodOut] = []
-    for period_start in sorted(period_counts.keys()):
-        narrs = period_counts[period_start]
-        total = sum(c for _, c in narrs.values())
+    for r in rows:
+        total = int(r.period_total or 0)
         if total == 0:
             continue
-        top_nid = max(narrs.keys(), key=lambda nid: narrs[nid][1])
-        stmt, count = narrs[top_nid]
+        stmt = statements.get(r.narrative_id)
+        if stmt is None:
+            stmt = r.statement or ""
+            stmt = statements[r.narrative_id] = (stmt[:200] + "…") if len(stmt) > 200 else stmt
+        count = int(r.mention_count or 0)
         share = count / total
         # Period end = period_start + period_days
-        try:
-            end = dt.datetime.strptime(period_start, "%Y-%m-%d").date() + dt.timedelta(days=period_days)
-            period_end = end.isoformat()
-        except Exception:
-            period_end = period_start
         evolution.append(
             ConsensusPeriodOut(
-                period_start=period_start,
-                period_end=period_end,
-                narrative_id=top_nid,
-                statement=(stmt[:200] + "…") if len(stmt) > 200 else stmt,
+                period_start=r.week_start.isoformat(),
+                period_end=(r.week_start + dt.timedelta(days=period_days)).isoformat(),
+                narrative_id=r.narrative_id,
+                statement=stmt,
                 share=round(share, 3),
                 mention_count=count,
             )
         )
-    # Dedupe consecutive periods with same narrative (merge)
+    # Dedupe consecutive periods with same narrative (merge); same id implies same statement
     merged: list[ConsensusPeriodOut] = []
     for p in evolution:
-        if merged and merged[-1].narrative_id == p.narrative_id and merged[-1].statement == p.statement:
+        if merged and merged[-1].narrative_id == p.narrative_id:
             last = merged[-1]
             merged[-1] = ConsensusPeriodOut(
                 period_start=last.period_start,
@@ -255,30 +273,45 @@ def compute_emerging(
         .limit(20)
         .all()
     )
-    out: list[EmergingNarrativeOut] = []
-    for n in narratives:
-        mention_count = (
-            db.query(func.count(Evidence.id))
-            .filter(Evidence.narrative_id == n.id)
-            .scalar()
-            or 0
-        )
-        # Optional: get latest novelty from NarrativeMentionsDaily
-        novelty_score = None
-        try:
-            from app.models import NarrativeMentionsDaily
-            nd = (
-                db.query(NarrativeMentionsDaily)
-                .filter(
-                    NarrativeMentionsDaily.narrative_id == n.id,
+    ids = [n.id for n in narratives]
+    if not ids:
+        return []
+    mention_counts = dict(
+        db.query(Evidence.narrative_id, func.count(Evidence.id))
+        .filter(Evidence.narrative_id.in_(ids))
+        .group_by(Evidence.narrative_id)
+        .all()
+    )
+    # Optional: latest novelty per narrative from NarrativeMentionsDaily
+    novelty_by_id: dict[int, float] = {}
+    try:
+        from app.models import NarrativeMentionsDaily
+        latest = (
+            db.query(
+                NarrativeMentionsDaily.narrative_id,
+                NarrativeMentionsDaily.novelty_score,
+                func.row_number()
+                .over(
+                    partition_by=NarrativeMentionsDaily.narrative_id,
+                    order_by=NarrativeMentionsDaily.date.desc(),
                 )
-                .order_by(NarrativeMentionsDaily.date.desc())
-                .first()
+                .label("rn"),
             )
-            if nd and nd.novelty_score is not None:
-                novelty_score = round(nd.novelty_score, 2)
-        except Exception:
-            pass
+            .filter(NarrativeMentionsDaily.narrative_id.in_(ids))
+            .subquery()
+        )
+        novelty_by_id = {
+            r.narrative_id: r.novelty_score
+            for r in db.query(latest.c.narrative_id, latest.c.novelty_score).filter(latest.c.rn == 1)
+        }
+    except Exception:
+        pass
+    out: list[EmergingNarrativeOut] = []
+    for n in narratives:
+        mention_count = mention_counts.get(n.id, 0)
+        novelty_score = novelty_by_id.get(n.id)
+        if novelty_score is not None:
+            novelty_score = round(novelty_score, 2)
         out.append(
             EmergingNarrativeOut(
                 narrative_id=n.id,
@@ -292,40 +325,13 @@ def compute_emerging(
     return out
 
 
-def compute_debate(
-    db: Session,
-    theme_id: int,
-    lookback_days: int = 90,
-) -> Optional["ThemeDebateOut"]:
-    """
-    Debate intensity: multiple competing narratives with no single dominant view.
-    Uses relative statistics only: narrative shares = mention_count / total (proportions);
-    score = 1 - top_share. High score = heavily debated.
-    """
+def _debate_from_stats(total: int, top: int, narrative_count: int) -> Optional["ThemeDebateOut"]:
+    """Debate score/label from one theme's total mentions, top narrative's mentions and narrative count."""
     from app.schemas import ThemeDebateOut
 
-    since = dt.date.today() - dt.timedelta(days=lookback_days)
-    doc_date = _doc_date()
-    rows = (
-        db.query(
-            Narrative.id.label("narrative_id"),
-            func.count(Evidence.id).label("mention_count"),
-        )
-        .select_from(Evidence)
-        .join(Narrative, Evidence.narrative_id == Narrative.id)
-        .join(Document, Evidence.document_id == Document.id)
-        .filter(Narrative.theme_id == theme_id, doc_date >= since)
-        .group_by(Narrative.id)
-        .all()
-    )
-    if not rows:
+    if not narrative_count or not total:
         return None
-    total = sum(int(r.mention_count or 0) for r in rows)
-    if total == 0:
-        return None
-    shares = [int(r.mention_count or 0) / total for r in rows]
-    top_share = max(shares)
-    narrative_count = len(rows)
+    top_share = top / total
     # Debate score: 1 - top_share (so if one narrative has 90%, score=0.1; if even, score high)
     score = round(1.0 - top_share, 3)
     if narrative_count >= 4 and top_share < 0.4:
@@ -344,22 +350,143 @@ def compute_debate(
     )
 
 
+def _narrative_mention_counts(db: Session, lookback_days: int, *theme_filter):
+    """Subquery of (theme_id, narrative_id, mention_count) for evidence in the lookback window."""
+    since = dt.date.today() - dt.timedelta(days=lookback_days)
+    doc_date = Document.doc_date
+    return (
+        db.query(
+            Narrative.theme_id.label("theme_id"),
+            Narrative.id.label("narrative_id"),
+            func.count(Evidence.id).label("mention_count"),
+        )
+        .select_from(Evidence)
+        .join(Narrative, Evidence.narrative_id == Narrative.id)
+        .join(Document, Evidence.document_id == Document.id)
+        .filter(doc_date >= since, *theme_filter)
+        .group_by(Narrative.theme_id, Narrative.id)
+        .subquery()
+    )
+
+
+def _debate_stat_columns(per_narrative):
+    """SUM / MAX / COUNT reductions over per-narrative mention counts, done by the database."""
+    return (
+        func.sum(per_narrative.c.mention_count).label("total"),
+        func.max(per_narrative.c.mention_count).label("top"),
+        func.count().label("narrative_count"),
+    )
+
+
+def compute_debate(
+    db: Session,
+    theme_id: int,
+    lookback_days: int = 90,
+) -> Optional["ThemeDebateOut"]:
+    """
+    Debate intensity: multiple competing narratives with no single dominant view.
+    Uses relative statistics only: narrative shares = mention_count / total (proportions);
+    score = 1 - top_share. High score = heavily debated.
+    """
+    per_narrative = _narrative_mention_counts(db, lookback_days, Narrative.theme_id == theme_id)
+    row = db.query(*_debate_stat_columns(per_narrative)).one()
+    return _debate_from_stats(int(row.total or 0), int(row.top or 0), int(row.narrative_count or 0))
+
+
+# Max bound parameters per IN (...) list in compute_debate_bulk.
+_DEBATE_IN_CHUNK = 1000
+
+
+def compute_debate_bulk(
+    db: Session,
+    theme_ids: Optional[list[int]] = None,
+    lookback_days: int = 90,
+) -> dict[int, "ThemeDebateOut"]:
+    """
+    compute_debate for many themes with one grouped query (per IN-list chunk of theme_ids).
+    theme_ids=None scores every theme with evidence in the window. Themes without mentions are omitted.
+    """
+    def stats_by_theme(*theme_filter):
+        per_narrative = _narrative_mention_counts(db, lookback_days, *theme_filter)
+        return (
+            db.query(per_narrative.c.theme_id, *_debate_stat_columns(per_narrative))
+            .group_by(per_narrative.c.theme_id)
+            .all()
+        )
+
+    if theme_ids is None:
+        chunks = [stats_by_theme()]
+    else:
+        ids = sorted(set(theme_ids))
+        chunks = [
+            stats_by_theme(Narrative.theme_id.in_(ids[i : i + _DEBATE_IN_CHUNK]))
+            for i in range(0, len(ids), _DEBATE_IN_CHUNK)
+        ]
+    rows = sorted((r for rows in chunks for r in rows), key=lambda r: r.theme_id)
+    out = {}
+    for r in rows:
+        debate = _debate_from_stats(int(r.total or 0), int(r.top or 0), int(r.narrative_count or 0))
+        if debate is not None:
+            out[r.theme_id] = debate
+    return out
+
+
+def _with_session(session_factory: Callable[[], Session], fn, *args, **kwargs):
+    with session_factory() as db:
+        return fn(db, *args, **kwargs)
+
+
 def get_theme_insights(
     db: Session,
     theme_id: int,
     months: int = 6,
+    session_factory: Optional[Callable[[], Session]] = None,
 ) -> "ThemeInsightsOut":
-    """Build full insights payload for a theme."""
+    """Build full insights payload for a theme (TTL-cached per theme, months and day).
+
+    With session_factory, the four independent parts run concurrently, each on its own session."""
     from app.schemas import ThemeInsightsOut
 
-    since = dt.date.today() - dt.timedelta(days=months * 31)
-    trajectory = compute_trajectory(db, theme_id, since)
-    consensus_evolution = compute_consensus_evolution(db, theme_id, since)
-    emerging = compute_emerging(db, theme_id, lookback_days=min(90, months * 31))
-    debate = compute_debate(db, theme_id, lookback_days=min(90, months * 31))
-    return ThemeInsightsOut(
+    today = dt.date.today()
+    ttl = settings.analytics_cache_ttl_seconds
+    key = (theme_id, months, today)
+    watermark: Optional[int] = None
+    if ttl > 0:
+        # Primary-key max: one index probe, cheap next to the four aggregates it guards.
+        watermark = db.query(func.max(Evidence.id)).scalar()
+        now = time.monotonic()
+        with _insights_cache_lock:
+            if key in _INSIGHTS_CACHE:
+                cached_at, cached_watermark, cached = _INSIGHTS_CACHE[key]
+                if now - cached_at < ttl and cached_watermark == watermark:
+                    return cached
+                del _INSIGHTS_CACHE[key]
+    since = today - dt.timedelta(days=months * 31)
+    lookback_days = min(90, months * 31)
+    if session_factory is None:
+        trajectory = compute_trajectory(db, theme_id, since)
+        consensus_evolution = compute_consensus_evolution(db, theme_id, since)
+        emerging = compute_emerging(db, theme_id, lookback_days=lookback_days)
+        debate = compute_debate(db, theme_id, lookback_days=lookback_days)
+    else:
+        with ThreadPoolExecutor(max_workers=4) as ex:
+            f_trajectory = ex.submit(_with_session, session_factory, compute_trajectory, theme_id, since)
+            f_consensus = ex.submit(_with_session, session_factory, compute_consensus_evolution, theme_id, since)
+            f_emerging = ex.submit(_with_session, session_factory, compute_emerging, theme_id, lookback_days=lookback_days)
+            f_debate = ex.submit(_with_session, session_factory, compute_debate, theme_id, lookback_days=lookback_days)
+            trajectory = f_trajectory.result()
+            consensus_evolution = f_consensus.result()
+            emerging = f_emerging.result()
+            debate = f_debate.result()
+    out = ThemeInsightsOut(
         trajectory=trajectory,
         consensus_evolution=consensus_evolution,
         emerging=emerging,
         debate=debate,
     )
+    if ttl > 0:
+        with _insights_cache_lock:
+            if len(_INSIGHTS_CACHE) >= _INSIGHTS_CACHE_MAX_ENTRIES:
+                _INSIGHTS_CACHE.clear()
+            _INSIGHTS_CACHE[key] = (time.monotonic(), watermark, out)
+    return out
@@ -8,14 +8,17 @@ import re
 import logging
 from typing import Optional
 
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 
 from app.models import Evidence, Narrative, Theme, ThemeInstrument
 
 logger = logging.getLogger("investing_agent.instruments")
 
-# Ticker-like: 2-5 uppercase letters, optionally prefixed with $ (e.g. $AAPL, NVDA)
-TICKER_PATTERN = re.compile(r"\$?([A-Z]{2,5})\b")
+try:
+    import re2 as _ticker_re  # google-re2: linear-time automaton, releases the GIL while scanning
+except ImportError:  # fall back to the stdlib backtracking engine
+    _ticker_re = re
 
 # Common acronyms that match ticker pattern but are not stock tickers (economics, orgs, terms).
 # Avoid 2-letter that are valid tickers (GE, BP, etc.). Include clear non-tickers only.
@@ -28,6 +31,42 @@ KNOWN_NON_TICKERS = frozenset({
     "IRR", "ROIC", "WACC", "CAPM", "ETN", "FOMC", "IR", "HR", "PR", "VP", "R&D",
 })
 
+# Ticker-like: 2-5 uppercase letters, optionally prefixed with $ (e.g. $AAPL, NVDA).
+# Blocklisted words that the ticker branch could match are consumed by a leading alternative with
+# an empty capture, so the engine skips them itself (a lookahead would let it restart mid-word and
+# turn GDP into DP, and re2 has no lookaround).
+_BLOCKED_TICKER_WORDS = sorted(
+    (s for s in KNOWN_NON_TICKERS if re.fullmatch(r"[A-Z]{2,5}", s)), key=lambda s: (-len(s), s)
+)
+TICKER_PATTERN = _ticker_re.compile(
+    r"\$?(?:(?:" + "|".join(_BLOCKED_TICKER_WORDS) + r")\b|([A-Z]{2,5})\b)"
+)
+
+
+# JSON output schema for LLM ticker extraction (JSON mode needs an object at the root).
+_QUOTE_TICKERS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "tickers": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "symbol": {"type": "string"},
+                    "display_name": {"type": "string"},
+                    "type": {"type": "string", "enum": ["stock", "etf"]},
+                },
+                "required": ["symbol"],
+            },
+        },
+    },
+    "required": ["tickers"],
+}
+
+# Characters of quotes per regex scan, and of quote excerpts sent to the LLM.
+_QUOTE_SCAN_BATCH_CHARS = 1_000_000
+_LLM_QUOTES_MAX_CHARS = 15000
+
 
 def _normalize_candidate(s: str) -> str:
     return (s or "").strip().upper()
@@ -37,15 +76,10 @@ def extract_ticker_candidates_from_text(text: str) -> set[str]:
     """Return set of uppercase symbol candidates from text, excluding known non-tickers."""
     if not text:
         return set()
-    candidates = set()
-    for m in TICKER_PATTERN.finditer(text):
-        sym = _normalize_candidate(m.group(1))
-        if not sym or len(sym) < 2:
-            continue
-        if sym in KNOWN_NON_TICKERS:
-            continue
-        candidates.add(sym)
-    return candidates
+    # The group is already 2-5 uppercase letters; blocklisted words come back as "".
+    found = set(TICKER_PATTERN.findall(text))
+    found.discard("")
+    return found
 
 
 def _extract_tickers_from_quotes_llm(quotes_text: str, theme_label: str) -> list[dict]:
@@ -56,7 +90,7 @@ def _extract_tickers_from_quotes_llm(quotes_text: str, theme_label: str) -> list
     if not (quotes_text or "").strip():
         return []
     try:
-        from app.llm.provider import chat_completion
+        from app.llm.provider import chat_completion, json_loads, strip_code_fence
         from app.settings import settings
     except Exception as e:
         logger.warning("LLM not available for quote extraction: %s", e)
@@ -67,21 +101,17 @@ def _extract_tickers_from_quotes_llm(quotes_text: str, theme_label: str) -> list
         "You are a financial analyst. Given excerpts from documents about an investment theme, "
         "list every stock ticker or ETF symbol mentioned. If only a company name is mentioned (e.g. Apple, NVIDIA), "
         "provide the correct ticker symbol (AAPL, NVDA). Ignore economic indicators (GDP, CPI), organizations (SEC, FDA), "
-        "and generic acronyms (CEO, IPO, ESG). Return ONLY a JSON array of objects with: symbol (required), display_name (optional), type (stock or etf). "
-        "Example: [{\"symbol\": \"AAPL\", \"display_name\": \"Apple\", \"type\": \"stock\"}, {\"symbol\": \"SOXX\", \"type\": \"etf\"}]"
+        "and generic acronyms (CEO, IPO, ESG). Return ONLY a JSON object {\"tickers\": [...]} whose items have: "
+        "symbol (required), display_name (optional), type (stock or etf). Keep display_name short. "
+        "Example: {\"tickers\": [{\"symbol\": \"AAPL\", \"display_name\": \"Apple\", \"type\": \"stock\"}, {\"symbol\": \"SOXX\", \"type\": \"etf\"}]}"
     )
-    user = f"Theme: {theme_label}\n\nExcerpts:\n{quotes_text[:12000]}\n\nReturn only the JSON array of tickers/symbols mentioned."
+    user = f"Theme: {theme_label}\n\nExcerpts:\n{quotes_text[:12000]}\n\nReturn only the JSON object of tickers/symbols mentioned."
     try:
-        raw = chat_completion(system=system, user=user, max_tokens=1024)
-        text = raw.strip()
-        if text.startswith("```"):
-            lines = text.split("\n")
-            if lines[0].startswith("```"):
-                lines = lines[1:]
-            if lines and lines[-1].strip() == "```":
-                lines = lines[:-1]
-            text = "\n".join(lines)
-        arr = json.loads(text)
+        # JSON-constrained output: no fences or prose to strip, so the output budget only covers the list
+        raw = chat_completion(system=system, user=user, max_tokens=1024, json_schema=_QUOTE_TICKERS_SCHEMA)
+        # Fenced if the model fell back to a plain reply (no structured-output support).
+        obj = json_loads(strip_code_fence(raw))
+        arr = obj.get("tickers") if isinstance(obj, dict) else obj
         if not isinstance(arr, list):
             return []
         out = []
@@ -104,6 +134,20 @@ def _extract_tickers_from_quotes_llm(quotes_text: str, theme_label: str) -> list
         return []
 
 
+def _existing_symbols(db: Session, theme_id: int, symbols) -> set[str]:
+    """Uppercased symbols among `symbols` (uppercase) that the theme already has as instruments."""
+    symbols = set(symbols)
+    if not symbols:
+        return set()
+    upper_symbol = func.upper(ThemeInstrument.symbol)
+    rows = (
+        db.query(upper_symbol)
+        .filter(ThemeInstrument.theme_id == theme_id, upper_symbol.in_(symbols))
+        .all()
+    )
+    return {sym for (sym,) in rows}
+
+
 def suggest_instruments_from_documents(db: Session, theme_id: int) -> list[dict]:
     """
     Scan theme evidence for ticker/company mentions and return suggested instruments (no DB write).
@@ -113,35 +157,60 @@ def suggest_instruments_from_documents(db: Session, theme_id: int) -> list[dict]
     theme = db.query(Theme).filter(Theme.id == theme_id).one_or_none()
     if theme is None:
         return []
-    existing = {r.symbol.upper() for r in db.query(ThemeInstrument.symbol).filter(ThemeInstrument.theme_id == theme_id).all()}
     rows = (
         db.query(Evidence.quote)
         .join(Narrative, Narrative.id == Evidence.narrative_id)
         .filter(Narrative.theme_id == theme_id)
         .distinct()
-        .all()
+        .execution_options(stream_results=True)
+        .yield_per(1000)
     )
-    quotes = [q for (q,) in rows if q]
+    # Stream quotes: regex-scan them in large newline-joined batches (a match cannot cross the
+    # separator) and keep only the prefix the LLM prompt uses, so memory stays bounded.
+    # Exact duplicates are removed by DISTINCT; quotes differing only in case or whitespace
+    # (repeated disclaimers, footers) are dropped from the LLM excerpt so it holds more unique text.
     found_symbols: set[str] = set()
-    for quote in quotes:
-        found_symbols |= extract_ticker_candidates_from_text(quote or "")
+    batch: list[str] = []
+    batch_len = 0
+    llm_parts: list[str] = []
+    llm_len = 0  # length of "\n---\n".join(llm_parts)
+    llm_seen: set[str] = set()
+    for (q,) in rows:
+        if not q:
+            continue
+        batch.append(q)
+        batch_len += len(q) + 1
+        if batch_len >= _QUOTE_SCAN_BATCH_CHARS:
+            found_symbols |= extract_ticker_candidates_from_text("\n".join(batch))
+            batch, batch_len = [], 0
+        if llm_len < _LLM_QUOTES_MAX_CHARS:
+            key = " ".join(q.lower().split())
+            if key in llm_seen:
+                continue
+            llm_seen.add(key)
+            llm_len += len(q) + (5 if llm_parts else 0)
+            llm_parts.append(q)
+    if batch:
+        found_symbols |= extract_ticker_candidates_from_text("\n".join(batch))
+    llm_items: list[dict] = []
+    if llm_parts:
+        combined = "\n---\n".join(llm_parts)[:_LLM_QUOTES_MAX_CHARS]
+        llm_items = _extract_tickers_from_quotes_llm(combined, theme.canonical_label or "")
+    existing = _existing_symbols(db, theme_id, found_symbols | {item["symbol"] for item in llm_items})
     suggestions_by_symbol: dict[str, dict] = {}
     for s in sorted(found_symbols):
         if s in existing:
             continue
         suggestions_by_symbol[s] = {"symbol": s, "display_name": None, "type": "stock"}
-    if quotes:
-        combined = "\n---\n".join(q for q in quotes if q)[:15000]
-        llm_items = _extract_tickers_from_quotes_llm(combined, theme.canonical_label or "")
-        for item in llm_items:
-            sym = item["symbol"]
-            if sym in existing:
-                continue
-            suggestions_by_symbol[sym] = {
-                "symbol": sym,
-                "display_name": item.get("display_name"),
-                "type": item.get("type") or "stock",
-            }
+    for item in llm_items:
+        sym = item["symbol"]
+        if sym in existing:
+            continue
+        suggestions_by_symbol[sym] = {
+            "symbol": sym,
+            "display_name": item.get("display_name"),
+            "type": item.get("type") or "stock",
+        }
     return list(suggestions_by_symbol.values())[:30]
 
 
@@ -153,23 +222,37 @@ def add_instruments_from_documents(db: Session, theme_id: int, symbols: list[str
     theme = db.query(Theme).filter(Theme.id == theme_id).one_or_none()
     if theme is None:
         return []
-    existing = {r.symbol.upper() for r in db.query(ThemeInstrument.symbol).filter(ThemeInstrument.theme_id == theme_id).all()}
-    to_add = [s for s in (s.strip().upper() for s in symbols if s) if s not in existing and s not in KNOWN_NON_TICKERS]
-    created = []
-    for symbol in to_add:
-        inst = ThemeInstrument(
-            theme_id=theme_id,
-            symbol=symbol,
-            display_name=None,
-            type="stock",
-            source="from_documents",
+    normalized = dict.fromkeys(s for s in (s.strip().upper() for s in symbols if s) if s not in KNOWN_NON_TICKERS)
+    existing = _existing_symbols(db, theme_id, normalized)
+    to_add = [s for s in normalized if s not in existing]
+    created: list[ThemeInstrument] = []
+    if to_add:
+        if db.bind.dialect.name == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        # One multi-row INSERT ... RETURNING instead of a flush per row and a refresh per row after
+        # commit; ON CONFLICT DO NOTHING skips symbols a concurrent request added after the check above
+        stmt = insert(ThemeInstrument).on_conflict_do_nothing(index_elements=["theme_id", "symbol"])
+        created = list(
+            db.scalars(
+                stmt.returning(ThemeInstrument),
+                [
+                    {
+                        "theme_id": theme_id,
+                        "symbol": symbol,
+                        "display_name": None,
+                        "type": "stock",
+                        "source": "from_documents",
+                    }
+                    for symbol in to_add
+                ],
+            )
         )
-        db.add(inst)
-        db.flush()
-        created.append(inst)
+        # Detach the RETURNING-populated rows so commit does not expire them (no reload SELECT per row)
+        for inst in created:
+            db.expunge(inst)
     db.commit()
-    for inst in created:
-        db.refresh(inst)
     return created
 
 
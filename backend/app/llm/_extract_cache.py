@@ -0,0 +1,117 @@
+"""
+On-disk cache of raw LLM extraction responses, content-addressed by SHA-256 of the request.
+Files live at {LLM_EXTRACT_CACHE_DIR}/{key[:2]}/{key}.json (a relative dir is under backend/);
+entries older than LLM_EXTRACT_CACHE_TTL_DAYS are misses and are deleted by a sweep at most
+once an hour per process, on write. Raw text is stored (not parsed output), so parser changes
+need no invalidation and prompt changes change the key.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from app.settings import settings
+
+logger = logging.getLogger("investing_agent.llm.extract_cache")
+
+# Bump to invalidate every cached response (e.g. when the request shape changes).
+PROMPT_VERSION = "1"
+
+_BACKEND_DIR = Path(__file__).resolve().parent.parent.parent
+_PRUNE_INTERVAL_SECONDS = 3600
+_last_prune: float | None = None
+_prune_lock = threading.Lock()
+
+
+def _cache_dir() -> Path | None:
+    d = (getattr(settings, "llm_extract_cache_dir", "") or "").strip()
+    if not d or getattr(settings, "llm_extract_cache_ttl_days", 0) <= 0:
+        return None
+    # Anchored to backend/ so the API, worker and scripts share one cache whatever their cwd.
+    return _BACKEND_DIR / d
+
+
+def make_key(*parts: str) -> str:
+    """SHA-256 hex digest over PROMPT_VERSION and the given request parts."""
+    h = hashlib.sha256(PROMPT_VERSION.encode("utf-8"))
+    for part in parts:
+        # Length-prefix each part so ("ab", "c") and ("a", "bc") hash differently
+        data = (part or "").encode("utf-8")
+        h.update(b"%d:" % len(data))
+        h.update(data)
+    return h.hexdigest()
+
+
+def _path(root: Path, key: str) -> Path:
+    return root / key[:2] / f"{key}.json"
+
+
+def get(key: str) -> str | None:
+    """Cached raw response for key, or None if disabled, missing, expired or unreadable."""
+    root = _cache_dir()
+    if root is None:
+        return None
+    path = _path(root, key)
+    try:
+        if time.time() - path.stat().st_mtime > settings.llm_extract_cache_ttl_days * 86400:
+            return None
+        raw = json.loads(path.read_text(encoding="utf-8")).get("raw")
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, AttributeError) as e:
+        logger.warning("Ignoring unreadable LLM cache entry %s: %s", path, e)
+        return None
+    return raw if isinstance(raw, str) else None
+
+
+def prune(root: Path) -> int:
+    """Delete expired entries (and temp files left by interrupted writes) under root; returns the count."""
+    cutoff = time.time() - settings.llm_extract_cache_ttl_days * 86400
+    removed = 0
+    for path in [*root.glob("*/*.json"), *root.glob("*/*.tmp")]:
+        try:
+            if path.stat().st_mtime < cutoff:
+                path.unlink()
+                removed += 1
+        except OSError:
+            continue  # removed concurrently by another process, or unreadable
+    return removed
+
+
+def _maybe_prune(root: Path) -> None:
+    global _last_prune
+    now = time.monotonic()
+    with _prune_lock:
+        if _last_prune is not None and now - _last_prune < _PRUNE_INTERVAL_SECONDS:
+            return
+        _last_prune = now
+    removed = prune(root)
+    if removed:
+        logger.info("Pruned %d expired LLM cache entries from %s", removed, root)
+
+
+def put(key: str, raw: str) -> None:
+    """Store a raw response for key (atomic replace; failures are logged, never raised)."""
+    root = _cache_dir()
+    if root is None:
+        return
+    _maybe_prune(root)
+    path = _path(root, key)
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"raw": raw}, f)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+    except OSError as e:
+        logger.warning("Could not write LLM cache entry %s: %s", path, e)
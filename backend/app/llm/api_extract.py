@@ -3,23 +3,74 @@ Theme/narrative extraction using simple LLM API (API key), with user-editable pr
 """
 from __future__ import annotations
 
+import functools
 import json
 import logging
+from concurrent import futures
 from pathlib import Path
 from typing import Any
 
-from tenacity import retry, stop_after_attempt, wait_exponential
+from tenacity import retry, retry_if_exception, stop_after_attempt, wait_random_exponential
 
-from app.llm.provider import chat_completion
+from app.llm import _extract_cache
+from app.llm.provider import chat_completion, is_retryable_llm_error, json_loads, strip_code_fence
 from app.settings import settings
 
+try:
+    import tiktoken  # optional: enables LLM_EXTRACTION_MAX_INPUT_TOKENS
+except ImportError:
+    tiktoken = None
+
 logger = logging.getLogger("investing_agent.llm.api_extract")
 
 
+_NARRATIVE_STANCES = frozenset({"bullish", "bearish", "mixed", "neutral"})
+_CONFIDENCE_LEVELS = frozenset({"fact", "opinion"})
+
+
+def _norm_choice(value: Any, allowed: frozenset[str], default: str) -> str:
+    v = (value or "").strip().lower()
+    return v if v in allowed else default
+
+
 def _max_doc_chars() -> int:
     return getattr(settings, "llm_extraction_max_chars", 120_000) or 120_000
 
 
+@functools.lru_cache(maxsize=8)
+def _token_encoding(model: str):
+    """tiktoken encoding for model, or None if it cannot be loaded (cached either way)."""
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:  # non-OpenAI model name: o200k_base is a close enough estimate
+            return tiktoken.get_encoding("o200k_base")
+    except Exception as e:  # encodings are downloaded on first use
+        logger.warning("tiktoken encoding unavailable, truncating by characters only: %s", e)
+        return None
+
+
+def _truncate_doc_text(text: str, max_chars: int, model: str) -> str:
+    """
+    Document text for the prompt: at most max_chars, cut back to a whitespace boundary so the last
+    word is not split. With LLM_EXTRACTION_MAX_INPUT_TOKENS set and tiktoken installed, the text is
+    also trimmed to that many tokens, so ASCII-dense and CJK documents get the same token budget.
+    """
+    if len(text) > max_chars:
+        lo = max(0, max_chars - 200)
+        cut = max(text.rfind(" ", lo, max_chars + 1), text.rfind("\n", lo, max_chars + 1))
+        text = text[: cut if cut > 0 else max_chars]
+    max_tokens = getattr(settings, "llm_extraction_max_input_tokens", 0)
+    # Always encode: a CJK character or emoji can be several tokens, so a short text may still exceed the cap
+    if max_tokens > 0 and tiktoken is not None:
+        enc = _token_encoding(model)
+        if enc is not None:
+            tokens = enc.encode(text, disallowed_special=())
+            if len(tokens) > max_tokens:
+                text = enc.decode(tokens[:max_tokens])
+    return text
+
+
 from app.llm.vertex import (
     ExtractedDoc,
     ExtractedEvidence,
@@ -70,6 +121,44 @@ EXTRACTION_SCHEMA = {
     },
     "required": ["summary", "conclusions", "themes"],
 }
+# Serialized once; substituted into the prompt template on every extraction
+_SCHEMA_JSON = json.dumps(EXTRACTION_SCHEMA)
+
+def _check_list(value: Any, path: str) -> list:
+    if value is None:
+        return []
+    if not isinstance(value, list):
+        raise ValueError(f"LLM output {path}: expected array, got {type(value).__name__}")
+    return value
+
+
+def _check_obj(value: Any, path: str, str_fields: tuple[str, ...]) -> dict[str, Any]:
+    if not isinstance(value, dict):
+        raise ValueError(f"LLM output {path}: expected object, got {type(value).__name__}")
+    for field in str_fields:
+        v = value.get(field)
+        if v is not None and not isinstance(v, str):
+            raise ValueError(f"LLM output {path}.{field}: expected string, got {type(v).__name__}")
+    return value
+
+
+def _validate_extraction(data: Any) -> None:
+    """
+    Check the parsed response has the container/string types of EXTRACTION_SCHEMA, raising ValueError
+    (not retried) with the offending path. Missing fields, nulls and unknown enum values are allowed:
+    the parser below fills defaults for those.
+    """
+    _check_obj(data, "$", ("summary",))
+    _check_list(data.get("conclusions"), "$.conclusions")
+    for i, t in enumerate(_check_list(data.get("themes"), "$.themes")):
+        tp = f"$.themes[{i}]"
+        _check_obj(t, tp, ("label",))
+        for j, n in enumerate(_check_list(t.get("narratives"), f"{tp}.narratives")):
+            npath = f"{tp}.narratives[{j}]"
+            _check_obj(n, npath, ("statement", "sub_theme", "narrative_stance", "confidence_level"))
+            for k, e in enumerate(_check_list(n.get("evidence"), f"{npath}.evidence")):
+                _check_obj(e, f"{npath}.evidence[{k}]", ("quote",))
+
 
 _DEFAULT_SYSTEM = (
     "You are an analyst extracting market narratives from research.\n"
@@ -91,22 +180,38 @@ _PROMPT_DIR = Path(__file__).resolve().parent.parent / "prompts"
 _USER_PROMPT_FILE = _PROMPT_DIR / "extract_themes.txt"
 _DEFAULT_PROMPT_FILE = _PROMPT_DIR / "extract_themes_default.txt"
 
+# (path, st_mtime_ns, template) of the last template read; reread only when the file changes
+_TEMPLATE_CACHE: tuple[Path, int, str] | None = None
+
 
 def get_extraction_prompt_template() -> str:
     """Return the current user prompt template (editable by user)."""
-    if _USER_PROMPT_FILE.exists():
-        return _USER_PROMPT_FILE.read_text(encoding="utf-8").strip()
-    return _DEFAULT_PROMPT_FILE.read_text(encoding="utf-8").strip()
+    global _TEMPLATE_CACHE
+    path = _USER_PROMPT_FILE if _USER_PROMPT_FILE.exists() else _DEFAULT_PROMPT_FILE
+    mtime_ns = path.stat().st_mtime_ns
+    cache = _TEMPLATE_CACHE
+    if cache is not None and cache[0] == path and cache[1] == mtime_ns:
+        return cache[2]
+    template = path.read_text(encoding="utf-8").strip()
+    _TEMPLATE_CACHE = (path, mtime_ns, template)
+    return template
 
 
 def set_extraction_prompt_template(content: str) -> None:
     """Overwrite the user-editable prompt template."""
+    global _TEMPLATE_CACHE
     _PROMPT_DIR.mkdir(parents=True, exist_ok=True)
     _USER_PROMPT_FILE.write_text(content.strip(), encoding="utf-8")
+    _TEMPLATE_CACHE = None
 
 
-# Retry up to 5 times with longer backoff so transient 503 (e.g. behind VPN) can succeed
-@retry(stop=stop_after_attempt(5), wait=wait_exponential(multiplier=2, min=2, max=60))
+# Retry up to 5 times with longer backoff so transient 503 (e.g. behind VPN) can succeed; jittered so
+# concurrent workers do not retry in lockstep, and never for client errors or invalid JSON
+@retry(
+    stop=stop_after_attempt(5),
+    wait=wait_random_exponential(multiplier=2, min=2, max=60),
+    retry=retry_if_exception(is_retryable_llm_error),
+)
 def extract_themes_and_narratives(
     *,
     text: str,
@@ -115,69 +220,81 @@ def extract_themes_and_narratives(
     """Call configured LLM with editable prompt and return structured extraction.
     Pass model_override to use a different model for this call only (e.g. dry-run comparison)."""
     effective_model = (model_override or settings.llm_model or "gpt-4o-mini").strip()
-    max_chars = _max_doc_chars()
+    doc_text = _truncate_doc_text(text, _max_doc_chars(), effective_model)
     logger.info(
         "Calling LLM provider=%s model=%s input_len=%d max_output_tokens=%d",
-        settings.llm_provider, effective_model, min(len(text), max_chars),
+        settings.llm_provider, effective_model, len(doc_text),
         settings.llm_extraction_max_tokens,
     )
     template = get_extraction_prompt_template()
     user_prompt = (
-        template.replace("{{schema}}", json.dumps(EXTRACTION_SCHEMA))
-        .replace("{{text}}", text[:max_chars])
+        template.replace("{{schema}}", _SCHEMA_JSON)
+        .replace("{{text}}", doc_text)
     )
-    raw = chat_completion(
-        system=_DEFAULT_SYSTEM,
-        user=user_prompt,
-        max_tokens=settings.llm_extraction_max_tokens,
-        model=model_override,
+    # Same provider, model, output budget and prompt -> same extraction: reuse the raw response
+    cache_key = _extract_cache.make_key(
+        settings.llm_provider,
+        effective_model,
+        str(settings.llm_extraction_max_tokens),
+        _DEFAULT_SYSTEM,
+        user_prompt,
     )
+    raw = _extract_cache.get(cache_key)
+    cached = raw is not None
+    if cached:
+        logger.info("LLM extraction cache hit key=%s", cache_key[:12])
+    else:
+        raw = chat_completion(
+            system=_DEFAULT_SYSTEM,
+            user=user_prompt,
+            max_tokens=settings.llm_extraction_max_tokens,
+            model=model_override,
+        )
     # Strip markdown code block if present
-    if raw.startswith("```"):
-        raw = raw.split("\n", 1)[-1] if "\n" in raw else raw[3:]
-    if raw.endswith("```"):
-        raw = raw.rsplit("```", 1)[0].rstrip()
+    raw = strip_code_fence(raw)
     try:
-        data: dict[str, Any] = json.loads(raw.strip())
+        data: dict[str, Any] = json_loads(raw)
     except json.JSONDecodeError as e:
-        snippet = (raw.strip() or "(empty)")[:500]
+        snippet = (raw or "(empty)")[:500]
         logger.error("LLM returned invalid JSON: %s. Raw snippet: %s", e, snippet)
         raise
-
-    def _norm_stance(s: str) -> str:
-        v = (s or "").strip().lower()
-        if v in ("bullish", "bearish", "mixed", "neutral"):
-            return v
-        return "neutral"
-
-    def _norm_confidence(s: str) -> str:
-        v = (s or "").strip().lower()
-        if v in ("fact", "opinion"):
-            return v
-        return "opinion"
+    try:
+        _validate_extraction(data)
+    except ValueError as e:
+        logger.error("LLM returned malformed extraction: %s", e)
+        raise
+    if not cached:
+        _extract_cache.put(cache_key, raw)
 
     themes: list[ExtractedTheme] = []
-    for t in data.get("themes", []):
+    for t in data.get("themes") or []:
+        # Empty statements and quotes are skipped before any object is built
         narratives: list[ExtractedNarrative] = []
-        for n in t.get("narratives", []):
-            evs = [ExtractedEvidence(quote=e.get("quote", ""), page=e.get("page")) for e in n.get("evidence", [])]
+        for n in t.get("narratives") or []:
+            statement = (n.get("statement") or "").strip()
+            if not statement:
+                continue
             narratives.append(
                 ExtractedNarrative(
-                    statement=n.get("statement", "").strip(),
+                    statement=statement,
                     stance="neutral",
                     relation_to_prevailing="consensus",
                     sub_theme=(n.get("sub_theme") or "").strip() or None,
-                    narrative_stance=_norm_stance(n.get("narrative_stance") or ""),
-                    confidence_level=_norm_confidence(n.get("confidence_level") or ""),
-                    evidence=[e for e in evs if e.quote.strip()],
+                    narrative_stance=_norm_choice(n.get("narrative_stance"), _NARRATIVE_STANCES, "neutral"),
+                    confidence_level=_norm_choice(n.get("confidence_level"), _CONFIDENCE_LEVELS, "opinion"),
+                    evidence=[
+                        ExtractedEvidence(quote=e["quote"], page=e.get("page"))
+                        for e in n.get("evidence") or []
+                        if (e.get("quote") or "").strip()
+                    ],
                 )
             )
-        themes.append(ExtractedTheme(label=t.get("label", "").strip(), narratives=[n for n in narratives if n.statement]))
+        themes.append(ExtractedTheme(label=(t.get("label") or "").strip(), narratives=narratives))
 
     # Use the LLM-provided summary; fall back to conclusions or first narrative if the LLM returned null/empty.
+    conclusions = [c for c in (data.get("conclusions") or []) if isinstance(c, str) and c.strip()]
     summary_text = (data.get("summary") or "").strip() or None
     if not summary_text:
-        conclusions = [c for c in (data.get("conclusions") or []) if isinstance(c, str) and c.strip()]
         if conclusions:
             summary_text = " ".join(conclusions[:3])
         elif themes:
@@ -188,6 +305,33 @@ def extract_themes_and_narratives(
 
     return ExtractedDoc(
         summary=summary_text,
-        conclusions=[c for c in (data.get("conclusions") or []) if isinstance(c, str) and c.strip()],
+        conclusions=conclusions,
         themes=[t for t in themes if t.label],
     )
+
+
+def extract_themes_and_narratives_batch(
+    texts: list[str],
+    *,
+    model_overrides: list[str | None] | None = None,
+    max_workers: int | None = None,
+) -> list[ExtractedDoc | Exception]:
+    """Run extract_themes_and_narratives for several texts concurrently (calls are network-bound).
+    model_overrides, if given, pairs a model with each text. Results are in input order; a call that
+    failed after its retries yields its exception instead of an ExtractedDoc, so one bad document
+    does not discard the others. Concurrency defaults to LLM_MAX_CONCURRENT_REQUESTS."""
+    if not texts:
+        return []
+    models = model_overrides if model_overrides is not None else [None] * len(texts)
+    if len(models) != len(texts):
+        raise ValueError("model_overrides must have one entry per text")
+
+    def _one(text: str, model: str | None) -> ExtractedDoc | Exception:
+        try:
+            return extract_themes_and_narratives(text=text, model_override=model)
+        except Exception as e:
+            return e
+
+    workers = min(len(texts), max(1, max_workers or settings.llm_max_concurrent_requests))
+    with futures.ThreadPoolExecutor(max_workers=workers) as ex:
+        return list(ex.map(_one, texts, models))
@@ -4,13 +4,18 @@ Uses Vertex when enabled, otherwise OpenAI (no Vertex/GCP required).
 """
 from __future__ import annotations
 
+import functools
 import logging
-from typing import List
+from concurrent import futures
 
 from app.settings import settings
 
 logger = logging.getLogger("investing_agent.llm.embeddings")
 
+# OpenAI embedding request size, and how many requests may be in flight at once
+_OPENAI_EMBED_BATCH_SIZE = 20
+_OPENAI_EMBED_MAX_CONCURRENCY = 8
+
 
 def _use_vertex() -> bool:
     return (
@@ -37,9 +42,19 @@ def _use_openai() -> bool:
     return False
 
 
+@functools.cache
+def _backend() -> str | None:
+    """Configured embedding backend ("vertex", "openai" or None); settings are fixed for the process."""
+    if _use_vertex():
+        return "vertex"
+    if _use_openai():
+        return "openai"
+    return None
+
+
 def is_embedding_available() -> bool:
     """True if any embedding backend is configured (Vertex or OpenAI)."""
-    return _use_vertex() or _use_openai()
+    return _backend() is not None
 
 
 def embed_texts(*, texts: list[str]) -> list[list[float]]:
@@ -47,17 +62,24 @@ def embed_texts(*, texts: list[str]) -> list[list[float]]:
     Embed a list of texts. Uses Vertex when embedding_provider is vertex (or auto with Vertex enabled),
     otherwise OpenAI when embedding_provider is openai (or auto with LLM_API_KEY and no Vertex).
     Returns list of embedding vectors; failed or unavailable backend returns empty vectors.
+    Identical texts are embedded once.
     """
     if not texts:
         return []
-    if _use_vertex():
+    # Embed each distinct text once; duplicates (common across theme labels) share its vector
+    unique = list(dict.fromkeys(texts))
+    if len(unique) < len(texts):
+        by_text = dict(zip(unique, embed_texts(texts=unique)))
+        return [by_text[t] for t in texts]
+    backend = _backend()
+    if backend == "vertex":
         try:
             from app.llm.vertex import embed_texts as vertex_embed
             return vertex_embed(texts=texts)
         except Exception as e:
             logger.warning("Vertex embedding failed: %s", e)
             return [[]] * len(texts)
-    if _use_openai():
+    if backend == "openai":
         try:
             return _openai_embed(texts)
         except Exception as e:
@@ -68,21 +90,20 @@ def embed_texts(*, texts: list[str]) -> list[list[float]]:
 
 def _openai_embed(texts: list[str]) -> list[list[float]]:
     """OpenAI embeddings API (text-embedding-3-small). No Vertex required."""
-    from openai import OpenAI
+    from app.llm.provider import get_openai_client
 
     model = getattr(settings, "embedding_model", "text-embedding-3-small") or "text-embedding-3-small"
     # Use official OpenAI API for embeddings (base_url=None); LLM_BASE_URL is for chat only.
-    client = OpenAI(
-        api_key=settings.llm_api_key,
-        base_url=None,
-        timeout=float(getattr(settings, "llm_timeout_seconds", 180)),
-    )
-    # OpenAI accepts batch of inputs; avoid oversized batches
-    batch_size = 20
-    out: List[list[float]] = []
-    for i in range(0, len(texts), batch_size):
-        batch = texts[i : i + batch_size]
+    client = get_openai_client(settings.llm_api_key, None, float(getattr(settings, "llm_timeout_seconds", 180)))
+    # OpenAI accepts batch of inputs; avoid oversized batches. Batches are network-bound, so
+    # they run concurrently (bounded to respect rate limits) and are reassembled in order.
+    batches = [texts[i : i + _OPENAI_EMBED_BATCH_SIZE] for i in range(0, len(texts), _OPENAI_EMBED_BATCH_SIZE)]
+
+    def _embed_batch(batch: list[str]) -> list[list[float]]:
         resp = client.embeddings.create(input=batch, model=model)
-        for item in resp.data:
-            out.append(list(item.embedding))
-    return out
+        return [list(item.embedding) for item in resp.data]
+
+    if len(batches) == 1:
+        return _embed_batch(batches[0])
+    with futures.ThreadPoolExecutor(max_workers=min(_OPENAI_EMBED_MAX_CONCURRENCY, len(batches))) as ex:
+        return [emb for batch_out in ex.map(_embed_batch, batches) for emb in batch_out]
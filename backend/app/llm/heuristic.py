@@ -1,12 +1,13 @@
 from __future__ import annotations
 
 import re
+from bisect import bisect_right
 from collections import Counter
 
 from app.llm.vertex import ExtractedDoc, ExtractedEvidence, ExtractedNarrative, ExtractedTheme
 
 
-_STOP = {
+_STOP = frozenset({
     "the",
     "and",
     "to",
@@ -39,7 +40,11 @@ _STOP = {
     "their",
     "these",
     "those",
-}
+})
+
+_WORD_RE = re.compile(r"[A-Za-z][A-Za-z0-9_\\-]{2,}")
+# Crude sentence split (requires .!? followed by space).
+_SENTENCE_SPLIT_RE = re.compile(r"(?<=[.!?])\s+")
 
 
 def heuristic_extract(*, text: str, max_themes: int = 8) -> ExtractedDoc:
@@ -47,18 +52,34 @@ def heuristic_extract(*, text: str, max_themes: int = 8) -> ExtractedDoc:
     Offline fallback when Vertex AI isn't configured.
     Produces reasonable placeholders so the pipeline works end-to-end.
     """
-    words = [w.lower() for w in re.findall(r"[A-Za-z][A-Za-z0-9_\\-]{2,}", text)]
-    words = [w for w in words if w not in _STOP]
-    top = [w for w, _ in Counter(words).most_common(max_themes)]
-
-    # Crude sentence split (requires .!? followed by space). If none, use whole text for summary.
-    sentences = [s.strip() for s in re.split(r"(?<=[.!?])\s+", text) if s.strip()]
+    # If no sentence boundary, use whole text for summary.
+    sentences = [s.strip() for s in _SENTENCE_SPLIT_RE.split(text) if s.strip()]
     if not sentences and text.strip():
         sentences = [text.strip()]
 
+    # Words never span the whitespace the sentences are split on, so counting per sentence matches
+    # counting the whole text.
+    counts: Counter[str] = Counter()
+    for sentence in sentences:
+        counts.update(w for w in map(str.lower, _WORD_RE.findall(sentence)) if w not in _STOP)
+    # most_common(k) heap-selects the k largest (heapq.nlargest); it never sorts the full histogram
+    top = [w for w, _ in counts.most_common(max_themes)]
+
+    # Evidence is the first sentence whose lowercase text contains the word as a substring ("market"
+    # matches "markets"). Sentences are lowered once and joined with "\n" (never inside a word), so
+    # each lookup is one str.find plus a bisect over the sentence start offsets.
+    lowered = [s.lower() for s in sentences]
+    starts: list[int] = []
+    pos = 0
+    for s in lowered:
+        starts.append(pos)
+        pos += len(s) + 1
+    haystack = "\n".join(lowered)
+
     themes: list[ExtractedTheme] = []
     for w in top:
-        ev_sent = next((s for s in sentences if w in s.lower()), None)
+        hit = haystack.find(w)
+        ev_sent = sentences[bisect_right(starts, hit) - 1] if hit >= 0 else None
         narrative = ExtractedNarrative(
             statement=f"Document discusses {w}.",
             stance="neutral",
@@ -4,11 +4,18 @@ Supports: OpenAI, Gemini (Google AI), and any OpenAI-compatible endpoint (DeepSe
 """
 from __future__ import annotations
 
+import functools
+import json
 import logging
-from concurrent import futures
+from typing import Any
 
 from app.settings import settings
 
+try:
+    import orjson as _orjson  # optional: parses large LLM responses several times faster
+except ImportError:
+    _orjson = None
+
 logger = logging.getLogger("investing_agent.llm.provider")
 
 
@@ -22,12 +29,17 @@ def chat_completion(
     user: str,
     max_tokens: int = 2048,
     model: str | None = None,
+    json_schema: dict | None = None,
 ) -> str:
     """
     Send system + user message to the configured LLM and return the assistant text.
     Uses LLM_API_KEY and LLM_PROVIDER / LLM_MODEL / LLM_BASE_URL from settings.
     Respects LLM_TIMEOUT_SECONDS (default 180) to avoid indefinite hangs.
     Pass model= to override the configured model for this call (e.g. for dry-run comparison).
+    Pass json_schema= (an object schema) to request JSON-only output: schema-constrained on OpenAI,
+    JSON mode on Gemini and on OpenAI-compatible endpoints (LLM_BASE_URL), which may not support schemas.
+    A model that rejects the format with a 400 is retried with JSON mode, then with no format, so the
+    reply may still be fenced: parse it with strip_code_fence + json_loads.
     """
     if not settings.llm_api_key:
         raise ValueError("LLM_API_KEY is not set")
@@ -39,7 +51,15 @@ def chat_completion(
     timeout = _timeout_seconds()
 
     if provider == "gemini":
-        return _gemini_chat(system=system, user=user, model=model, api_key=api_key, max_tokens=max_tokens, timeout=timeout)
+        return _gemini_chat(
+            system=system,
+            user=user,
+            model=model,
+            api_key=api_key,
+            max_tokens=max_tokens,
+            timeout=timeout,
+            json_output=json_schema is not None,
+        )
     return _openai_compatible_chat(
         system=system,
         user=user,
@@ -48,7 +68,98 @@ def chat_completion(
         base_url=base_url,
         max_tokens=max_tokens,
         timeout=timeout,
+        json_schema=json_schema,
+    )
+
+
+def is_retryable_llm_error(exc: BaseException) -> bool:
+    """
+    Retry predicate for LLM calls: retry transient failures (timeouts, connection errors, 5xx,
+    408/429), not ones that would fail the same way again (other 4xx, invalid JSON / ValueError).
+    """
+    if isinstance(exc, ValueError):  # includes json.JSONDecodeError and missing-config errors
+        return False
+    status = getattr(exc, "status_code", None)
+    if status is None and isinstance(getattr(exc, "code", None), int):
+        status = exc.code  # google.api_core exceptions
+    if isinstance(status, int) and 400 <= status < 500 and status not in (408, 429):
+        return False
+    return True
+
+
+def strip_code_fence(text: str) -> str:
+    """
+    Remove a leading ``` / ```json line and a trailing ``` around an LLM reply, by index in one
+    slice (no intermediate copies of the body). Returns the stripped inner text.
+    """
+    text = text.strip()
+    start, end = 0, len(text)
+    if text.startswith("```"):
+        nl = text.find("\n")
+        start = nl + 1 if nl >= 0 else 3
+    if text.endswith("```") and end - 3 >= start:
+        end -= 3
+    return text[start:end].strip()
+
+
+def json_loads(text: str) -> Any:
+    """
+    Parse an LLM JSON reply, with orjson when installed. orjson.JSONDecodeError subclasses
+    json.JSONDecodeError, so callers catch the same exception either way.
+    """
+    if _orjson is not None:
+        return _orjson.loads(text)
+    return json.loads(text)
+
+
+_OPENAI_MAX_CONNECTIONS = 64
+_OPENAI_MAX_KEEPALIVE_CONNECTIONS = 32
+_OPENAI_KEEPALIVE_EXPIRY_SECONDS = 60.0
+
+
+@functools.lru_cache(maxsize=8)
+def get_openai_client(api_key: str, base_url: str | None, timeout: float):
+    """
+    Shared OpenAI client per (api_key, base_url, timeout). The client is thread-safe and keeps an
+    HTTP connection pool, so reusing it skips the TCP/TLS handshake on every call after the first.
+    """
+    import httpx
+    from openai import DefaultHttpxClient, OpenAI
+
+    # Explicit pool: room for the concurrent extraction and embedding fan-outs, and idle connections
+    # kept long enough to survive the gaps between a worker's calls (httpx default expiry is 5s).
+    # DefaultHttpxClient keeps the SDK's own client defaults and only overrides the pool limits.
+    http_client = DefaultHttpxClient(
+        limits=httpx.Limits(
+            max_connections=_OPENAI_MAX_CONNECTIONS,
+            max_keepalive_connections=_OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=_OPENAI_KEEPALIVE_EXPIRY_SECONDS,
+        ),
+        timeout=timeout,
     )
+    return OpenAI(api_key=api_key, base_url=base_url, timeout=timeout, http_client=http_client)
+
+
+# (base_url, model) -> response_format types that endpoint rejected with a 400; later calls skip them.
+_REJECTED_RESPONSE_FORMATS: dict[tuple[str | None, str], set[str]] = {}
+
+
+def _response_formats(json_schema: dict | None, base_url: str | None) -> list[dict | None]:
+    """response_format values to try in order: schema (OpenAI only), JSON mode, then none (plain reply)."""
+    if json_schema is None:
+        return [None]
+    formats: list[dict | None] = [{"type": "json_object"}, None]
+    if not base_url:
+        formats.insert(0, {"type": "json_schema", "json_schema": {"name": "response", "schema": json_schema}})
+    return formats
+
+
+def _is_response_format_rejection(exc: BaseException) -> bool:
+    """True for a 400 that names the requested output format (model or endpoint lacks structured output)."""
+    if getattr(exc, "status_code", None) != 400:
+        return False
+    msg = str(exc).lower()
+    return any(s in msg for s in ("response_format", "json_schema", "json_object", "structured output"))
 
 
 def _openai_compatible_chat(
@@ -60,33 +171,49 @@ def _openai_compatible_chat(
     base_url: str | None,
     max_tokens: int,
     timeout: float,
+    json_schema: dict | None = None,
 ) -> str:
-    from openai import OpenAI
-
-    client = OpenAI(api_key=api_key, base_url=base_url, timeout=timeout)
-    try:
-        resp = client.chat.completions.create(
-            model=model,
-            messages=[
-                {"role": "system", "content": system},
-                {"role": "user", "content": user},
-            ],
-            temperature=0.2,
-            max_tokens=max_tokens,
-        )
-    except Exception as e:
-        err_msg = str(e).lower()
-        if "503" in err_msg or "service unavailable" in err_msg:
-            logger.error(
-                "OpenAI-compatible API returned 503 (Service Unavailable). "
-                "Often transient: retry later, or try without VPN / different VPN server. Full error: %s",
-                e,
+    client = get_openai_client(api_key, base_url, timeout)
+    rejected = _REJECTED_RESPONSE_FORMATS.setdefault((base_url, model), set())
+    formats = [f for f in _response_formats(json_schema, base_url) if f is None or f["type"] not in rejected]
+    for attempt, response_format in enumerate(formats):
+        extra = {"response_format": response_format} if response_format is not None else {}
+        try:
+            resp = client.chat.completions.create(
+                model=model,
+                messages=[
+                    {"role": "system", "content": system},
+                    {"role": "user", "content": user},
+                ],
+                temperature=0.2,
+                max_tokens=max_tokens,
+                **extra,
             )
-        elif "timeout" in err_msg or "timed out" in err_msg:
-            logger.error("OpenAI-compatible API timed out after %s seconds: %s", timeout, e)
-        else:
-            logger.error("OpenAI-compatible API error: %s", e, exc_info=True)
-        raise
+            break
+        except Exception as e:
+            if response_format is not None and attempt + 1 < len(formats) and _is_response_format_rejection(e):
+                # Callers parse JSON from any of the formats (the prompt still asks for JSON only).
+                logger.warning(
+                    "Model %s does not accept response_format=%s; retrying with %s: %s",
+                    model,
+                    response_format["type"],
+                    (formats[attempt + 1] or {}).get("type", "no response_format"),
+                    e,
+                )
+                rejected.add(response_format["type"])
+                continue
+            err_msg = str(e).lower()
+            if "503" in err_msg or "service unavailable" in err_msg:
+                logger.error(
+                    "OpenAI-compatible API returned 503 (Service Unavailable). "
+                    "Often transient: retry later, or try without VPN / different VPN server. Full error: %s",
+                    e,
+                )
+            elif "timeout" in err_msg or "timed out" in err_msg:
+                logger.error("OpenAI-compatible API timed out after %s seconds: %s", timeout, e)
+            else:
+                logger.error("OpenAI-compatible API error: %s", e, exc_info=True)
+            raise
     choice = resp.choices[0] if resp.choices else None
     if not choice or not getattr(choice, "message", None):
         logger.error("OpenAI-compatible API returned empty/invalid response: choices=%s", getattr(resp, "choices", None))
@@ -104,27 +231,27 @@ def _gemini_chat(
     api_key: str,
     max_tokens: int,
     timeout: float,
+    json_output: bool = False,
 ) -> str:
     import google.generativeai as genai
+    from google.api_core.exceptions import DeadlineExceeded
 
     genai.configure(api_key=api_key)
     gm = genai.GenerativeModel(model)
     combined = f"{system}\n\n{user}" if system else user
 
-    def _call():
-        return gm.generate_content(
+    try:
+        # The SDK enforces the deadline itself; no helper thread per call
+        resp = gm.generate_content(
             combined,
             generation_config=genai.types.GenerationConfig(
                 temperature=0.2,
                 max_output_tokens=max_tokens,
+                response_mime_type="application/json" if json_output else None,
             ),
+            request_options={"timeout": timeout},
         )
-
-    try:
-        with futures.ThreadPoolExecutor(max_workers=1) as ex:
-            future = ex.submit(_call)
-            resp = future.result(timeout=timeout)
-    except futures.TimeoutError:
+    except DeadlineExceeded:
         logger.error("Gemini API timed out after %s seconds (increase LLM_TIMEOUT_SECONDS for long documents)", timeout)
         raise TimeoutError(
             f"Gemini request timed out after {timeout:.0f} seconds. "
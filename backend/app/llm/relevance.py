@@ -4,7 +4,7 @@ import json
 import logging
 from dataclasses import dataclass
 
-from app.llm.provider import chat_completion
+from app.llm.provider import chat_completion, strip_code_fence
 from app.settings import settings
 
 logger = logging.getLogger("investing_agent.llm.relevance")
@@ -81,11 +81,7 @@ def _llm_decision(filename: str, source_name: str, source_uri: str | None, text:
     user = "Classify this document:\n" + json.dumps(payload, ensure_ascii=True)
     try:
         raw = chat_completion(system=system, user=user, max_tokens=180)
-        if raw.startswith("```"):
-            raw = raw.split("\n", 1)[-1] if "\n" in raw else raw[3:]
-        if raw.endswith("```"):
-            raw = raw.rsplit("```", 1)[0].rstrip()
-        data = json.loads(raw.strip())
+        data = json.loads(strip_code_fence(raw))
         is_inv = bool(data.get("is_investment_related", True))
         confidence = float(data.get("confidence", 0.0))
         confidence = max(0.0, min(1.0, confidence))
@@ -5,15 +5,17 @@ from __future__ import annotations
 
 import json
 import logging
+from concurrent import futures
 from typing import Any
 
-from tenacity import retry, stop_after_attempt, wait_exponential
+from tenacity import retry, retry_if_exception, stop_after_attempt, wait_random_exponential
 
-from app.llm.provider import chat_completion
+from app.llm.provider import chat_completion, is_retryable_llm_error, json_loads, strip_code_fence
 from app.settings import settings
 
 logger = logging.getLogger("investing_agent.llm.suggest_merges")
 
+
 _SYSTEM = (
     "You are an analyst. Given a list of investment theme labels, identify which labels refer to the same investment thesis or topic. "
     "Group labels that are: the same theme (event- or period-specific vs enduring, e.g. 'Novo 2q25 results' and 'Novo nordisk obesity drug pipeline'); "
@@ -41,7 +43,13 @@ _SCHEMA = {
 }
 
 
-@retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=2, max=20))
+# Up to this many labels go to the LLM in one call; larger lists are split into overlapping shards
+# that run concurrently and whose groups are joined (labels shared by two shards link their groups).
+_MAX_LABELS_PER_CALL = 200
+_SHARD_SIZE = 80
+_SHARD_STRIDE = 60
+
+
 def suggest_theme_merge_groups(labels: list[str]) -> list[list[str]]:
     """
     Ask the LLM to group theme labels that refer to the same theme.
@@ -51,10 +59,50 @@ def suggest_theme_merge_groups(labels: list[str]) -> list[list[str]]:
         raise ValueError("LLM_API_KEY is not set; cannot run suggest-merges")
     if not labels:
         return []
-    # Limit token usage
-    max_labels = 200
-    if len(labels) > max_labels:
-        labels = labels[:max_labels]
+    if len(labels) <= _MAX_LABELS_PER_CALL:
+        return _suggest_groups_once(labels)
+    shards = [
+        labels[i : i + _SHARD_SIZE]
+        for i in range(0, len(labels) - _SHARD_SIZE + _SHARD_STRIDE, _SHARD_STRIDE)
+    ]
+    max_workers = min(len(shards), max(1, settings.llm_max_concurrent_requests))
+    with futures.ThreadPoolExecutor(max_workers=max_workers) as ex:
+        shard_groups = list(ex.map(_suggest_groups_once, shards))
+    return _join_groups(g for groups in shard_groups for g in groups)
+
+
+def _join_groups(groups) -> list[list[str]]:
+    """Union-find over labels: groups sharing any label become one group (first-seen label order)."""
+    parent: dict[str, str] = {}
+
+    def _find(lb: str) -> str:
+        while parent[lb] != lb:
+            parent[lb] = parent[parent[lb]]
+            lb = parent[lb]
+        return lb
+
+    for group in groups:
+        for lb in group:
+            parent.setdefault(lb, lb)
+        if group:
+            root = _find(group[0])
+            for lb in group[1:]:
+                other = _find(lb)
+                if other != root:
+                    parent[other] = root
+    joined: dict[str, list[str]] = {}
+    for lb in parent:
+        joined.setdefault(_find(lb), []).append(lb)
+    return list(joined.values())
+
+
+@retry(
+    stop=stop_after_attempt(3),
+    wait=wait_random_exponential(multiplier=1, min=2, max=20),
+    retry=retry_if_exception(is_retryable_llm_error),
+)
+def _suggest_groups_once(labels: list[str]) -> list[list[str]]:
+    """One LLM call grouping up to _MAX_LABELS_PER_CALL labels."""
     user = (
         "Here are investment theme labels extracted from research. "
         "Which refer to the same theme? Return JSON with \"groups\": array of arrays of labels.\n\n"
@@ -62,12 +110,8 @@ def suggest_theme_merge_groups(labels: list[str]) -> list[list[str]]:
         + "\n".join(f"- {lb}" for lb in labels)
     )
     raw = chat_completion(system=_SYSTEM, user=user, max_tokens=4096)
-    if raw.startswith("```"):
-        raw = raw.split("\n", 1)[-1] if "\n" in raw else raw[3:]
-    if raw.endswith("```"):
-        raw = raw.rsplit("```", 1)[0].rstrip()
     try:
-        data: dict[str, Any] = json.loads(raw.strip())
+        data: dict[str, Any] = json_loads(strip_code_fence(raw))
     except json.JSONDecodeError as e:
         logger.error("LLM suggest-merges returned invalid JSON: %s", e)
         raise
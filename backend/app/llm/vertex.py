@@ -1,26 +1,48 @@
 from __future__ import annotations
 
-import json
+import atexit
+import functools
+import logging
+import threading
 from concurrent import futures
 from dataclasses import dataclass, field
 from typing import Any, Optional
 
 from tenacity import retry, stop_after_attempt, wait_exponential
 
+from app.llm.provider import json_loads
 from app.settings import settings
 
+logger = logging.getLogger("investing_agent.llm.vertex")
+
+# Oversized documents are split into chunks of LLM_EXTRACTION_MAX_CHARS, overlapping so a passage cut at
+# a boundary is seen whole in one of them, and extracted concurrently (bounded per document)
+_CHUNK_OVERLAP_CHARS = 2_000
+_MAX_CHUNK_WORKERS = 5
+
+# Vertex get_embeddings limits per request (multi-input models), and requests in flight at once
+_EMBED_MAX_BATCH_SIZE = 250
+_EMBED_MAX_BATCH_CHARS = 40_000
+_EMBED_MAX_CONCURRENCY = 8
+
+# Shared pool that runs each Vertex call so the caller can stop waiting after LLM_TIMEOUT_SECONDS.
+# Sized above worker concurrency x chunk fan-out so calls never queue (queued time would count
+# against their timeout); threads are only started on demand.
+_VERTEX_EXECUTOR = futures.ThreadPoolExecutor(max_workers=32, thread_name_prefix="vertex")
+atexit.register(_VERTEX_EXECUTOR.shutdown, wait=False, cancel_futures=True)
+
 
 def _vertex_timeout_seconds() -> float:
     return float(max(30, getattr(settings, "llm_timeout_seconds", 180)))
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class ExtractedEvidence:
     quote: str
     page: Optional[int]
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class ExtractedNarrative:
     statement: str
     stance: str
@@ -31,110 +53,165 @@ class ExtractedNarrative:
     evidence: list[ExtractedEvidence] = field(default_factory=list)
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class ExtractedTheme:
     label: str
     narratives: list[ExtractedNarrative]
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class ExtractedDoc:
     summary: Optional[str]
     conclusions: list[str]
     themes: list[ExtractedTheme]
 
 
-def _vertex_init():
-    import vertexai
-
-    vertexai.init(project=settings.gcp_project, location=settings.gcp_location)
-
-
-def _extract_themes_vertex_impl(text: str) -> ExtractedDoc:
-    _vertex_init()
-    from vertexai.generative_models import GenerativeModel
-
-    model = GenerativeModel(settings.vertex_gemini_model)
-
-    system = (
-        "You are an analyst extracting market narratives from research.\n"
-        "Return ONLY valid JSON. Do not include markdown.\n"
-        "CRITICAL: Theme labels must be ONLY the core entity or topic name (e.g. 'BYD', 'Miniso', 'Gold', 'HBM / AI memory'). "
-        "NEVER append qualifiers, strategies, or dimensions to the theme label—those go in sub_theme. "
-        "Bad: 'BYD International sales'. Good: theme 'BYD', sub_theme 'International sales'.\n"
-        "Sub-themes can be either reusable analytical lenses (e.g. 'Demand outlook', 'Valuation', 'Margins') "
-        "OR named catalysts/entities (e.g. 'GENIUS Act', 'CHIPS Act', 'GPT-5') when the specific entity is central to the narrative. "
-        "Prefer specificity—'GENIUS Act' is better than 'Regulation' if the narrative is specifically about that act.\n"
-        "Include direct quotes per narrative as evidence when the document supports it; use the evidence array fully.\n"
-    )
-
-    schema = {
-        "type": "object",
-        "properties": {
-            "summary": {"type": "string", "description": "A concise 2-4 sentence summary of the document's key investment takeaways. Focus on the most important findings, data points, or conclusions an investor should know. Never return null."},
-            "conclusions": {"type": "array", "items": {"type": "string"}},
-            "themes": {
-                "type": "array",
-                "items": {
-                    "type": "object",
-                    "properties": {
-                        "label": {"type": "string", "description": "Core entity or topic name ONLY (e.g. 'BYD', 'Miniso', 'Gold'). Never append qualifiers—those go in sub_theme."},
-                        "narratives": {
-                            "type": "array",
-                            "items": {
-                                "type": "object",
-                                "properties": {
-                                    "statement": {"type": "string"},
-                                    "sub_theme": {"type": "string", "description": "2-5 word label: either a reusable analytical lens (e.g. Demand outlook, Valuation) OR a named catalyst/entity (e.g. GENIUS Act, CHIPS Act, GPT-5). Prefer specificity."},
-                                    "narrative_stance": {"type": "string", "enum": ["bullish", "bearish", "mixed", "neutral"]},
-                                    "confidence_level": {"type": "string", "enum": ["fact", "opinion"]},
-                                    "evidence": {
-                                        "type": "array",
-                                        "description": "Multiple direct quotes or key sentences from the document that support this narrative. Include 2-5 items when the document provides enough support; minimum 1.",
-                                        "items": {
-                                            "type": "object",
-                                            "properties": {
-                                                "quote": {"type": "string", "description": "Exact quote or key sentence from the document."},
-                                                "page": {"type": ["integer", "null"]},
-                                            },
-                                            "required": ["quote", "page"],
+_SYSTEM = (
+    "You are an analyst extracting market narratives from research.\n"
+    "Return ONLY valid JSON. Do not include markdown.\n"
+    "CRITICAL: Theme labels must be ONLY the core entity or topic name (e.g. 'BYD', 'Miniso', 'Gold', 'HBM / AI memory'). "
+    "NEVER append qualifiers, strategies, or dimensions to the theme label—those go in sub_theme. "
+    "Bad: 'BYD International sales'. Good: theme 'BYD', sub_theme 'International sales'.\n"
+    "Sub-themes can be either reusable analytical lenses (e.g. 'Demand outlook', 'Valuation', 'Margins') "
+    "OR named catalysts/entities (e.g. 'GENIUS Act', 'CHIPS Act', 'GPT-5') when the specific entity is central to the narrative. "
+    "Prefer specificity—'GENIUS Act' is better than 'Regulation' if the narrative is specifically about that act.\n"
+    "Include direct quotes per narrative as evidence when the document supports it; use the evidence array fully.\n"
+)
+
+# Sent as the response_schema (Vertex's OpenAPI subset: "nullable" rather than type unions), so
+# Gemini's output is constrained to this shape and the schema need not be repeated in the prompt
+_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "summary": {"type": "string", "description": "A concise 2-4 sentence summary of the document's key investment takeaways. Focus on the most important findings, data points, or conclusions an investor should know. Never return null."},
+        "conclusions": {"type": "array", "items": {"type": "string"}},
+        "themes": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "label": {"type": "string", "description": "Core entity or topic name ONLY (e.g. 'BYD', 'Miniso', 'Gold'). Never append qualifiers—those go in sub_theme."},
+                    "narratives": {
+                        "type": "array",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "statement": {"type": "string"},
+                                "sub_theme": {"type": "string", "description": "2-5 word label: either a reusable analytical lens (e.g. Demand outlook, Valuation) OR a named catalyst/entity (e.g. GENIUS Act, CHIPS Act, GPT-5). Prefer specificity."},
+                                "narrative_stance": {"type": "string", "enum": ["bullish", "bearish", "mixed", "neutral"]},
+                                "confidence_level": {"type": "string", "enum": ["fact", "opinion"]},
+                                "evidence": {
+                                    "type": "array",
+                                    "description": "Multiple direct quotes or key sentences from the document that support this narrative. Include 2-5 items when the document provides enough support; minimum 1.",
+                                    "items": {
+                                        "type": "object",
+                                        "properties": {
+                                            "quote": {"type": "string", "description": "Exact quote or key sentence from the document."},
+                                            "page": {"type": "integer", "nullable": True},
                                         },
+                                        "required": ["quote", "page"],
                                     },
                                 },
-                                "required": ["statement", "sub_theme", "narrative_stance", "confidence_level", "evidence"],
                             },
+                            "required": ["statement", "sub_theme", "narrative_stance", "confidence_level", "evidence"],
                         },
                     },
-                    "required": ["label", "narratives"],
                 },
+                "required": ["label", "narratives"],
             },
         },
-        "required": ["summary", "conclusions", "themes"],
+    },
+    "required": ["summary", "conclusions", "themes"],
+}
+
+# Static instructions: identical on every call, so built once
+_PREAMBLE = (
+    "Extract themes, sub-themes, and narratives from the following document text.\n"
+    "Theme: the core entity or topic name ONLY—short and canonical (e.g. 'BYD', 'Miniso', 'Gold', 'HBM / AI memory'). "
+    "NEVER append qualifiers or dimensions to the theme label; put those in sub_theme.\n"
+    "Sub-theme: 2-5 word label — either a reusable analytical lens (e.g. International sales, Growth strategy, Demand outlook, Valuation) OR a named catalyst/entity (e.g. GENIUS Act, CHIPS Act, GPT-5) when the specific entity is central to the narrative. Prefer specificity. "
+    "Narrative: the claim or change through that lens — keep short and direct (1–2 sentences). "
+    "Prefer fewer high-signal narratives (typically 2–6 per document); merge related claims, do not fragment. "
+    "For each narrative provide sub_theme, narrative_stance (bullish/bearish/mixed/neutral), confidence_level (fact/opinion), and evidence (quotes with page).\n"
+    "\n"
+)
+
+
+_vertex_init_lock = threading.Lock()
+_vertex_initialized = False
+
+
+def _vertex_init():
+    """Initialize the Vertex SDK once per process (settings are fixed); later calls return immediately."""
+    global _vertex_initialized
+    if _vertex_initialized:
+        return
+    with _vertex_init_lock:
+        if _vertex_initialized:
+            return
+        import vertexai
+
+        vertexai.init(project=settings.gcp_project, location=settings.gcp_location)
+        _vertex_initialized = True
+
+
+# Model objects hold no per-request state and are safe to share across threads, so build each once
+# (constructing them resolves config and endpoints). Call after _vertex_init().
+@functools.lru_cache(maxsize=4)
+def _generative_model(model_name: str):
+    from vertexai.generative_models import GenerativeModel
+
+    return GenerativeModel(model_name)
+
+
+@functools.lru_cache(maxsize=2)
+def _embedding_model(model_name: str):
+    from vertexai.language_models import TextEmbeddingModel
+
+    return TextEmbeddingModel.from_pretrained(model_name)
+
+
+def _generate_extraction(document: str) -> str:
+    """Raw Gemini reply for the extraction prompt."""
+    _vertex_init()
+    generation_config = {
+        "temperature": 0.2,
+        "max_output_tokens": settings.llm_extraction_max_tokens,
+        "response_mime_type": "application/json",
+        "response_schema": _SCHEMA,
     }
+    model = _generative_model(settings.vertex_gemini_model)
+    resp = model.generate_content([_SYSTEM, _PREAMBLE + document], generation_config=generation_config)
+    # JSON mode: the reply is bare JSON (no markdown fence), parsed as-is
+    return resp.text or ""
+
+
+def _extract_themes_vertex_impl(text: str) -> ExtractedDoc:
+    from app.llm import _extract_cache
 
-    prompt = (
-        "Extract themes, sub-themes, and narratives from the following document text.\n"
-        "Theme: the core entity or topic name ONLY—short and canonical (e.g. 'BYD', 'Miniso', 'Gold', 'HBM / AI memory'). "
-        "NEVER append qualifiers or dimensions to the theme label; put those in sub_theme.\n"
-        "Sub-theme: 2-5 word label — either a reusable analytical lens (e.g. International sales, Growth strategy, Demand outlook, Valuation) OR a named catalyst/entity (e.g. GENIUS Act, CHIPS Act, GPT-5) when the specific entity is central to the narrative. Prefer specificity. "
-        "Narrative: the claim or change through that lens — keep short and direct (1–2 sentences). "
-        "Prefer fewer high-signal narratives (typically 2–6 per document); merge related claims, do not fragment. "
-        "For each narrative provide sub_theme, narrative_stance (bullish/bearish/mixed/neutral), confidence_level (fact/opinion), and evidence (quotes with page).\n"
-        "Output JSON following this JSON Schema:\n"
-        f"{json.dumps(schema)}\n"
-        "\n"
+    document = (
         "DOCUMENT TEXT:\n"
         f"{text[:getattr(settings, 'llm_extraction_max_chars', 120_000)]}\n"
     )
-
-    max_out = settings.llm_extraction_max_tokens
-    resp = model.generate_content(
-        [system, prompt],
-        generation_config={"temperature": 0.2, "max_output_tokens": max_out},
+    # Same model, output budget and prompt -> same extraction: a re-ingested document skips the call
+    cache_key = _extract_cache.make_key(
+        "vertex",
+        settings.vertex_gemini_model,
+        str(settings.llm_extraction_max_tokens),
+        _SYSTEM,
+        _PREAMBLE,
+        document,
     )
-    raw = (resp.text or "").strip()
+    raw = _extract_cache.get(cache_key)
+    cached_raw = raw is not None
+    if cached_raw:
+        logger.info("Vertex extraction cache hit key=%s", cache_key[:12])
+    else:
+        raw = _generate_extraction(document)
 
-    data: dict[str, Any] = json.loads(raw)
+    data: dict[str, Any] = json_loads(raw)
+    if not cached_raw:
+        _extract_cache.put(cache_key, raw)
 
     def _norm_stance(s: str) -> str:
         v = (s or "").strip().lower()
@@ -184,49 +261,142 @@ def _extract_themes_vertex_impl(text: str) -> ExtractedDoc:
     )
 
 
+def _chunk_text(text: str, size: int, overlap: int = _CHUNK_OVERLAP_CHARS) -> list[str]:
+    """Split text into chunks of at most size chars, each starting overlap chars before the previous end.
+    Cuts fall on the last newline/space in the final 1000 chars of a chunk when there is one."""
+    if len(text) <= size:
+        return [text]
+    overlap = min(overlap, size // 2)
+    chunks: list[str] = []
+    start = 0
+    while True:
+        end = start + size
+        if end >= len(text):
+            chunks.append(text[start:])
+            return chunks
+        cut = max(text.rfind("\n", end - 1000, end), text.rfind(" ", end - 1000, end))
+        if cut > start + overlap:
+            end = cut
+        chunks.append(text[start:end])
+        start = end - overlap
+
+
+def _merge_results(results: list[ExtractedDoc]) -> ExtractedDoc:
+    """Combine per-chunk extractions: first non-empty summary, conclusions and themes in chunk order,
+    themes grouped by case-insensitive label, narratives deduplicated by (sub_theme, statement)."""
+    summary = next((r.summary for r in results if r.summary), None)
+    conclusions = list(dict.fromkeys(c for r in results for c in r.conclusions))
+    labels: dict[str, str] = {}
+    narratives_by_label: dict[str, dict[tuple[str | None, str], ExtractedNarrative]] = {}
+    for r in results:
+        for t in r.themes:
+            key = t.label.lower()
+            labels.setdefault(key, t.label)
+            by_statement = narratives_by_label.setdefault(key, {})
+            for n in t.narratives:
+                by_statement.setdefault((n.sub_theme, n.statement), n)
+    themes = [ExtractedTheme(label=labels[k], narratives=list(ns.values())) for k, ns in narratives_by_label.items()]
+    return ExtractedDoc(summary=summary, conclusions=conclusions, themes=themes)
+
+
 @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=1, max=10))
+def _extract_single_chunk(text: str) -> ExtractedDoc:
+    """
+    One Gemini extraction call, wrapped in a timeout so we fail after LLM_TIMEOUT_SECONDS
+    instead of the client's 600s retry.
+    """
+    timeout = _vertex_timeout_seconds()
+    future = _VERTEX_EXECUTOR.submit(_extract_themes_vertex_impl, text)
+    try:
+        return future.result(timeout=timeout)
+    except futures.TimeoutError:
+        future.cancel()
+        raise TimeoutError(
+            f"Vertex AI request timed out after {timeout:.0f}s. "
+            "Check network/firewall or set LLM_TIMEOUT_SECONDS. "
+            "If you see 503/failed to connect, try Gemini API key (REST) instead of Vertex."
+        ) from None
+
+
 def extract_themes_and_narratives(*, text: str) -> ExtractedDoc:
     """
     Calls Gemini on Vertex AI and returns a structured extraction.
-    Wrapped in a timeout so we fail after LLM_TIMEOUT_SECONDS instead of the client's 600s retry.
+    Text longer than LLM_EXTRACTION_MAX_CHARS is split into overlapping chunks that are extracted
+    concurrently and merged, instead of truncated; a failed chunk is logged and skipped unless all fail.
     """
-    timeout = _vertex_timeout_seconds()
-    with futures.ThreadPoolExecutor(max_workers=1) as ex:
-        future = ex.submit(_extract_themes_vertex_impl, text)
+    chunks = _chunk_text(text, getattr(settings, "llm_extraction_max_chars", 120_000))
+    if len(chunks) == 1:
+        return _extract_single_chunk(chunks[0])
+
+    def _one(chunk: str) -> ExtractedDoc | Exception:
         try:
-            return future.result(timeout=timeout)
-        except futures.TimeoutError:
-            raise TimeoutError(
-                f"Vertex AI request timed out after {timeout:.0f}s. "
-                "Check network/firewall or set LLM_TIMEOUT_SECONDS. "
-                "If you see 503/failed to connect, try Gemini API key (REST) instead of Vertex."
-            ) from None
+            return _extract_single_chunk(chunk)
+        except Exception as e:
+            return e
+
+    with futures.ThreadPoolExecutor(max_workers=min(len(chunks), _MAX_CHUNK_WORKERS)) as ex:
+        outcomes = list(ex.map(_one, chunks))
+    results = [r for r in outcomes if isinstance(r, ExtractedDoc)]
+    failed = [r for r in outcomes if not isinstance(r, ExtractedDoc)]
+    if not results:
+        raise failed[0]
+    if failed:
+        logger.warning("Vertex extraction: %d of %d chunks failed, merging the rest: %s", len(failed), len(chunks), failed[0])
+    return _merge_results(results)
+
+
+def _embed_batches(texts: list[str]) -> list[list[str]]:
+    """
+    Group texts into get_embeddings requests. gemini-embedding-* models take one input per request;
+    the others take up to 250 inputs (and ~20k tokens, kept under by a character budget).
+    """
+    if settings.vertex_embed_model.startswith("gemini-embedding"):
+        return [[t] for t in texts]
+    batches: list[list[str]] = []
+    batch: list[str] = []
+    chars = 0
+    for t in texts:
+        if batch and (len(batch) >= _EMBED_MAX_BATCH_SIZE or chars + len(t) > _EMBED_MAX_BATCH_CHARS):
+            batches.append(batch)
+            batch, chars = [], 0
+        batch.append(t)
+        chars += len(t)
+    if batch:
+        batches.append(batch)
+    return batches
 
 
-def _embed_texts_impl(texts: list[str]) -> list[list[float]]:
+def _embed_texts_impl(batches: list[list[str]]) -> list[list[float]]:
     _vertex_init()
-    from vertexai.language_models import TextEmbeddingInput, TextEmbeddingModel
+    from vertexai.language_models import TextEmbeddingInput
 
-    model = TextEmbeddingModel.from_pretrained(settings.vertex_embed_model)
-    out: list[list[float]] = []
-    for t in texts:
-        inp = TextEmbeddingInput(t, "RETRIEVAL_DOCUMENT")
-        emb = model.get_embeddings([inp])[0].values
-        out.append(list(emb))
-    return out
+    model = _embedding_model(settings.vertex_embed_model)
+
+    def _embed_batch(batch: list[str]) -> list[list[float]]:
+        inputs = [TextEmbeddingInput(t, "RETRIEVAL_DOCUMENT") for t in batch]
+        return [list(e.values) for e in model.get_embeddings(inputs)]
+
+    if len(batches) == 1:
+        return _embed_batch(batches[0])
+    # Requests are network-bound: run them concurrently, reassembled in input order
+    with futures.ThreadPoolExecutor(max_workers=min(_EMBED_MAX_CONCURRENCY, len(batches))) as ex:
+        return [emb for batch_out in ex.map(_embed_batch, batches) for emb in batch_out]
 
 
 @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=1, max=10))
 def embed_texts(*, texts: list[str]) -> list[list[float]]:
     """Vertex embeddings; wrapped in timeout to avoid 600s gRPC retry on connection failure."""
-    timeout = _vertex_timeout_seconds()
-    with futures.ThreadPoolExecutor(max_workers=1) as ex:
-        future = ex.submit(_embed_texts_impl, texts)
-        try:
-            return future.result(timeout=timeout)
-        except futures.TimeoutError:
-            raise TimeoutError(
-                f"Vertex embeddings timed out after {timeout:.0f}s. "
-                "Check network/firewall. If 503 persists, disable embeddings or use a different network."
-            ) from None
+    batches = _embed_batches(texts)
+    # The timeout covers one round of concurrent requests; scale it with the number of rounds
+    rounds = -(-len(batches) // _EMBED_MAX_CONCURRENCY) or 1
+    timeout = _vertex_timeout_seconds() * rounds
+    future = _VERTEX_EXECUTOR.submit(_embed_texts_impl, batches)
+    try:
+        return future.result(timeout=timeout)
+    except futures.TimeoutError:
+        future.cancel()
+        raise TimeoutError(
+            f"Vertex embeddings timed out after {timeout:.0f}s. "
+            "Check network/firewall. If 503 persists, disable embeddings or use a different network."
+        ) from None
 
@@ -3,20 +3,46 @@ Shared logging setup: optional log file + stdout, consistent format for debuggin
 """
 from __future__ import annotations
 
+import atexit
 import logging
+import queue
 import sys
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, WatchedFileHandler
 from pathlib import Path
 
 
 LOG_FORMAT = "%(asctime)s [%(levelname)s] %(name)s: %(message)s"
 DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
 
+# Background thread that writes queued records to the stdout/file handlers
+_listener: QueueListener | None = None
 
-def setup_logging(log_file: str = "", level: int = logging.INFO) -> None:
+
+def _stop_listener() -> None:
+    global _listener
+    if _listener is not None:
+        _listener.stop()  # flushes records still in the queue
+        for h in _listener.handlers:
+            h.close()
+        _listener = None
+
+
+def setup_logging(
+    log_file: str = "",
+    level: int = logging.INFO,
+    max_bytes: int = 0,
+    backup_count: int = 0,
+) -> None:
     """
     Configure root logger: stdout always, and optional file when log_file is set.
     Call from worker and API on startup so both write to the same file when LOG_FILE is set.
+    By default the file is a WatchedFileHandler, which reopens it after an external logrotate and is
+    safe for the shared file. max_bytes > 0 rotates in-process at that size, keeping backup_count old
+    files; RotatingFileHandler cannot coordinate across processes, so use it only with a per-process file.
+    Logging calls only enqueue the record; a listener thread does the formatting and I/O,
+    so worker threads never block on stdout or the log file.
     """
+    global _listener
     root = logging.getLogger()
     root.setLevel(level)
     formatter = logging.Formatter(LOG_FORMAT, datefmt=DATE_FORMAT)
@@ -24,17 +50,31 @@ def setup_logging(log_file: str = "", level: int = logging.INFO) -> None:
     # Remove existing handlers so we don't duplicate when called multiple times
     for h in root.handlers[:]:
         root.removeHandler(h)
+    _stop_listener()
 
     # Stdout
     out = logging.StreamHandler(sys.stdout)
     out.setLevel(level)
     out.setFormatter(formatter)
-    root.addHandler(out)
+    targets: list[logging.Handler] = [out]
 
     if log_file and log_file.strip():
         path = Path(log_file.strip())
         path.parent.mkdir(parents=True, exist_ok=True)
-        fh = logging.FileHandler(path, encoding="utf-8")
+        if max_bytes > 0:
+            fh: logging.Handler = RotatingFileHandler(
+                path, maxBytes=max_bytes, backupCount=max(0, backup_count), encoding="utf-8"
+            )
+        else:
+            fh = WatchedFileHandler(path, encoding="utf-8")
         fh.setLevel(level)
         fh.setFormatter(formatter)
-        root.addHandler(fh)
+        targets.append(fh)
+
+    q: queue.SimpleQueue[logging.LogRecord] = queue.SimpleQueue()
+    root.addHandler(QueueHandler(q))
+    _listener = QueueListener(q, *targets, respect_handler_level=True)
+    _listener.start()
+
+
+atexit.register(_stop_listener)
@@ -150,14 +150,14 @@ from app.insights import get_theme_insights
 from app.llm.api_extract import (
     get_extraction_prompt_template,
     set_extraction_prompt_template,
-    extract_themes_and_narratives as extract_themes_api,
+    extract_themes_and_narratives_batch as extract_themes_batch_api,
 )
 from app.settings import settings
 from app.theme_merge import MergeOptions, compute_merge_candidates, execute_theme_merge
 from app.theme_clusters import compute_megathemes
 from app.worker import canonicalize_label, ensure_alias
 from app.storage import GcsStorage, existing_local_file, file_uri, get_storage, resolve_raw_uri
-from app.followed_themes import get_followed_theme_ids, follow_theme, unfollow_theme, is_followed
+from app.followed_themes import get_followed_set, get_followed_theme_ids, follow_theme, unfollow_theme
 from app.theme_cleanup import delete_theme_cascade, remove_empty_unfollowed_themes
 
 
@@ -471,7 +471,11 @@ def _market_refresh_after_close_loop() -> None:
 @app.on_event("startup")
 def _startup():
     from app.logging_config import setup_logging
-    setup_logging(settings.log_file)
+    setup_logging(
+        settings.log_file,
+        max_bytes=settings.log_file_max_mb * 1024 * 1024,
+        backup_count=settings.log_file_backup_count,
+    )
     init_db()
     Base.metadata.create_all(bind=engine)  # MVP: simple create_all
     enable_sync = getattr(settings, "enable_gmail_daily_sync", False)
@@ -750,7 +754,7 @@ def list_themes(
         q = q.filter(Theme.id.in_(ids))
     if active_only:
         since_date = (now - dt.timedelta(days=active_days)).date()
-        doc_date = func.date(_doc_timestamp())
+        doc_date = Document.doc_date
         active_ids = set(
             r.theme_id
             for r in db.query(Narrative.theme_id)
@@ -2085,8 +2089,9 @@ def delete_document(document_id: int, db: Session = Depends(get_db)):
         .all()
     )
     pruned_themes = 0
+    followed_ids = get_followed_set()
     for t in orphan_themes:
-        if is_followed(t.id):
+        if t.id in followed_ids:
             continue
         delete_theme_cascade(db, t)
         pruned_themes += 1
@@ -2279,7 +2284,7 @@ def get_theme_insights_endpoint(
     theme = db.query(Theme).filter(Theme.id == theme_id).one_or_none()
     if theme is None:
         raise HTTPException(status_code=404, detail="Theme not found")
-    return get_theme_insights(db, theme_id, months=months)
+    return get_theme_insights(db, theme_id, months=months, session_factory=SessionLocal)
 
 
 @app.get("/themes/{theme_id}/narrative-shifts", response_model=list[NarrativeShiftOut])
@@ -2336,7 +2341,8 @@ def _parse_date(value) -> dt.date:
         return value
     s = str(value).strip()
     if len(s) >= 10:
-        return dt.datetime.strptime(s[:10], "%Y-%m-%d").date()
+        # date.fromisoformat is a C fast path; strptime goes through the regex-based _strptime module.
+        return dt.date.fromisoformat(s[:10])
     raise ValueError(f"cannot parse date: {value!r}")
 
 
@@ -2345,7 +2351,7 @@ def _theme_metrics_from_evidence(
 ) -> list[ThemeDailyMetricOut]:
     """Compute theme daily metrics from Evidence when ThemeMentionsDaily has no rows."""
     # Daily totals for THIS theme: date -> (doc_count, mention_count)
-    doc_date = func.date(_doc_timestamp())
+    doc_date = Document.doc_date
     daily_totals = (
         db.query(
             doc_date.label("date"),
@@ -2462,7 +2468,7 @@ def get_theme_metrics(
         rel_by_date = {r.date: r for r in relation_rows}
         # Recompute share_of_voice as doc_count / total_docs (all docs that day, by document timestamp).
         dates = [r.date for r in rows]
-        doc_date = func.date(_doc_timestamp())
+        doc_date = Document.doc_date
         total_docs_rows = (
             db.query(
                 doc_date.label("date"),
@@ -2740,7 +2746,7 @@ def get_theme_metrics_by_stance(
     if theme is None:
         raise HTTPException(status_code=404, detail="Theme not found")
     since = _theme_metrics_since(months, start)
-    doc_date = func.date(_doc_timestamp())
+    doc_date = Document.doc_date
     q = (
         db.query(
             doc_date.label("date"),
@@ -2791,7 +2797,7 @@ def get_theme_metrics_by_confidence(
     if theme is None:
         raise HTTPException(status_code=404, detail="Theme not found")
     since = _theme_metrics_since(months, start)
-    doc_date = func.date(_doc_timestamp())
+    doc_date = Document.doc_date
     rows = (
         db.query(
             doc_date.label("date"),
@@ -2842,7 +2848,7 @@ def get_theme_stance_by_confidence(
     if theme is None:
         raise HTTPException(status_code=404, detail="Theme not found")
     since = dt.date.today() - dt.timedelta(days=days)
-    doc_date = func.date(_doc_timestamp())
+    doc_date = Document.doc_date
     rows = (
         db.query(
             Narrative.confidence_level,
@@ -2895,7 +2901,7 @@ def get_theme_metrics_by_sub_theme(
         raise HTTPException(status_code=404, detail="Theme not found")
     since = _theme_metrics_since(months, start)
 
-    doc_date = func.date(_doc_timestamp())
+    doc_date = Document.doc_date
     from_ev = (
         db.query(
             doc_date.label("date"),
@@ -2947,7 +2953,7 @@ def get_theme_narratives(
     theme = db.query(Theme).filter(Theme.id == theme_id).one_or_none()
     if theme is None:
         raise HTTPException(status_code=404, detail="Theme not found")
-    doc_date = func.date(_doc_timestamp())
+    doc_date = Document.doc_date
     theme_ids = _theme_and_descendant_ids(db, theme_id) if include_children else [theme_id]
     theme_narrative_ids = [r[0] for r in db.query(Narrative.id).filter(Narrative.theme_id.in_(theme_ids)).all()]
     if on_latest_date:
@@ -3037,7 +3043,7 @@ def get_theme_narratives(
         if isinstance(v, dt.date):
             return v
         try:
-            return dt.datetime.strptime(str(v)[:10], "%Y-%m-%d").date()
+            return dt.date.fromisoformat(str(v)[:10])
         except ValueError:
             return dt.date.min
 
@@ -3313,16 +3319,15 @@ def extraction_dry_run(
         )
 
     models_to_run = body.models if body.models else [settings.llm_model or "gpt-4o-mini"]
+    models_to_run = list(dict.fromkeys(m for m in ((m or "").strip() for m in models_to_run) if m))
+    # One extraction per model, run concurrently
+    extractions = extract_themes_batch_api([text] * len(models_to_run), model_overrides=models_to_run)
     results: dict[str, dict] = {}
-    for model in models_to_run:
-        model = (model or "").strip()
-        if not model:
-            continue
-        try:
-            extracted = extract_themes_api(text=text, model_override=model)
+    for model, extracted in zip(models_to_run, extractions):
+        if isinstance(extracted, Exception):
+            results[model] = {"error": str(extracted)}
+        else:
             results[model] = asdict(extracted)
-        except Exception as e:
-            results[model] = {"error": str(e)}
 
     return {
         "results": results,
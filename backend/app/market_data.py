@@ -62,29 +62,44 @@ MACD_SIGNAL = 9
 
 
 def _sma(closes: list[float], period: int) -> list[float | None]:
-    """SMA for each index; None for first (period-1) bars."""
+    """SMA for each index; None for first (period-1) bars. Rolling sum: one add/subtract per bar."""
     out: list[float | None] = [None] * len(closes)
-    for i in range(period - 1, len(closes)):
-        s = sum(closes[i - period + 1 : i + 1])
-        out[i] = round(s / period, 4)
+    s = 0.0
+    for i, c in enumerate(closes):
+        s += c
+        if i >= period:
+            s -= closes[i - period]
+        if i >= period - 1:
+            out[i] = round(s / period, 4)
     return out
 
 
 def _rsi(closes: list[float], period: int = 14) -> list[float | None]:
-    """RSI for each index; None until enough data."""
+    """RSI for each index; None until enough data. Gains/losses are rolled over the window, not re-summed."""
     out: list[float | None] = [None] * len(closes)
+    gains, losses = 0.0, 0.0
+    # Counts of nonzero gains/losses in the window: an empty side is exactly 0.0 (no float residue)
+    n_gains, n_losses = 0, 0
     for i in range(1, len(closes)):
+        ch = closes[i] - closes[i - 1]
+        if ch > 0:
+            gains += ch
+            n_gains += 1
+        elif ch < 0:
+            losses -= ch
+            n_losses += 1
+        if i > period:
+            old = closes[i - period] - closes[i - period - 1]
+            if old > 0:
+                gains -= old
+                n_gains -= 1
+            elif old < 0:
+                losses += old
+                n_losses -= 1
         if i < period:
             continue
-        gains, losses = 0.0, 0.0
-        for j in range(i - period + 1, i + 1):
-            ch = closes[j] - closes[j - 1]
-            if ch > 0:
-                gains += ch
-            else:
-                losses -= ch
-        avg_gain = gains / period
-        avg_loss = losses / period
+        avg_gain = (gains if n_gains else 0.0) / period
+        avg_loss = (losses if n_losses else 0.0) / period
         if avg_loss == 0:
             out[i] = 100.0
         else:
@@ -5,6 +5,7 @@ from typing import List, Optional
 
 from sqlalchemy import (
     JSON,
+    Computed,
     Date,
     DateTime,
     ForeignKey,
@@ -15,7 +16,27 @@ from sqlalchemy import (
     Text,
     UniqueConstraint,
 )
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
+from sqlalchemy.sql.expression import FunctionElement, literal_column
+
+
+class _utc_date(FunctionElement):
+    """Calendar date of a timestamp, in a form each backend accepts for a generated column."""
+
+    type = Date()
+    inherit_cache = True
+
+
+@compiles(_utc_date)
+def _utc_date_default(element, compiler, **kw):
+    return "date(%s)" % compiler.process(element.clauses, **kw)
+
+
+@compiles(_utc_date, "postgresql")
+def _utc_date_pg(element, compiler, **kw):
+    # timestamptz::date depends on the session TimeZone and is not IMMUTABLE; pin it to UTC.
+    return "((%s AT TIME ZONE 'UTC')::date)" % compiler.process(element.clauses, **kw)
 
 
 class Base(DeclarativeBase):
@@ -35,6 +56,12 @@ class Document(Base):
     filename: Mapped[str] = mapped_column(Text)
     received_at: Mapped[dt.datetime] = mapped_column(DateTime(timezone=True), default=lambda: dt.datetime.now(dt.timezone.utc), index=True)
     modified_at: Mapped[Optional[dt.datetime]] = mapped_column(DateTime(timezone=True), nullable=True, index=True)  # document date (e.g. file mtime); used as timestamp for grouping
+    # Grouping date derived from the above; indexed so date filters become range scans
+    doc_date: Mapped[Optional[dt.date]] = mapped_column(
+        Date,
+        Computed(_utc_date(literal_column("coalesce(modified_at, received_at)")), persisted=True),
+        index=True,
+    )
 
     gcs_raw_uri: Mapped[str] = mapped_column(Text)
     gcs_text_uri: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
@@ -176,6 +203,8 @@ class Evidence(Base):
     narrative: Mapped["Narrative"] = relationship(back_populates="evidence")
     document: Mapped["Document"] = relationship(foreign_keys=[document_id])
 
+    __table_args__ = (Index("ix_evidence_doc_narrative", "document_id", "narrative_id"),)
+
 
 class ThemeMentionsDaily(Base):
     __tablename__ = "theme_mentions_daily"
@@ -186,6 +215,10 @@ class ThemeMentionsDaily(Base):
     mention_count: Mapped[int] = mapped_column(Integer, default=0)
     share_of_voice: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
 
+    __table_args__ = (
+        Index("ix_tmd_date_theme_sov", "date", "theme_id", postgresql_include=["share_of_voice"]),
+    )
+
 
 class ThemeRelationDaily(Base):
     __tablename__ = "theme_relation_daily"
@@ -260,6 +293,7 @@ class ThemeNarrativeSummaryCache(Base):
     trending_sub_themes: Mapped[Optional[str]] = mapped_column(Text, nullable=True)  # JSON list
     inflection_alert: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
     generated_at: Mapped[dt.datetime] = mapped_column(DateTime(timezone=True), default=lambda: dt.datetime.now(dt.timezone.utc))
+    input_hash: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)  # sha256 of the prompt inputs; unchanged -> skip regeneration
 
     __table_args__ = (UniqueConstraint("theme_id", "period", name="uq_theme_summary_cache_theme_period"),)
 
@@ -72,6 +72,13 @@ class Settings(BaseSettings):
     # Max document characters sent to the LLM for theme extraction. Long reports (e.g. "Big Debates" with 24 sections)
     # need a higher limit so all sections are seen; default 300000 allows ~100+ page PDFs. Lower to save tokens/cost.
     llm_extraction_max_chars: int = 300000
+    # Optional token cap on that document text (needs tiktoken installed; 0 = characters only).
+    llm_extraction_max_input_tokens: int = 0
+    # On-disk cache of raw extraction responses (LLM API and Vertex) keyed by SHA-256 of provider, model, prompt and text,
+    # so re-processing an unchanged document skips the LLM call. A relative dir is under backend/; expired entries
+    # are deleted hourly. Empty dir or TTL 0 disables.
+    llm_extract_cache_dir: str = ".llm_cache"
+    llm_extract_cache_ttl_days: int = 7
     # Force heuristic extraction (no LLM/Vertex). When true, ignores LLM_API_KEY and Vertex.
     use_heuristic_extraction: bool = False
     # Auto-skip non-investment documents before theme extraction.
@@ -109,8 +116,17 @@ class Settings(BaseSettings):
     # Min seconds between EODHD API requests (throttle).
     eodhd_min_seconds_between_requests: float = 0.1
 
+    # In-process TTL cache for analytics window aggregates (share-of-voice sums over ThemeMentionsDaily)
+    # and per-theme insights payloads. 0 disables caching (e.g. in tests).
+    analytics_cache_ttl_seconds: int = 300
+
     # Optional: write backend logs to this file (worker + API). Leave empty for stdout only.
     log_file: str = ""
+    # Rotate the log file at this size (MB), keeping LOG_FILE_BACKUP_COUNT old files. 0 = no in-process rotation:
+    # the file is reopened if an external logrotate moves it. Only set > 0 when this process has its own LOG_FILE
+    # (the API and worker must not rotate one shared file independently).
+    log_file_max_mb: int = 0
+    log_file_backup_count: int = 5
 
     # Ingest queue cap: reject new /ingest and /ingest-file when queued+processing jobs >= this (0 = no cap).
     max_queued_ingest_jobs: int = 0
@@ -10,7 +10,7 @@ from sqlalchemy import func
 from sqlalchemy.orm import Session
 
 from app.analytics import get_active_theme_ids
-from app.followed_themes import get_followed_theme_ids, unfollow_theme
+from app.followed_themes import get_followed_set, unfollow_theme
 from app.models import (
     Narrative,
     Theme,
@@ -74,7 +74,7 @@ def remove_empty_unfollowed_themes(
         .group_by(Narrative.theme_id)
         .all()
     )
-    followed_ids = set(get_followed_theme_ids())
+    followed_ids = get_followed_set()
 
     to_remove = [
         t
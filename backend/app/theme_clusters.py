@@ -26,10 +26,6 @@ SHORT_LIVED_MAX_DAYS = 2
 SHORT_LIVED_MIN_DOCS = 3
 
 
-def _doc_timestamp():
-    return func.coalesce(Document.modified_at, Document.received_at)
-
-
 def _get_theme_daily_counts_from_evidence(
     db: Session,
     start: dt.date,
@@ -42,7 +38,7 @@ def _get_theme_daily_counts_from_evidence(
     theme_doc_count: theme_id -> total distinct docs in range
     theme_distinct_days: theme_id -> distinct days with evidence
     """
-    doc_date = func.date(_doc_timestamp())
+    doc_date = Document.doc_date
     q = (
         db.query(
             Narrative.theme_id,
@@ -66,7 +62,7 @@ def _get_theme_daily_counts_from_evidence(
     for r in rows:
         tid = r.theme_id
         try:
-            d = r.date if isinstance(r.date, dt.date) else dt.datetime.strptime(str(r.date)[:10], "%Y-%m-%d").date()
+            d = r.date if isinstance(r.date, dt.date) else dt.date.fromisoformat(str(r.date)[:10])
         except (TypeError, ValueError):
             continue
         mention_count = int(r.mention_count or 0)
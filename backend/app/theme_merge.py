@@ -5,6 +5,8 @@ and execute merge (move narratives, aliases, daily tables; delete source theme).
 from __future__ import annotations
 
 import logging
+import math
+import operator
 from dataclasses import dataclass, field
 from typing import Optional
 
@@ -24,7 +26,6 @@ from app.models import (
 from app.settings import settings
 from app.worker import (
     canonicalize_label,
-    _cosine_similarity,
     _token_set,
 )
 
@@ -170,15 +171,57 @@ def _candidates_embedding(
 ) -> list[tuple[int, int]]:
     """Pairs with embedding cosine similarity >= threshold (only themes that have embedding)."""
     with_emb = [t for t in themes if t.embedding]
+    return _similar_pairs([t.id for t in with_emb], [t.embedding for t in with_emb], threshold)
+
+
+def _unit_vector(vec: list[float] | None) -> tuple[float, ...] | None:
+    norm = math.sqrt(sum(x * x for x in vec)) if vec else 0.0
+    return tuple(x / norm for x in vec) if norm else None
+
+
+def _similar_pairs(
+    ids: list[int],
+    vectors: list[list[float] | None],
+    threshold: float,
+) -> list[tuple[int, int]]:
+    """
+    (ids[i], ids[j]) pairs whose vectors have cosine similarity >= threshold. Vectors are normalized
+    once up front, so each of the O(n^2) comparisons is a single dot product instead of a dot product
+    plus two norms. Empty, zero and mismatched-length vectors never match.
+    """
+    units = [_unit_vector(v) for v in vectors]
     pairs: list[tuple[int, int]] = []
-    for i in range(len(with_emb)):
-        for j in range(i + 1, len(with_emb)):
-            sim = _cosine_similarity(with_emb[i].embedding or [], with_emb[j].embedding or [])
-            if sim >= threshold:
-                pairs.append((with_emb[i].id, with_emb[j].id))
+    for i, ui in enumerate(units):
+        if ui is None:
+            continue
+        for j in range(i + 1, len(units)):
+            uj = units[j]
+            if uj is not None and len(uj) == len(ui) and sum(map(operator.mul, ui, uj)) >= threshold:
+                pairs.append((ids[i], ids[j]))
     return pairs
 
 
+# Loose label-embedding similarity that makes two themes worth showing to the LLM together
+_LLM_PREFILTER_SIMILARITY = 0.75
+
+
+def _llm_candidate_labels(db: Session, themes: list[Theme]) -> list[str]:
+    """
+    Labels to send to suggest_theme_merge_groups. When every theme has a saved label embedding,
+    only themes in a cluster of >= 2 at _LLM_PREFILTER_SIMILARITY are sent (cluster by cluster, so
+    related labels stay adjacent across LLM shards); isolated labels cannot be merged by the LLM
+    anyway. Without full embeddings all labels are sent.
+    """
+    if not themes or not all(t.embedding for t in themes):
+        return [t.canonical_label for t in themes]
+    by_id = {t.id: t for t in themes}
+    clusters = _union_find_merge(_candidates_embedding(db, themes, _LLM_PREFILTER_SIMILARITY))
+    clusters.sort(key=min)
+    labels = [by_id[tid].canonical_label for cluster in clusters for tid in sorted(cluster)]
+    logger.info("LLM suggest-merges: %d of %d label(s) in embedding clusters", len(labels), len(themes))
+    return labels
+
+
 def _theme_content_signature(
     db: Session,
     theme: Theme,
@@ -261,17 +304,7 @@ def _candidates_content_embedding(
             all_embeddings.extend([[]] * len(batch))
     if len(all_embeddings) != len(themes):
         return []
-    pairs: list[tuple[int, int]] = []
-    for i in range(len(themes)):
-        if not all_embeddings[i]:
-            continue
-        for j in range(i + 1, len(themes)):
-            if not all_embeddings[j]:
-                continue
-            sim = _cosine_similarity(all_embeddings[i], all_embeddings[j])
-            if sim >= threshold:
-                pairs.append((themes[i].id, themes[j].id))
-    return pairs
+    return _similar_pairs([t.id for t in themes], all_embeddings, threshold)
 
 
 def compute_merge_candidates(
@@ -348,8 +381,8 @@ def compute_merge_candidates(
     # C) Optional LLM (suggest_theme_merge_groups) — adds more pairs to the pool
     if opts.use_llm and settings.theme_merge_use_llm_suggest and settings.llm_api_key:
         try:
-            labels = [t.canonical_label for t in themes[: opts.max_themes_for_llm]]
-            groups = suggest_theme_merge_groups(labels)
+            labels = _llm_candidate_labels(db, themes[: opts.max_themes_for_llm])
+            groups = suggest_theme_merge_groups(labels) if labels else []
             label_to_theme = {canonicalize_label(t.canonical_label): t for t in themes}
             for group in groups:
                 if len(group) < 2:
@@ -10,7 +10,6 @@ import logging
 import time
 from typing import Any, Callable, Optional
 
-from sqlalchemy import func
 from sqlalchemy.orm import Session
 
 from app.models import (
@@ -28,10 +27,6 @@ from app.settings import settings
 logger = logging.getLogger("investing_agent.trading_digest")
 
 
-def _doc_date():
-    return func.date(func.coalesce(Document.modified_at, Document.received_at))
-
-
 def _theme_primary_symbol(db: Session, theme_id: int) -> str | None:
     row = (
         db.query(ThemeInstrument.symbol)
@@ -49,7 +44,7 @@ def _other_themes_narratives(
     other_ids = [t.id for t in all_themes if t.id != current_theme_id]
     if not other_ids:
         return ""
-    doc_date = _doc_date()
+    doc_date = Document.doc_date
     rows = (
         db.query(Narrative.statement, Theme.canonical_label)
         .join(Theme, Theme.id == Narrative.theme_id)
@@ -343,7 +338,7 @@ def generate_theme_trading_digests(
     themes = q.all()
 
     since = dt.date.today() - dt.timedelta(days=30)
-    doc_date = _doc_date()
+    doc_date = Document.doc_date
     count = 0
     total = len(themes)
     processed = 0
@@ -435,15 +430,11 @@ def generate_theme_trading_digests(
         )
 
         try:
-            from app.llm.provider import chat_completion
+            from app.llm.provider import chat_completion, strip_code_fence
 
             model = getattr(settings, "llm_trading_digest_model", None) or settings.llm_model
             raw = chat_completion(system=system, user=user_prompt, max_tokens=2048, model=model)
-            if raw.startswith("```"):
-                raw = raw.split("\n", 1)[-1] if "\n" in raw else raw[3:]
-            if raw.endswith("```"):
-                raw = raw.rsplit("```", 1)[0].rstrip()
-            data = json.loads(raw.strip())
+            data = json.loads(strip_code_fence(raw))
 
             prevailing = (data.get("prevailing") or "").strip() or None
             what_changed = (data.get("what_changed") or "").strip() or None
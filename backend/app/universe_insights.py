@@ -29,10 +29,6 @@ logger = logging.getLogger("investing_agent.universe_insights")
 PERIOD = "14d"
 
 
-def _doc_date():
-    return func.date(func.coalesce(Document.modified_at, Document.received_at))
-
-
 def _lookback_days() -> int:
     return max(7, getattr(settings, "universe_insights_lookback_days", 14) or 14)
 
@@ -43,12 +39,9 @@ def _is_weekday(d: dt.date | None = None) -> bool:
 
 
 def _parse_llm_json(raw: str) -> dict[str, Any]:
-    text = raw.strip()
-    if text.startswith("```"):
-        text = text.split("\n", 1)[-1] if "\n" in text else text[3:]
-    if text.endswith("```"):
-        text = text.rsplit("```", 1)[0].rstrip()
-    return json.loads(text.strip())
+    from app.llm.provider import strip_code_fence
+
+    return json.loads(strip_code_fence(raw))
 
 
 def _gather_valuations(db: Session, themes: list[Any], limit: int = 12) -> list[dict[str, Any]]:
@@ -105,7 +98,7 @@ def _gather_valuations(db: Session, themes: list[Any], limit: int = 12) -> list[
 
 def _gather_context(db: Session, since: dt.date) -> dict[str, Any]:
     """Build structured context from the full recent universe (not basket-only)."""
-    doc_date = _doc_date()
+    doc_date = Document.doc_date
 
     doc_rows = (
         db.query(
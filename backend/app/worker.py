@@ -12,6 +12,7 @@ from sqlalchemy.orm import Session
 
 from prometheus_client import Counter, Histogram
 
+from app.analytics import bump_analytics_epoch
 from app.db import SessionLocal, engine, init_db
 from app.extract.chunking import chunk_pages
 from app.extract.disclosure_trim import trim_disclosure_sections
@@ -591,6 +592,9 @@ def _process_job_inner(db: Session, job: IngestJob, doc: Document, storage) -> N
                     )
                 )
     db.commit()
+    # New evidence: drop this process's cached analytics/insights (other processes see the new
+    # max(evidence.id) on their next insights lookup).
+    bump_analytics_epoch()
 
     job.status = "done"
     job.finished_at = dt.datetime.now(dt.timezone.utc)
@@ -647,7 +651,11 @@ def _process_job_standalone(job_id: int) -> None:
 
 
 def run_loop(poll_seconds: int = 2) -> None:
-    setup_logging(settings.log_file)
+    setup_logging(
+        settings.log_file,
+        max_bytes=settings.log_file_max_mb * 1024 * 1024,
+        backup_count=settings.log_file_backup_count,
+    )
     # Retry init/create_all when SQLite is locked (e.g. API holding the DB at startup)
     for attempt in range(5):
         try:
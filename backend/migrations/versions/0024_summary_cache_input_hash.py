@@ -0,0 +1,30 @@
+"""Add theme_narrative_summary_cache.input_hash so unchanged themes skip LLM regeneration.
+
+Revision ID: 0024_summary_cache_input_hash
+Revises: 0023_universe_insights
+Create Date: 2026-10-16
+
+"""
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0024_summary_cache_input_hash"
+down_revision = "0023_universe_insights"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    insp = sa.inspect(bind)
+    cols = [c["name"] for c in insp.get_columns("theme_narrative_summary_cache")]
+    if "input_hash" in cols:
+        return
+    op.add_column("theme_narrative_summary_cache", sa.Column("input_hash", sa.String(length=64), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("theme_narrative_summary_cache", "input_hash")
@@ -0,0 +1,62 @@
+"""Add (date, theme_id) index on theme_mentions_daily and (document_id, narrative_id) on evidence.
+
+Revision ID: 0025_window_sum_indexes
+Revises: 0024_summary_cache_input_hash
+Create Date: 2026-10-16
+
+"""
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0025_window_sum_indexes"
+down_revision = "0024_summary_cache_input_hash"
+branch_labels = None
+depends_on = None
+
+
+def _index_names(insp, table: str) -> set[str]:
+    return {ix["name"] for ix in insp.get_indexes(table)}
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    insp = sa.inspect(bind)
+    is_pg = bind.dialect.name == "postgresql"
+    tmd_exists = "ix_tmd_date_theme_sov" in _index_names(insp, "theme_mentions_daily")
+    ev_exists = "ix_evidence_doc_narrative" in _index_names(insp, "evidence")
+
+    # SoV window sums filter on date and group by theme_id; leading with date and
+    # carrying share_of_voice lets PostgreSQL answer them with an index-only scan.
+    if is_pg:
+        with op.get_context().autocommit_block():
+            if not tmd_exists:
+                op.create_index(
+                    "ix_tmd_date_theme_sov",
+                    "theme_mentions_daily",
+                    ["date", "theme_id"],
+                    unique=False,
+                    postgresql_include=["share_of_voice"],
+                    postgresql_concurrently=True,
+                )
+            if not ev_exists:
+                op.create_index(
+                    "ix_evidence_doc_narrative",
+                    "evidence",
+                    ["document_id", "narrative_id"],
+                    unique=False,
+                    postgresql_concurrently=True,
+                )
+        return
+
+    if not tmd_exists:
+        op.create_index("ix_tmd_date_theme_sov", "theme_mentions_daily", ["date", "theme_id"], unique=False)
+    if not ev_exists:
+        op.create_index("ix_evidence_doc_narrative", "evidence", ["document_id", "narrative_id"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_evidence_doc_narrative", table_name="evidence")
+    op.drop_index("ix_tmd_date_theme_sov", table_name="theme_mentions_daily")
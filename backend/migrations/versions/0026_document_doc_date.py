@@ -0,0 +1,43 @@
+"""Add generated doc_date column (date of coalesce(modified_at, received_at)) on documents, indexed.
+
+Revision ID: 0026_document_doc_date
+Revises: 0025_window_sum_indexes
+Create Date: 2026-10-16
+
+"""
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0026_document_doc_date"
+down_revision = "0025_window_sum_indexes"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    insp = sa.inspect(bind)
+    columns = {c["name"] for c in insp.get_columns("documents")}
+    if "doc_date" not in columns:
+        if bind.dialect.name == "postgresql":
+            # AT TIME ZONE 'UTC' makes the expression IMMUTABLE, which STORED columns require.
+            op.execute(
+                "ALTER TABLE documents ADD COLUMN doc_date DATE GENERATED ALWAYS AS "
+                "(((coalesce(modified_at, received_at) AT TIME ZONE 'UTC')::date)) STORED"
+            )
+        else:
+            # SQLite cannot ADD a STORED generated column; a VIRTUAL one can still be indexed.
+            op.execute(
+                "ALTER TABLE documents ADD COLUMN doc_date DATE GENERATED ALWAYS AS "
+                "(date(coalesce(modified_at, received_at))) VIRTUAL"
+            )
+    if "ix_documents_doc_date" not in {ix["name"] for ix in insp.get_indexes("documents")}:
+        op.create_index("ix_documents_doc_date", "documents", ["doc_date"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_documents_doc_date", table_name="documents")
+    op.drop_column("documents", "doc_date")
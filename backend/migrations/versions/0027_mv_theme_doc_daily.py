@@ -0,0 +1,64 @@
+"""Add mv_theme_doc_daily materialized view (PostgreSQL) for the analytics share-of-voice fallback.
+
+Revision ID: 0027_mv_theme_doc_daily
+Revises: 0026_document_doc_date
+Create Date: 2026-10-16
+
+"""
+from __future__ import annotations
+
+from alembic import op
+
+
+revision = "0027_mv_theme_doc_daily"
+down_revision = "0026_document_doc_date"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name != "postgresql":
+        # SQLite dev databases compute share of voice from Evidence directly.
+        return
+    # Days are documents.doc_date (UTC), the same buckets the live analytics queries use.
+    op.execute(
+        """
+        CREATE MATERIALIZED VIEW IF NOT EXISTS mv_theme_doc_daily AS
+        WITH theme_docs AS (
+            SELECT n.theme_id AS theme_id,
+                   d.doc_date AS date,
+                   count(DISTINCT d.id) AS doc_count
+            FROM evidence e
+            JOIN narratives n ON n.id = e.narrative_id
+            JOIN documents d ON d.id = e.document_id
+            GROUP BY n.theme_id, d.doc_date
+        ),
+        totals AS (
+            SELECT doc_date AS date,
+                   count(*) AS total_docs
+            FROM documents
+            GROUP BY doc_date
+        )
+        SELECT td.theme_id,
+               td.date,
+               td.doc_count,
+               t.total_docs,
+               td.doc_count::double precision / t.total_docs AS share_of_voice
+        FROM theme_docs td
+        JOIN totals t ON t.date = td.date
+        """
+    )
+    # Unique index is required for REFRESH MATERIALIZED VIEW CONCURRENTLY.
+    op.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS ux_mv_theme_doc_daily_theme_date "
+        "ON mv_theme_doc_daily (theme_id, date)"
+    )
+    op.execute("CREATE INDEX IF NOT EXISTS ix_mv_theme_doc_daily_date ON mv_theme_doc_daily (date)")
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name != "postgresql":
+        return
+    op.execute("DROP MATERIALIZED VIEW IF EXISTS mv_theme_doc_daily")
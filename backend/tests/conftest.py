@@ -0,0 +1,75 @@
+"""
+Shared fixtures: every test runs against a fresh SQLite database in a temp dir.
+
+Settings are read when app.settings is imported, so the environment is set here before any app import.
+"""
+
+from __future__ import annotations
+
+import os
+import tempfile
+
+_TMP_DIR = tempfile.mkdtemp(prefix="investing_agent_tests_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_TMP_DIR, 'test.db')}"
+os.environ["STATE_DIR"] = _TMP_DIR
+os.environ["LLM_API_KEY"] = ""
+os.environ["ANALYTICS_CACHE_TTL_SECONDS"] = "0"
+os.environ["LLM_EXTRACT_CACHE_DIR"] = ""
+
+import datetime as dt  # noqa: E402
+
+import pytest  # noqa: E402
+
+from app.db import SessionLocal, engine  # noqa: E402
+from app.models import Base, Document, Evidence, Narrative, Theme  # noqa: E402
+
+
+@pytest.fixture()
+def db():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture()
+def make():
+    """Row builders that fill the required columns; timestamps are naive UTC at noon on the given day."""
+
+    class _Make:
+        _docs = 0
+
+        @staticmethod
+        def theme(db, label: str, **kw) -> Theme:
+            t = Theme(canonical_label=label, **kw)
+            db.add(t)
+            db.flush()
+            return t
+
+        @staticmethod
+        def narrative(db, theme: Theme, statement: str = "n", **kw) -> Narrative:
+            n = Narrative(theme_id=theme.id, statement=statement, **kw)
+            db.add(n)
+            db.flush()
+            return n
+
+        @classmethod
+        def document(cls, db, day: dt.date, **kw) -> Document:
+            cls._docs += 1
+            kw.setdefault("received_at", dt.datetime.combine(day, dt.time(12)))
+            d = Document(sha256=f"doc-{cls._docs}", filename="doc.pdf", gcs_raw_uri="local://doc.pdf", **kw)
+            db.add(d)
+            db.flush()
+            return d
+
+        @staticmethod
+        def evidence(db, narrative: Narrative, document: Document, quote: str = "q") -> Evidence:
+            e = Evidence(narrative_id=narrative.id, document_id=document.id, quote=quote)
+            db.add(e)
+            db.flush()
+            return e
+
+    return _Make
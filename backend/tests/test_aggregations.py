@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import datetime as dt
+
+from app.aggregations import compute_theme_sub_theme_metrics, run_daily_aggregations
+from app.models import (
+    Evidence,
+    NarrativeMentionsDaily,
+    ThemeMentionsDaily,
+    ThemeRelationDaily,
+    ThemeSubThemeMentionsDaily,
+    ThemeSubThemeMetrics,
+)
+
+DAY = dt.date.today() - dt.timedelta(days=1)
+
+
+def _seed_day(db, make):
+    """Two themes on DAY: 4 documents, theme A in 3 of them, theme B in 1."""
+    a = make.theme(db, "A")
+    b = make.theme(db, "B")
+    a1 = make.narrative(db, a, "a1", relation_to_prevailing="contrarian", sub_theme="chips")
+    a2 = make.narrative(db, a, "a2", relation_to_prevailing="weird", sub_theme=" chips ")
+    b1 = make.narrative(db, b, "b1", relation_to_prevailing="new_angle")
+    docs = [make.document(db, DAY) for _ in range(4)]
+    make.evidence(db, a1, docs[0])
+    make.evidence(db, a1, docs[0], "second quote")
+    make.evidence(db, a1, docs[1])
+    make.evidence(db, a2, docs[2])
+    make.evidence(db, b1, docs[3])
+    db.commit()
+    return a, b, a1, a2, b1
+
+
+def test_daily_counts_and_share_of_voice(db, make):
+    a, b, a1, a2, b1 = _seed_day(db, make)
+
+    run_daily_aggregations(DAY)
+
+    themes = {r.theme_id: r for r in db.query(ThemeMentionsDaily).filter_by(date=DAY)}
+    assert (themes[a.id].doc_count, themes[a.id].mention_count) == (3, 4)
+    assert themes[a.id].share_of_voice == 3 / 4
+    assert (themes[b.id].doc_count, themes[b.id].mention_count) == (1, 1)
+    assert themes[b.id].share_of_voice == 1 / 4
+
+    narratives = {r.narrative_id: (r.doc_count, r.mention_count) for r in db.query(NarrativeMentionsDaily)}
+    assert narratives == {a1.id: (2, 3), a2.id: (1, 1), b1.id: (1, 1)}
+
+    rel = db.query(ThemeRelationDaily).filter_by(theme_id=a.id, date=DAY).one()
+    # Unknown relation labels count as consensus.
+    assert (rel.consensus_count, rel.contrarian_count, rel.refinement_count, rel.new_angle_count) == (1, 3, 0, 0)
+
+    # " chips " and "chips" collapse to one sub-theme row after strip.
+    subs = db.query(ThemeSubThemeMentionsDaily).all()
+    assert [(s.theme_id, s.sub_theme, s.date) for s in subs] == [(a.id, "chips", DAY)]
+
+
+def test_novelty_by_first_seen(db, make):
+    _, _, a1, a2, b1 = _seed_day(db, make)
+    for n, days_before in ((a1, 0), (a2, 3), (b1, 30)):
+        n.first_seen = dt.datetime.combine(DAY - dt.timedelta(days=days_before), dt.time(9), tzinfo=dt.timezone.utc)
+    db.commit()
+
+    run_daily_aggregations(DAY)
+
+    novelty = {r.narrative_id: r.novelty_score for r in db.query(NarrativeMentionsDaily).filter_by(date=DAY)}
+    assert novelty == {a1.id: 1.0, a2.id: 0.5, b1.id: 0.0}
+
+
+def test_rerun_replaces_the_day(db, make):
+    a, b, a1, a2, b1 = _seed_day(db, make)
+    run_daily_aggregations(DAY)
+
+    # Drop theme B's only evidence and re-run: its rows for the day must go, A's must not double.
+    db.query(Evidence).filter_by(narrative_id=b1.id).delete()
+    db.commit()
+    run_daily_aggregations(DAY)
+
+    assert db.query(ThemeMentionsDaily).filter_by(theme_id=b.id).count() == 0
+    assert db.query(ThemeRelationDaily).filter_by(theme_id=b.id).count() == 0
+    assert db.query(NarrativeMentionsDaily).filter_by(narrative_id=b1.id).count() == 0
+    a_row = db.query(ThemeMentionsDaily).filter_by(theme_id=a.id, date=DAY).one()
+    assert (a_row.doc_count, a_row.mention_count) == (3, 4)
+
+
+def test_document_date_prefers_modified_at(db, make):
+    t = make.theme(db, "T")
+    n = make.narrative(db, t)
+    earlier = DAY - dt.timedelta(days=3)
+    make.evidence(db, n, make.document(db, DAY, modified_at=dt.datetime.combine(earlier, dt.time(12))))
+    db.commit()
+
+    run_daily_aggregations(DAY)
+    run_daily_aggregations(earlier)
+
+    assert [r.date for r in db.query(ThemeMentionsDaily)] == [earlier]
+
+
+def test_sub_theme_metrics_stages(db, make):
+    t = make.theme(db, "T")
+    make.narrative(db, t, "growing", sub_theme="growing")
+    make.narrative(db, t, "fading", sub_theme="fading")
+    make.narrative(db, t, "quiet", sub_theme="quiet")
+    today = dt.date.today()
+    for k in range(30):
+        day = today - dt.timedelta(days=k)
+        recent = k < 7
+        db.add(ThemeSubThemeMentionsDaily(
+            theme_id=t.id, sub_theme="growing", date=day, doc_count=1, mention_count=10 if recent else 1,
+        ))
+        db.add(ThemeSubThemeMentionsDaily(
+            theme_id=t.id, sub_theme="fading", date=day, doc_count=1, mention_count=1 if recent else 10,
+        ))
+    db.commit()
+
+    compute_theme_sub_theme_metrics(db)
+    compute_theme_sub_theme_metrics(db)  # re-run updates in place
+
+    metrics = {m.sub_theme: (m.narrative_stage, m.novelty_type) for m in db.query(ThemeSubThemeMetrics)}
+    assert metrics == {
+        "growing": ("early", "evolving"),
+        "fading": ("late", "evolving"),
+        "quiet": ("mainstream", "evolving"),
+    }
@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import datetime as dt
+
+from app import analytics
+from app.models import ThemeMentionsDaily
+
+TODAY = dt.date.today()
+RECENT = TODAY - dt.timedelta(days=2)  # inside the default 7d/14d recent windows
+PRIOR = TODAY - dt.timedelta(days=20)  # inside the default prior windows
+
+
+def _ids(themes) -> list[int]:
+    return [t.id for t in themes]
+
+
+def _mention(db, make, theme, day, stance=None, docs=1):
+    n = make.narrative(db, theme, f"{theme.canonical_label} {day} {stance}", narrative_stance=stance)
+    for _ in range(docs):
+        make.evidence(db, n, make.document(db, day))
+
+
+def test_trending_ranks_by_share_of_voice_change(db, make):
+    rising, flat, falling = (make.theme(db, label) for label in ("rising", "flat", "falling"))
+    for theme, recent_sov, prior_sov in ((rising, 0.6, 0.1), (flat, 0.2, 0.2), (falling, 0.1, 0.5)):
+        db.add(ThemeMentionsDaily(theme_id=theme.id, date=RECENT, doc_count=1, mention_count=1, share_of_voice=recent_sov))
+        db.add(ThemeMentionsDaily(theme_id=theme.id, date=PRIOR, doc_count=1, mention_count=1, share_of_voice=prior_sov))
+    db.commit()
+
+    assert _ids(analytics.get_trending_themes(db)) == [rising.id, flat.id, falling.id]
+    assert _ids(analytics.get_trending_themes(db, limit=1)) == [rising.id]
+
+
+def test_trending_falls_back_to_evidence_without_daily_rows(db, make):
+    new, old = make.theme(db, "new"), make.theme(db, "old")
+    _mention(db, make, new, RECENT)
+    _mention(db, make, old, PRIOR)
+    db.commit()
+
+    assert _ids(analytics.get_trending_themes(db)) == [new.id, old.id]
+
+
+def test_sentiment_rankings(db, make):
+    bull, mixed, bear = (make.theme(db, label) for label in ("bull", "mixed", "bear"))
+    _mention(db, make, bull, RECENT, "Bullish", docs=2)
+    _mention(db, make, mixed, RECENT, "bullish")
+    _mention(db, make, mixed, RECENT, "bearish")
+    _mention(db, make, bear, RECENT, "bearish")
+    # Outside the 30d window: must not affect the score.
+    _mention(db, make, bear, TODAY - dt.timedelta(days=60), "bullish", docs=5)
+    db.commit()
+
+    out = analytics.get_sentiment_rankings(db)
+    assert _ids(out["most_positive"]) == [bull.id, mixed.id, bear.id]
+    assert _ids(out["most_negative"]) == [bear.id, mixed.id, bull.id]
+    assert _ids(analytics.get_sentiment_rankings(db, limit=1)["most_negative"]) == [bear.id]
+
+
+def test_inflections(db, make):
+    turning, crowded = make.theme(db, "turning"), make.theme(db, "crowded")
+    _mention(db, make, turning, PRIOR, "bullish", docs=3)
+    _mention(db, make, turning, RECENT, "bearish")
+    _mention(db, make, crowded, RECENT, "bullish", docs=3)
+    db.commit()
+
+    out = analytics.get_inflections(db)
+    assert _ids(out["bullish_turning_neutral_bearish"]) == [turning.id]
+    assert _ids(out["bearish_turning_neutral_bullish"]) == []
+    assert _ids(out["attention_peaking"]) == [turning.id]
+    assert _ids(out["most_crowded"]) == [crowded.id]
+
+
+def test_active_and_archived_themes(db, make):
+    active, stale = make.theme(db, "active"), make.theme(db, "stale")
+    empty = make.theme(db, "empty")
+    _mention(db, make, active, RECENT)
+    _mention(db, make, stale, TODAY - dt.timedelta(days=90))
+    db.commit()
+
+    assert analytics.get_active_theme_ids(db, 60) == {active.id}
+    assert _ids(analytics.get_archived_themes(db, inactive_days=60)) == [stale.id, empty.id]
+    assert _ids(analytics.get_archived_themes(db, inactive_days=120)) == [empty.id]
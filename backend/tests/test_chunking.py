@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+import random
+
+import pytest
+
+from app.extract.chunking import ChunkOut, chunk_pages
+from app.extract.pdf_text import PageText
+
+
+def _baseline_chunks(pages, max_chars=1800, overlap_chars=200) -> list[ChunkOut]:
+    """chunk_pages as it was before the parts buffer: one string grown with += and stripped per flush."""
+    chunks: list[ChunkOut] = []
+    buf, start, end = "", None, None
+    for p in pages + [None]:
+        if p is not None:
+            start = p.page if start is None else start
+            end = p.page
+            add = (p.text or "").strip()
+            if not add:
+                continue
+        if p is None or len(buf) + len(add) + 2 > max_chars:
+            text = buf.strip()
+            if text:
+                chunks.append(ChunkOut(chunk_index=len(chunks), page_start=start, page_end=end, text=text))
+                buf = text[-overlap_chars:] if overlap_chars and len(text) > overlap_chars else ""
+                start = end
+            else:
+                buf, start, end = "", None, None
+        if p is not None:
+            buf = f"{buf}\n\n{add}" if buf else add
+    return chunks
+
+
+def _random_pages(rng: random.Random) -> list[PageText]:
+    words = ["alpha", "beta", "gamma", "\n", "  ", "\t", "delta." * 20]
+    return [
+        PageText(page=k + 1, text="".join(rng.choice(words) + rng.choice(("", " ")) for _ in range(rng.randrange(400))))
+        for k in range(rng.randrange(1, 25))
+    ]
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_chunks_match_string_buffer(seed):
+    rng = random.Random(seed)
+    pages = _random_pages(rng)
+    max_chars = rng.choice((50, 300, 1800))
+    overlap_chars = rng.choice((0, 20, 200))
+
+    assert chunk_pages(pages, max_chars=max_chars, overlap_chars=overlap_chars) == _baseline_chunks(
+        pages, max_chars, overlap_chars
+    )
+
+
+def test_overlap_drops_leading_whitespace_but_keeps_its_length_budget():
+    pages = [PageText(1, "a" * 10 + " " * 5 + "b" * 5), PageText(2, "c" * 12), PageText(3, "d" * 8)]
+
+    chunks = chunk_pages(pages, max_chars=30, overlap_chars=8)
+
+    # The 8-char overlap "   bbbbb" is stored as "bbbbb" yet still counts 8 chars toward max_chars,
+    # so page 3 starts a new chunk exactly as with the unstripped buffer.
+    assert chunks == [
+        ChunkOut(0, 1, 2, "a" * 10 + " " * 5 + "b" * 5),
+        ChunkOut(1, 2, 3, "bbbbb\n\n" + "c" * 12),
+        ChunkOut(2, 3, 3, "c" * 8 + "\n\n" + "d" * 8),
+    ]
@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+import os
+import time
+
+from app.llm import _extract_cache
+from app.settings import settings
+
+
+def _enable(monkeypatch, cache_dir, ttl_days=7):
+    monkeypatch.setattr(settings, "llm_extract_cache_dir", str(cache_dir))
+    monkeypatch.setattr(settings, "llm_extract_cache_ttl_days", ttl_days)
+    monkeypatch.setattr(_extract_cache, "_last_prune", None)
+
+
+def test_put_get_roundtrip(tmp_path, monkeypatch):
+    _enable(monkeypatch, tmp_path)
+    key = _extract_cache.make_key("openai", "gpt", "prompt", "text")
+
+    assert _extract_cache.get(key) is None
+    _extract_cache.put(key, '{"themes": []}')
+    assert _extract_cache.get(key) == '{"themes": []}'
+    assert key != _extract_cache.make_key("openai", "gpt", "prompttext", "")
+
+
+def test_relative_dir_is_anchored_to_backend(monkeypatch):
+    _enable(monkeypatch, ".llm_cache")
+
+    assert _extract_cache._cache_dir() == _extract_cache._BACKEND_DIR / ".llm_cache"
+    assert (_extract_cache._BACKEND_DIR / "app").is_dir()
+
+
+def test_expired_entries_are_pruned_on_put(tmp_path, monkeypatch):
+    _enable(monkeypatch, tmp_path, ttl_days=1)
+    old, fresh = _extract_cache.make_key("old"), _extract_cache.make_key("fresh")
+    _extract_cache.put(old, "x")
+    stale_tmp = _extract_cache._path(tmp_path, old).with_name("leftover.tmp")
+    stale_tmp.write_text("")
+    two_days_ago = time.time() - 2 * 86400
+    for path in (_extract_cache._path(tmp_path, old), stale_tmp):
+        os.utime(path, (two_days_ago, two_days_ago))
+    assert _extract_cache.get(old) is None  # expired reads miss
+
+    monkeypatch.setattr(_extract_cache, "_last_prune", None)
+    _extract_cache.put(fresh, "y")
+
+    assert sorted(p.name for p in tmp_path.rglob("*") if p.is_file()) == [f"{fresh}.json"]
+    assert _extract_cache.get(fresh) == "y"
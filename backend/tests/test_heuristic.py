@@ -0,0 +1,47 @@
+from __future__ import annotations
+
+from app.llm.heuristic import heuristic_extract
+
+
+def _evidence(doc) -> dict[str, str]:
+    return {t.label: t.narratives[0].evidence[0].quote for t in doc.themes}
+
+
+def test_evidence_is_first_sentence_containing_the_word():
+    text = "Markets sold off hard. Rates! The market rate held. Market market market rate rate."
+    doc = heuristic_extract(text=text, max_themes=2)
+
+    assert [t.label for t in doc.themes] == ["market", "rate"]
+    # Substring match: "market" is found in "Markets" and "rate" in "Rates!" before either occurs as a word.
+    assert _evidence(doc) == {"market": "Markets sold off hard.", "rate": "Rates!"}
+    assert doc.summary == "Markets sold off hard."
+
+
+def test_counts_ignore_stop_words_and_short_tokens():
+    doc = heuristic_extract(text="The GPU and the gpu. An AI capex cycle for GPUs.", max_themes=3)
+
+    assert [t.label for t in doc.themes] == ["gpu", "capex", "cycle"]
+    assert _evidence(doc)["gpu"] == "The GPU and the gpu."
+
+
+def test_text_without_sentence_boundary():
+    doc = heuristic_extract(text="  tariffs tariffs trade  ", max_themes=8)
+
+    assert [t.label for t in doc.themes] == ["tariffs", "trade"]
+    assert _evidence(doc) == {"tariffs": "tariffs tariffs trade", "trade": "tariffs tariffs trade"}
+    assert heuristic_extract(text="   ").themes == []
+
+
+def test_counts_span_sentences_like_whole_text():
+    # Hyphen/underscore tokens and words split across sentence boundaries count as in the whole text.
+    text = "Re-rate now.\nre-rate later! Capex_cycle? capex_cycle, RE-RATE."
+    doc = heuristic_extract(text=text, max_themes=8)
+
+    assert [t.label for t in doc.themes] == ["re-rate", "capex_cycle", "now", "later"]
+
+
+def test_top_words_break_ties_by_first_occurrence():
+    doc = heuristic_extract(text="delta alpha. gamma beta alpha. beta delta gamma.", max_themes=3)
+
+    # All four words tie at 2; the top 3 keep first-seen order, as Counter.most_common did on the full text.
+    assert [t.label for t in doc.themes] == ["delta", "alpha", "gamma"]
@@ -0,0 +1,324 @@
+from __future__ import annotations
+
+import datetime as dt
+import random
+from collections import Counter, defaultdict
+
+import pytest
+from sqlalchemy import literal
+
+from app import insights
+from app.db import SessionLocal
+from app.models import Document, Evidence, Narrative, NarrativeMentionsDaily
+from app.schemas import ConsensusPeriodOut, EmergingNarrativeOut, ThemeDebateOut, TrajectoryPointOut
+from app.settings import settings
+
+TODAY = dt.date.today()
+
+
+def _seed(db, make, seed: int) -> list[int]:
+    """Three themes with random narratives and evidence over the last ~220 days; returns theme ids."""
+    rng = random.Random(seed)
+    themes = [make.theme(db, f"T{k}") for k in range(3)]
+    narratives = [
+        make.narrative(db, t, f"{t.canonical_label} view {k} " + "x" * rng.choice((0, 250)))
+        for t in themes
+        for k in range(rng.randint(1, 6))
+    ]
+    for _ in range(150):
+        day = TODAY - dt.timedelta(days=rng.randrange(220))
+        kw = {}
+        if rng.random() < 0.3:
+            kw["modified_at"] = dt.datetime.combine(day - dt.timedelta(days=rng.randrange(10)), dt.time(12))
+        doc = make.document(db, day, **kw)
+        for _ in range(rng.randint(0, 3)):
+            make.evidence(db, rng.choice(narratives), doc)
+    db.commit()
+    return [t.id for t in themes]
+
+
+def _mentions(db) -> list[tuple[int, int, dt.date]]:
+    """(theme_id, narrative_id, document day) per evidence row; the day is the date of modified_at or received_at."""
+    rows = (
+        db.query(Narrative.theme_id, Narrative.id, Document.modified_at, Document.received_at)
+        .select_from(Evidence)
+        .join(Narrative, Evidence.narrative_id == Narrative.id)
+        .join(Document, Evidence.document_id == Document.id)
+        .all()
+    )
+    return [(theme_id, nid, (modified or received).date()) for theme_id, nid, modified, received in rows]
+
+
+def _baseline_debate(db, theme_id: int, lookback_days: int = 90):
+    """compute_debate as it was before the grouped queries: per-narrative counts reduced in Python."""
+    since = TODAY - dt.timedelta(days=lookback_days)
+    counts = Counter(nid for t, nid, day in _mentions(db) if t == theme_id and day >= since)
+    if not counts:
+        return None
+    total = sum(counts.values())
+    top_share = max(c / total for c in counts.values())
+    if len(counts) >= 4 and top_share < 0.4:
+        label = "Heavily debated"
+    elif len(counts) >= 2 and top_share < 0.6:
+        label = "Moderate debate"
+    elif top_share >= 0.7:
+        label = "Clear consensus"
+    else:
+        label = "Some debate"
+    return ThemeDebateOut(
+        score=round(1.0 - top_share, 3),
+        label=label,
+        narrative_count=len(counts),
+        top_narrative_share=round(top_share, 3),
+    )
+
+
+def _baseline_trajectory(db, theme_id: int, since: dt.date, window_days: int = 7):
+    """compute_trajectory as it was before the LAG query: per-day counts and windows walked in Python."""
+    docs = Counter(
+        (modified or received).date() for modified, received in db.query(Document.modified_at, Document.received_at)
+    )
+    mentions = Counter(day for t, _, day in _mentions(db) if t == theme_id and day >= since)
+    dates = sorted(mentions)
+    if len(dates) < 2:
+        return []
+    out = []
+    for i in range(window_days, len(dates) + 1):
+        now, prev = dates[i - 1], dates[i - window_days]
+        m_now, m_prev = mentions[now], mentions[prev]
+        mention_trend = (m_now - m_prev) / m_prev if m_prev else (m_now - m_prev)
+        share_trend = m_now / docs[now] - m_prev / docs[prev]
+        if mention_trend > 0.15 and share_trend > 0:
+            direction, note = "improving", "Rising attention and share of voice"
+        elif mention_trend < -0.15 or share_trend < -0.01:
+            direction, note = "worsening", "Declining attention or share"
+        elif abs(mention_trend) <= 0.15 and abs(share_trend) <= 0.01:
+            direction, note = "unchanged", None
+        else:
+            direction, note = "mixed", "Mixed or volatile signals"
+        out.append(TrajectoryPointOut(
+            date=now.isoformat(),
+            direction=direction,
+            note=note,
+            mention_trend=round(mention_trend, 3),
+            share_trend=round(share_trend, 4),
+        ))
+    return out[-24:]
+
+
+def _baseline_consensus(db, theme_id: int, since: dt.date, period_days: int = 7):
+    """compute_consensus_evolution as it was before ROW_NUMBER: weekly counts and argmax in Python.
+
+    Narratives enter a week in (day, id) order, so max() breaks ties by first mention, then lowest id."""
+    statements = dict(db.query(Narrative.id, Narrative.statement))
+    weeks: dict[dt.date, Counter] = defaultdict(Counter)
+    for t, nid, day in sorted(_mentions(db), key=lambda m: (m[2], m[1])):
+        if t == theme_id and day >= since:
+            weeks[day - dt.timedelta(days=day.weekday())][nid] += 1
+    merged: list[ConsensusPeriodOut] = []
+    for start in sorted(weeks):
+        counts = weeks[start]
+        top = max(counts, key=counts.get)
+        end = (start + dt.timedelta(days=period_days)).isoformat()
+        if merged and merged[-1].narrative_id == top:
+            last = merged[-1]
+            merged[-1] = ConsensusPeriodOut(
+                period_start=last.period_start,
+                period_end=end,
+                narrative_id=top,
+                statement=last.statement,
+                share=last.share,
+                mention_count=last.mention_count + counts[top],
+            )
+            continue
+        stmt = statements[top]
+        merged.append(ConsensusPeriodOut(
+            period_start=start.isoformat(),
+            period_end=end,
+            narrative_id=top,
+            statement=(stmt[:200] + "…") if len(stmt) > 200 else stmt,
+            share=round(counts[top] / sum(counts.values()), 3),
+            mention_count=counts[top],
+        ))
+    return merged[-16:]
+
+
+def _baseline_emerging(db, theme_id: int, lookback_days: int = 60):
+    """compute_emerging as it was before the batched lookups: one count and one novelty query per narrative."""
+    cutoff = dt.datetime.now(dt.timezone.utc) - dt.timedelta(days=lookback_days)
+    narratives = [
+        n for n in db.query(Narrative).filter(Narrative.theme_id == theme_id)
+        if n.first_seen.replace(tzinfo=n.first_seen.tzinfo or dt.timezone.utc) >= cutoff
+    ]
+    out = []
+    for n in sorted(narratives, key=lambda n: n.first_seen, reverse=True)[:20]:
+        latest = (
+            db.query(NarrativeMentionsDaily)
+            .filter(NarrativeMentionsDaily.narrative_id == n.id)
+            .order_by(NarrativeMentionsDaily.date.desc())
+            .first()
+        )
+        out.append(EmergingNarrativeOut(
+            narrative_id=n.id,
+            statement=n.statement,
+            first_seen=n.first_seen.isoformat()[:10],
+            mention_count=db.query(Evidence).filter(Evidence.narrative_id == n.id).count(),
+            novelty_score=round(latest.novelty_score, 2) if latest and latest.novelty_score is not None else None,
+            relation_to_prevailing=n.relation_to_prevailing or "unlabeled",
+        ))
+    return out
+
+
+def test_cached_insights_see_evidence_from_another_session(db, make, monkeypatch):
+    monkeypatch.setattr(settings, "analytics_cache_ttl_seconds", 300)
+    insights.clear_theme_insights_cache()
+    theme = make.theme(db, "T")
+    n = make.narrative(db, theme, narrative_stance="bullish")
+    make.evidence(db, n, make.document(db, TODAY - dt.timedelta(days=3)))
+    db.commit()
+
+    first = insights.get_theme_insights(db, theme.id)
+    assert insights.get_theme_insights(db, theme.id) is first  # served from cache
+
+    # Another process (the ingest worker) commits evidence without touching this process's cache.
+    with SessionLocal() as other:
+        make.evidence(other, n, make.document(other, TODAY - dt.timedelta(days=1)))
+        other.commit()
+
+    fresh = insights.get_theme_insights(db, theme.id)
+    assert fresh is not first
+    assert [e.mention_count for e in first.emerging] == [1]
+    assert [e.mention_count for e in fresh.emerging] == [2]
+    insights.clear_theme_insights_cache()
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_debate_bulk_matches_per_theme_debate(db, make, monkeypatch, seed):
+    theme_ids = _seed(db, make, seed)
+    expected = {t: d for t in theme_ids if (d := _baseline_debate(db, t)) is not None}
+    assert expected
+
+    assert {t: insights.compute_debate(db, t) for t in theme_ids} == {t: expected.get(t) for t in theme_ids}
+    assert insights.compute_debate_bulk(db) == expected
+    assert insights.compute_debate_bulk(db, theme_ids + [10**6]) == expected
+    monkeypatch.setattr(insights, "_DEBATE_IN_CHUNK", 1)  # one IN-list chunk per theme
+    assert insights.compute_debate_bulk(db, theme_ids) == expected
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_trajectory_matches_per_day_windows(db, make, seed):
+    theme_ids = _seed(db, make, seed)
+    since = TODAY - dt.timedelta(days=186)
+
+    for theme_id in theme_ids:
+        for window_days in (7, 3, 1):
+            expected = _baseline_trajectory(db, theme_id, since, window_days)
+            assert insights.compute_trajectory(db, theme_id, since, window_days) == expected
+    assert any(_baseline_trajectory(db, t, since) for t in theme_ids)
+
+
+def test_trajectory_needs_two_days_with_mentions(db, make):
+    theme = make.theme(db, "T")
+    n = make.narrative(db, theme)
+    make.evidence(db, n, make.document(db, TODAY))
+    make.document(db, TODAY - dt.timedelta(days=1))  # a day with documents but no mentions
+    db.commit()
+
+    assert insights.compute_trajectory(db, theme.id, TODAY - dt.timedelta(days=30), window_days=1) == []
+
+
+def test_week_start_is_the_iso_monday(db):
+    for k in range(14):
+        day = TODAY - dt.timedelta(days=k)
+        assert db.query(insights._week_start(literal(day))).scalar() == day - dt.timedelta(days=day.weekday())
+
+
+def test_consensus_groups_mentions_by_week(db, make):
+    monday = TODAY - dt.timedelta(days=TODAY.weekday() + 14)
+    theme = make.theme(db, "T")
+    a, b = make.narrative(db, theme, "a"), make.narrative(db, theme, "b")
+    for n, offset in ((a, -1), (a, -1), (b, 0), (a, 3), (b, 6), (b, 7)):
+        make.evidence(db, n, make.document(db, monday + dt.timedelta(days=offset)))
+    db.commit()
+
+    out = insights.compute_consensus_evolution(db, theme.id, monday - dt.timedelta(days=30))
+
+    week = dt.timedelta(days=7)
+    # Sunday belongs to the week before; b wins two consecutive weeks, merged into one period.
+    assert out == [
+        ConsensusPeriodOut(
+            period_start=(monday - week).isoformat(), period_end=monday.isoformat(),
+            narrative_id=a.id, statement="a", share=1.0, mention_count=2,
+        ),
+        ConsensusPeriodOut(
+            period_start=monday.isoformat(), period_end=(monday + 2 * week).isoformat(),
+            narrative_id=b.id, statement="b", share=0.667, mention_count=3,
+        ),
+    ]
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_consensus_matches_weekly_argmax(db, make, seed):
+    theme_ids = _seed(db, make, seed)
+    since = TODAY - dt.timedelta(days=186)
+
+    for theme_id in theme_ids:
+        assert insights.compute_consensus_evolution(db, theme_id, since) == _baseline_consensus(db, theme_id, since)
+
+
+def test_consensus_tie_goes_to_first_mentioned_narrative(db, make):
+    theme = make.theme(db, "T")
+    first, second, third = (make.narrative(db, theme, label) for label in ("first", "second", "third"))
+    monday = TODAY - dt.timedelta(days=TODAY.weekday() + 7)
+    for n, offset in ((second, 1), (third, 1), (first, 2)):
+        make.evidence(db, n, make.document(db, monday + dt.timedelta(days=offset)))
+    db.commit()
+
+    # Tied on mentions: the narrative mentioned earliest in the week wins, then the lowest id.
+    [period] = insights.compute_consensus_evolution(db, theme.id, TODAY - dt.timedelta(days=30))
+    assert (period.narrative_id, period.share, period.mention_count) == (second.id, 0.333, 1)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_emerging_matches_per_narrative_lookups(db, make, seed):
+    theme_ids = _seed(db, make, seed)
+    rng = random.Random(seed)
+    now = dt.datetime.now(dt.timezone.utc)
+    for k, n in enumerate(db.query(Narrative).order_by(Narrative.id)):
+        # Distinct minutes keep first_seen order unambiguous and clear of the cutoff.
+        n.first_seen = now - dt.timedelta(days=rng.randrange(120), minutes=k + 1)
+        n.relation_to_prevailing = rng.choice(("consensus", "contrarian", "new_angle"))
+        for day in rng.sample(range(60), rng.randint(0, 3)):
+            novelty = rng.choice((None, rng.random()))
+            db.add(NarrativeMentionsDaily(
+                narrative_id=n.id, date=TODAY - dt.timedelta(days=day), doc_count=1, mention_count=1,
+                novelty_score=novelty,
+            ))
+    db.commit()
+
+    for theme_id in theme_ids:
+        for lookback_days in (60, 90):
+            expected = _baseline_emerging(db, theme_id, lookback_days)
+            assert insights.compute_emerging(db, theme_id, lookback_days) == expected
+    assert any(_baseline_emerging(db, t) for t in theme_ids)
+
+
+def test_trajectory_direction_thresholds(db, make):
+    theme = make.theme(db, "T")
+    n = make.narrative(db, theme)
+    start = TODAY - dt.timedelta(days=10)
+    # (mentions, documents) per day; share of voice = mentions / documents that day.
+    for k, (mentions, docs) in enumerate(((2, 4), (4, 4), (2, 4), (2, 4), (4, 8))):
+        day_docs = [make.document(db, start + dt.timedelta(days=k)) for _ in range(docs)]
+        for i in range(mentions):
+            make.evidence(db, n, day_docs[i % docs])
+    db.commit()
+
+    out = insights.compute_trajectory(db, theme.id, start, window_days=2)
+
+    assert [(p.date, p.direction, p.note, p.mention_trend, p.share_trend) for p in out] == [
+        ((start + dt.timedelta(days=1)).isoformat(), "improving", "Rising attention and share of voice", 1.0, 0.5),
+        ((start + dt.timedelta(days=2)).isoformat(), "worsening", "Declining attention or share", -0.5, -0.5),
+        ((start + dt.timedelta(days=3)).isoformat(), "unchanged", None, 0.0, 0.0),
+        ((start + dt.timedelta(days=4)).isoformat(), "mixed", "Mixed or volatile signals", 1.0, 0.0),
+    ]
@@ -0,0 +1,35 @@
+from __future__ import annotations
+
+from app import instruments
+from app.models import ThemeInstrument
+
+
+def test_add_instruments_inserts_only_new_symbols(db, make):
+    theme = make.theme(db, "T")
+    db.add(ThemeInstrument(theme_id=theme.id, symbol="nvda", source="manual"))
+    db.commit()
+
+    created = instruments.add_instruments_from_documents(db, theme.id, [" amd ", "NVDA", "AMD", "GDP", "", "tsm"])
+
+    # Rows come back loaded and usable after the commit, in input order.
+    assert [(i.symbol, i.type, i.source, i.theme_id) for i in created] == [
+        ("AMD", "stock", "from_documents", theme.id),
+        ("TSM", "stock", "from_documents", theme.id),
+    ]
+    assert all(i.id and i.created_at for i in created)
+    assert sorted(s for (s,) in db.query(ThemeInstrument.symbol)) == ["AMD", "TSM", "nvda"]
+    assert instruments.add_instruments_from_documents(db, theme.id, ["AMD"]) == []
+    assert instruments.add_instruments_from_documents(db, 10**6, ["AMD"]) == []
+
+
+def test_add_instruments_skips_rows_added_concurrently(db, make, monkeypatch):
+    theme = make.theme(db, "T")
+    db.add(ThemeInstrument(theme_id=theme.id, symbol="AMD", source="manual"))
+    db.commit()
+    # As if another request inserted AMD between the existence check and the INSERT.
+    monkeypatch.setattr(instruments, "_existing_symbols", lambda *a: set())
+
+    created = instruments.add_instruments_from_documents(db, theme.id, ["AMD", "TSM"])
+
+    assert [i.symbol for i in created] == ["TSM"]
+    assert db.query(ThemeInstrument).filter_by(symbol="AMD").one().source == "manual"
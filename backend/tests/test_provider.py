@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+from types import SimpleNamespace
+
+import pytest
+
+from app.llm import provider
+
+
+class _BadRequest(Exception):
+    status_code = 400
+
+
+class _FakeClient:
+    def __init__(self, reject: set[str]):
+        self.reject = reject
+        self.formats: list[str | None] = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, **kw):
+        fmt = kw.get("response_format", {}).get("type") if "response_format" in kw else None
+        self.formats.append(fmt)
+        if fmt in self.reject:
+            raise _BadRequest(f"Error code: 400 - response_format type '{fmt}' is not supported by this model")
+        message = SimpleNamespace(content='```json\n{"tickers": []}\n```')
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+def _chat(monkeypatch, client, base_url=None, model="m"):
+    monkeypatch.setattr(provider, "get_openai_client", lambda *a: client)
+    return provider._openai_compatible_chat(
+        system="s", user="u", model=model, api_key="k", base_url=base_url,
+        max_tokens=16, timeout=1.0, json_schema={"type": "object"},
+    )
+
+
+def test_rejected_response_format_falls_back(monkeypatch):
+    monkeypatch.setattr(provider, "_REJECTED_RESPONSE_FORMATS", {})
+    client = _FakeClient(reject={"json_schema", "json_object"})
+
+    raw = _chat(monkeypatch, client)
+    assert client.formats == ["json_schema", "json_object", None]
+    assert provider.json_loads(provider.strip_code_fence(raw)) == {"tickers": []}
+
+    # Rejections are remembered per endpoint and model, so later calls go straight to plain JSON.
+    _chat(monkeypatch, client)
+    assert client.formats[3:] == [None]
+    _chat(monkeypatch, client, model="other")
+    assert client.formats[4:] == ["json_schema", "json_object", None]
+
+
+def test_other_errors_are_not_retried(monkeypatch):
+    monkeypatch.setattr(provider, "_REJECTED_RESPONSE_FORMATS", {})
+    client = _FakeClient(reject=set())
+
+    def fail(**kw):
+        client.formats.append(kw["response_format"]["type"])
+        raise _BadRequest("Error code: 400 - max_tokens is too large")
+
+    client.chat.completions.create = fail
+    with pytest.raises(_BadRequest):
+        _chat(monkeypatch, client, base_url="http://local")
+    assert client.formats == ["json_object"]
@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import random
+
+import pytest
+
+from app.llm import vertex
+from app.llm.vertex import ExtractedDoc, ExtractedNarrative, ExtractedTheme
+from app.settings import settings
+
+
+def _narrative(statement: str, sub_theme: str | None = None) -> ExtractedNarrative:
+    return ExtractedNarrative(statement=statement, stance="s", relation_to_prevailing="consensus", sub_theme=sub_theme)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_chunks_overlap_and_cover_the_text(seed):
+    rng = random.Random(seed)
+    text = "".join(rng.choice(("word", "longerword", " ", "\n", "x" * 1500)) for _ in range(rng.randrange(100, 2000)))
+    size, overlap = rng.choice(((3000, 500), (5000, 2000), (2000, 2000)))
+
+    chunks = vertex._chunk_text(text, size, overlap)
+
+    overlap = min(overlap, size // 2)
+    assert all(len(c) <= size for c in chunks)
+    # Each chunk after the first starts with the last `overlap` chars of the one before it.
+    assert all(prev.endswith(c[:overlap]) for prev, c in zip(chunks, chunks[1:]))
+    assert chunks[0] + "".join(c[overlap:] for c in chunks[1:]) == text
+
+
+def test_chunks_cut_at_whitespace_when_possible():
+    assert vertex._chunk_text("short", 10) == ["short"]
+    assert vertex._chunk_text("x" * 2500, 1000, 100) == ["x" * 1000, "x" * 1000, "x" * 700]
+    text = "a" * 1500 + " " + "b" * 1000
+    assert vertex._chunk_text(text, 2000, 200) == ["a" * 1500, "a" * 200 + " " + "b" * 1000]
+
+
+def test_merge_results_groups_themes_and_dedupes_narratives():
+    first = ExtractedDoc(
+        summary=None,
+        conclusions=["c1", "c2"],
+        themes=[ExtractedTheme("AI Capex", [_narrative("n1"), _narrative("n2", "chips")])],
+    )
+    second = ExtractedDoc(
+        summary="second summary",
+        conclusions=["c2", "c3"],
+        themes=[
+            ExtractedTheme("Rates", [_narrative("r1")]),
+            ExtractedTheme("ai capex", [_narrative("n2", "chips"), _narrative("n2"), _narrative("n3")]),
+        ],
+    )
+
+    merged = vertex._merge_results([first, second])
+
+    assert merged.summary == "second summary"
+    assert merged.conclusions == ["c1", "c2", "c3"]
+    assert [(t.label, [(n.sub_theme, n.statement) for n in t.narratives]) for t in merged.themes] == [
+        ("AI Capex", [(None, "n1"), ("chips", "n2"), (None, "n2"), (None, "n3")]),
+        ("Rates", [(None, "r1")]),
+    ]
+
+
+def test_oversized_document_is_extracted_per_chunk(monkeypatch):
+    monkeypatch.setattr(settings, "llm_extraction_max_chars", 1000)
+
+    def fake_extract(chunk: str) -> ExtractedDoc:
+        # One theme named after the chunk's last character; chunks ending in "b" time out.
+        if chunk.endswith("b"):
+            raise TimeoutError("chunk timed out")
+        return ExtractedDoc(summary=None, conclusions=[], themes=[ExtractedTheme(chunk[-1], [_narrative(chunk[-3:])])])
+
+    monkeypatch.setattr(vertex, "_extract_single_chunk", fake_extract)
+
+    text = "a" * 800 + " " + "b" * 800 + " " + "c" * 800
+    chunks = vertex._chunk_text(text, 1000)
+    assert [c[-1] for c in chunks] == ["a", "b", "b", "c", "c"]
+    # Failed chunks are skipped; the others are merged in chunk order.
+    assert [t.label for t in vertex.extract_themes_and_narratives(text=text).themes] == ["a", "c"]
+    assert vertex.extract_themes_and_narratives(text="short").themes[0].label == "t"
+    with pytest.raises(TimeoutError):
+        vertex.extract_themes_and_narratives(text="b" * 1500)